@@ -0,0 +1,134 @@
+import argparse
+import itertools
+import numpy as np
+
+from timing import best_time
+from gris.canvas import (NEW_CANVAS_HEADER, GET_CANVAS_HEADER, make_newCanvas, make_getCanvas,
+                         canvas_grid, assign_colors, write_canvas)
+from gris.xlsx import make_label_array, make_location_array, canvas_positions, write_sheet_canvas
+
+
+###############################################################################
+# Load arguments
+###############################################################################
+
+parser = argparse.ArgumentParser()
+
+parser.add_argument('-n', '--size', type=int,
+                    default=300,
+                    help='Number of rows and columns of the large timed canvas.')
+
+parser.add_argument('-r', '--repeats', type=int,
+                    default=3,
+                    help='Number of timed runs (the best run is reported).')
+
+
+
+###############################################################################
+# Functions
+###############################################################################
+
+def legacy_write_canvas(labels, x_positions, y_positions, color_dict, width, height, auto_fit):
+    """The original `canvas.py` generator (one `+=` per cell, over the labels twice)."""
+    canvas_string = NEW_CANVAS_HEADER
+    idx1 = 0
+    for label in labels:
+        if label[0] != idx1:
+            idx1 += 1
+            canvas_string += '\n'
+        if auto_fit:
+            canvas_string += make_newCanvas(label, f'{x_positions[label[2]]}vw', f'{y_positions[label[3]]}vh', color_dict[(label[0], label[1])], width, height, autofit=True)
+        else:
+            canvas_string += make_newCanvas(label, x_positions[label[2]], y_positions[label[3]], color_dict[(label[0], label[1])], width, height)
+
+    canvas_string += GET_CANVAS_HEADER
+    idx2 = 0
+    for label in labels:
+        if label[0] != idx2:
+            idx2 += 1
+            canvas_string += '\n'
+        canvas_string += make_getCanvas(label)
+
+    return canvas_string
+
+
+def legacy_write_sheet_canvas(color_array, label_array, x_positions, y_positions, width, height, auto_fit):
+    """The original `xlsx.py` generator (one `+=` per cell)."""
+    num_rows, num_cols = color_array.shape
+    location_array = make_location_array(x_positions, y_positions)
+
+    canvas_string = NEW_CANVAS_HEADER
+    for i in range(num_rows):
+        for j in range(num_cols):
+            if auto_fit:
+                canvas_string += make_newCanvas(label_array[i, j], f'{location_array[i, j][1]}vw', f'{location_array[i, j][0]}vh', color_array[i, j], width, height, autofit=True)
+            else:
+                canvas_string += make_newCanvas(label_array[i, j], location_array[i, j][1], location_array[i, j][0], color_array[i, j], width, height)
+        canvas_string += '\n'
+
+    canvas_string += GET_CANVAS_HEADER
+    for i in range(num_rows):
+        for j in range(num_cols):
+            canvas_string += make_getCanvas(label_array[i, j])
+        canvas_string += '\n'
+
+    return canvas_string
+
+
+def make_drawing(num_rows, num_cols, num_colors=4, block=7):
+    """A drawn canvas (as read by `xlsx.py`): square blocks of colors."""
+    rows, cols = np.indices((num_rows, num_cols))
+    color_array = np.array([f'#{index:06X}' for index in range(num_colors)], dtype=object)[
+        (rows // block * 3 + cols // block) % num_colors]
+    return color_array, make_label_array(color_array)
+
+
+def check_canvases():
+    """Compare both emitters on a grid of `canvas.py` and `xlsx.py` options (raises if any output differs)."""
+    checked = 0
+    for (num_rows, num_cols), categories, auto_fit in itertools.product(
+            [(1, 1), (3, 3), (14, 34), (15, 35), (10, 9)], [(1, 1), (1, 3), (3, 1), (5, 3)], [False, True]):
+        if num_cols % categories[0] or num_rows % categories[1]:
+            continue
+        width, height = (2, 3) if auto_fit else (25, 25)
+        grid = canvas_grid(num_rows, num_cols, categories, width, height, 0, 2000, 0, 2000, auto_fit)
+        x_positions, y_positions, labels = grid
+        color_dict = assign_colors(['red', 'blue', '#ABCDEF'], *categories)
+
+        expected = legacy_write_canvas(labels, x_positions, y_positions, color_dict, width, height, auto_fit)
+        assert write_canvas(labels, x_positions, y_positions, color_dict, width, height, auto_fit) == expected
+
+        color_array, label_array = make_drawing(num_rows, num_cols)
+        x_positions, y_positions = canvas_positions(num_rows, num_cols, width, height,
+                                                    *((0, 100, 0, 100) if auto_fit else (250, 1270, 50, 470)))
+        expected = legacy_write_sheet_canvas(color_array, label_array, x_positions, y_positions, width, height, auto_fit)
+        assert write_sheet_canvas(color_array, label_array, x_positions, y_positions, width, height, auto_fit) == expected
+        checked += 1
+
+    return checked
+
+
+
+
+###############################################################################
+# MAIN
+###############################################################################
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+
+    print(f'{check_canvases()} canvas specifications: identical output')
+
+    size = args.size
+    categories = (3, 5) if size % 15 == 0 else (1, 1)
+    x_positions, y_positions, labels = canvas_grid(size, size, categories, 2, 2, 0, 2000, 0, 2000)
+    color_dict = assign_colors(['lightgray', 'gray'], *categories)
+    print(f'{size} x {size} canvas ({len(labels)} cells)')
+
+    legacy_time, legacy = best_time(lambda: legacy_write_canvas(labels, x_positions, y_positions, color_dict, 2, 2, False), args.repeats)
+    emitter_time, emitted = best_time(lambda: write_canvas(labels, x_positions, y_positions, color_dict, 2, 2, False), args.repeats)
+    assert legacy == emitted
+
+    print(f'legacy (+= per cell): {legacy_time:8.3f} s')
+    print(f'emitter:              {emitter_time:8.3f} s')
+    print(f'speedup:              {legacy_time / emitter_time:8.1f}x')
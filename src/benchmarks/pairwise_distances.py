@@ -0,0 +1,126 @@
+import argparse
+import numpy as np
+import pandas as pd
+
+from timing import best_time
+from utils import compute_pairwise_distances
+
+
+###############################################################################
+# Load arguments
+###############################################################################
+
+parser = argparse.ArgumentParser()
+
+parser.add_argument('-p', '--participants', type=int,
+                    default=300,
+                    help='Number of participants in the synthetic study.')
+
+parser.add_argument('-i', '--items', type=int,
+                    default=40,
+                    help='Number of items (trials) per participant.')
+
+parser.add_argument('-n', '--objects', type=int,
+                    default=8,
+                    help='Number of objects per trial.')
+
+parser.add_argument('-m', '--metadata', type=int,
+                    default=30,
+                    help='Number of (string) trial metadata columns.')
+
+parser.add_argument('-r', '--repeats', type=int,
+                    default=3,
+                    help='Number of timed runs (the best run is reported).')
+
+
+
+###############################################################################
+# Functions
+###############################################################################
+
+def make_study(num_participants, num_items, num_objects, num_metadata, seed=0):
+    """
+    Build an expanded (one row per object) synthetic study, like the output
+    of `expand_graphs`, with four-part coordinates and string metadata columns.
+    """
+    rng = np.random.default_rng(seed)
+    num_trials = num_participants * num_items
+    num_rows = num_trials * num_objects
+
+    trial = np.repeat(np.arange(num_trials), num_objects)
+    df = pd.DataFrame({
+        'Participant': np.char.add('participant-', (trial // num_items).astype(str)),
+        'item': trial % num_items,
+    })
+    for col in range(num_metadata):
+        df[f'Meta{col}'] = np.char.add(f'meta{col}-', (trial % 97).astype(str))
+
+    df['object'] = np.char.add('object-', np.tile(np.arange(num_objects), num_trials).astype(str))
+    df['location'] = list(zip(rng.integers(0, 2, num_rows), rng.integers(0, 2, num_rows),
+                              rng.integers(0, 34, num_rows), rng.integers(0, 14, num_rows)))
+
+    return df
+
+
+def legacy_pairwise_distances(df, group_cols, location_col='location', object_col='object',
+                              categorical=False):
+    """
+    The original (one group at a time) `compute_pairwise_distances`, kept for comparison.
+    """
+    df = df.copy()
+    all_results = []
+
+    for _, group in df.groupby(group_cols):
+        group = group.reset_index(drop=True)
+        num_rows = len(group)
+        if num_rows < 2:
+            continue
+
+        locations = np.stack(group[location_col].values)
+        two_coords = locations[:, :2] if categorical else locations[:, -2:]
+
+        object_ids = group[object_col].values
+        metadata = group.drop(columns=[location_col, object_col])
+
+        idx1 = np.repeat(np.arange(num_rows), num_rows)
+        idx2 = np.tile(np.arange(num_rows), num_rows)
+        mask = idx1 < idx2
+        idx1 = idx1[mask]
+        idx2 = idx2[mask]
+
+        deltas = two_coords[idx1] - two_coords[idx2]
+        distances = np.sqrt((deltas ** 2).sum(axis=1))
+
+        result_df = metadata.iloc[idx1].reset_index(drop=True)
+        result_df[object_col] = object_ids[idx1]
+        result_df[f'{object_col}_2'] = object_ids[idx2]
+        result_df[f'{location_col}_2'] = group[location_col].iloc[idx2].values
+        result_df['distance'] = distances
+        all_results.append(result_df)
+
+    return pd.concat(all_results, ignore_index=True)
+
+
+
+
+###############################################################################
+# MAIN
+###############################################################################
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+
+    df = make_study(args.participants, args.items, args.objects, args.metadata)
+    print(f'{args.participants} participants x {args.items} items x {args.objects} objects '
+          f'({len(df)} object rows)')
+
+    group_cols = ['Participant', 'item']
+    legacy_time, legacy = best_time(lambda: legacy_pairwise_distances(df, group_cols), args.repeats)
+    engine_time, engine = best_time(lambda: compute_pairwise_distances(df, group_cols), args.repeats)
+
+    # Both versions should give exactly the same output.
+    assert legacy.equals(engine)
+
+    print(f'legacy (per group):  {legacy_time:8.3f} s')
+    print(f'single pass:         {engine_time:8.3f} s')
+    print(f'speedup:             {legacy_time / engine_time:8.1f}x')
@@ -0,0 +1,335 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+import numpy as np
+import pandas as pd
+
+from timing import best_time, peak_memory
+from utils import compute_action_times, clean_string, expand_graphs, compute_pairwise_distances, z_score
+from parallel import parallel_compute_action_times, parallel_compute_pairwise_distances
+from synthetic import make_results
+from canvas_emitter import make_drawing
+from xlsx_ingestion import make_workbook
+from gris import visualizer
+from gris.canvas import canvas_grid, assign_colors, canvas_positions, write_canvas
+from gris.xlsx import load_color_arrays, write_sheet_canvas
+
+
+###############################################################################
+# Load arguments
+###############################################################################
+
+parser = argparse.ArgumentParser()
+
+parser.add_argument('-p', '--participants', type=int,
+                    nargs='+',
+                    default=[10, 100, 1000],
+                    help='Number of participants at each scale.')
+
+parser.add_argument('-i', '--items', type=int,
+                    default=40,
+                    help='Number of items (trials) per participant.')
+
+parser.add_argument('-n', '--objects', type=int,
+                    default=8,
+                    help='Number of objects per trial.')
+
+parser.add_argument('-e', '--events', type=int,
+                    default=None,
+                    help='Number of drag-and-drop events per trial (defaults to 1.5 x objects).')
+
+parser.add_argument('-c', '--coordinates', type=int,
+                    choices=[2, 4],
+                    default=4,
+                    help='Parts per location: (x, y) or (x_cat, y_cat, x, y).')
+
+parser.add_argument('--width', type=int, default=34,
+                    help='Number of canvas columns.')
+
+parser.add_argument('--height', type=int, default=14,
+                    help='Number of canvas rows.')
+
+parser.add_argument('--canvas_size', type=int, default=300,
+                    help='Number of rows and columns of the canvases (and spreadsheet drawings) of the canvas stages.')
+
+parser.add_argument('--sheets', type=int, default=4,
+                    help='Number of sheets in the workbook of the spreadsheet stage.')
+
+parser.add_argument('-s', '--stages', type=str,
+                    nargs='+',
+                    default=None,
+                    help='Only run these stages (default: all).')
+
+parser.add_argument('-w', '--workers', type=int,
+                    nargs='+',
+                    default=[],
+                    help='Also time the parallel stages with each of these numbers of workers (a scaling curve).')
+
+parser.add_argument('-r', '--repeats', type=int,
+                    default=3,
+                    help='Number of timed runs (the best run is reported).')
+
+parser.add_argument('-o', '--output_file', type=str,
+                    default='./benchmarks/report.json',
+                    help='Where to write the (JSON) report.')
+
+parser.add_argument('-b', '--baseline', type=str,
+                    default=None,
+                    help='Earlier report to compare against.')
+
+parser.add_argument('-t', '--threshold', type=float,
+                    default=1.25,
+                    help='Flag stages that are this many times slower than the baseline.')
+
+
+
+###############################################################################
+# Stages
+###############################################################################
+
+def layout(distances):
+    """The layout step of `visualizer.py`: build the object graph, then place it in 3D."""
+    import networkx as nx
+
+    graph = visualizer.build_graph_from_df(distances)
+    return nx.spring_layout(graph, dim=3, weight='weight', seed=42)
+
+
+def run_stages(results, pools=None):
+    """
+    The steps of the first sample pipeline in `pipeline.ipynb`. Each stage is
+    given the output of the stages before it (computed once, outside the timings).
+
+    Parameters:
+    - results (pd.DataFrame): Results table (see `synthetic.make_results`).
+    - pools (dict): Process pool for each number of workers, to also time the
+                    parallel stages with (e.g., `parallel_compute_action_times_4w`).
+
+    Returns:
+    - list of (str, function, int): Name of each stage, a function that runs it, and its number of input rows.
+    """
+    incremental = compute_action_times(results)
+    final = incremental[(incremental['Parameter'] == 'Final')
+                        & (incremental['PennElementName'] == 'experimental-trials')].copy()
+    final['final_graphs'] = final['Value'].apply(clean_string)
+    graphs = expand_graphs(final)
+    distances = compute_pairwise_distances(graphs, group_cols=['Participant', 'item'])
+
+    stages = [
+        ('compute_action_times', lambda: compute_action_times(results), len(results)),
+        ('clean_string', lambda: final['Value'].apply(clean_string), len(final)),
+        ('expand_graphs', lambda: expand_graphs(final), len(final)),
+        ('compute_pairwise_distances', lambda: compute_pairwise_distances(graphs, group_cols=['Participant', 'item']), len(graphs)),
+        ('z_score', lambda: z_score(distances, ['Participant'], 'distance'), len(distances)),
+        ('visualizer_layout', lambda: layout(distances), len(distances)),
+    ]
+
+    # The pools are started once (as in `gris_pipeline.py`), so only the work itself is timed.
+    for workers, pool in (pools or {}).items():
+        stages += [
+            (f'parallel_compute_action_times_{workers}w',
+             lambda workers=workers, pool=pool: parallel_compute_action_times(results, workers=workers, executor=pool),
+             len(results)),
+            (f'parallel_compute_pairwise_distances_{workers}w',
+             lambda workers=workers, pool=pool: parallel_compute_pairwise_distances(graphs, group_cols=['Participant', 'item'],
+                                                                                     workers=workers, executor=pool),
+             len(graphs)),
+        ]
+
+    return stages
+
+
+# Stages of `canvas_stages` (only set up when one of them is run).
+CANVAS_STAGES = ['write_canvas', 'write_sheet_canvas', 'write_sheet_canvas_merged', 'load_color_arrays']
+
+
+def canvas_stages(size, sheets, folder):
+    """
+    The canvas steps of `canvas.py` and `xlsx.py` (see `canvas_emitter.py` and
+    `xlsx_ingestion.py`), which do not depend on the results table.
+
+    Parameters:
+    - size (int): Number of rows and columns of each canvas.
+    - sheets (int): Number of sheets in the workbook.
+    - folder (str): Where to save the workbook.
+
+    Returns:
+    - list of (str, function, int): Name of each stage, a function that runs it, and its number of cells.
+    """
+    categories = (3, 5) if size % 15 == 0 else (1, 1)
+    x_positions, y_positions, labels = canvas_grid(size, size, categories, 2, 2, 0, 2000, 0, 2000)
+    color_dict = assign_colors(['lightgray', 'gray'], *categories)
+
+    color_array, label_array = make_drawing(size, size)
+    sheet_positions = canvas_positions(size, size, 2, 2, 0, 2000, 0, 2000)
+
+    filename = os.path.join(folder, 'drawings.xlsx')
+    make_workbook(filename, sheets, size)
+
+    stages = [
+        ('write_canvas', lambda: write_canvas(labels, x_positions, y_positions, color_dict, 2, 2, False), len(labels)),
+        ('write_sheet_canvas', lambda: write_sheet_canvas(color_array, label_array, *sheet_positions, 2, 2, False),
+         color_array.size),
+        ('write_sheet_canvas_merged', lambda: write_sheet_canvas(color_array, label_array, *sheet_positions, 2, 2, False,
+                                                                 merge=True), color_array.size),
+        ('load_color_arrays', lambda: load_color_arrays(filename), sheets * size * size),
+    ]
+
+    return stages
+
+
+###############################################################################
+# Measuring
+###############################################################################
+
+def time_stages(stages, selected, repeats):
+    """
+    Time and measure each (selected) stage, printing its results.
+
+    Parameters:
+    - stages (list of tuple): Name, function, and number of input rows of each stage (see `run_stages`).
+    - selected (list of str): Only run these stages (default: all).
+    - repeats (int): Number of timed runs (the best run is reported).
+
+    Returns:
+    - list of (str, int, float, float): Name, number of input rows, time (in seconds), and peak memory (in MB) of each stage.
+    """
+    measured = []
+    for stage, function, rows in stages:
+        if selected is not None and stage not in selected:
+            continue
+
+        seconds, _ = best_time(function, repeats)
+        memory = peak_memory(function)
+        print(f'  {stage:40s} {seconds:8.3f} s {memory:9.1f} MB')
+        measured.append((stage, rows, seconds, memory))
+
+    return measured
+
+
+def environment():
+    """Versions and machine details, so that reports from different machines are not mixed up."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(report, baseline, threshold):
+    """
+    Compare a report's timings against an earlier report.
+
+    Parameters:
+    - report (dict): New report.
+    - baseline (dict): Earlier report.
+    - threshold (float): Ratio (new / old time) above which a stage counts as a regression.
+
+    Returns:
+    - list of dict: Stages (at the same scale) that are slower than the threshold.
+    """
+    def key(result):
+        return (result['stage'], result['participants'], result['items'], result['objects'],
+                result['events'], result['coordinates'], tuple(result['canvas']))
+
+    earlier = {key(result): result for result in baseline['results']}
+    regressions = []
+
+    for result in report['results']:
+        if key(result) not in earlier:
+            continue
+        ratio = result['seconds'] / max(earlier[key(result)]['seconds'], 1e-9)
+        print(f"{result['stage']:40s} {result['participants']:6d} participants: {ratio:6.2f}x the baseline time")
+        if ratio > threshold:
+            regressions.append({**result, 'baseline_seconds': earlier[key(result)]['seconds'], 'ratio': ratio})
+
+    return regressions
+
+
+
+###############################################################################
+# MAIN
+###############################################################################
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+
+    report = {
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'environment': environment(),
+        'repeats': args.repeats,
+        'results': [],
+    }
+
+    # The canvas stages do not depend on the results table: they are timed once (with 0 participants).
+    if args.stages is None or set(args.stages) & set(CANVAS_STAGES):
+        with tempfile.TemporaryDirectory() as folder:
+            print(f'{args.canvas_size} x {args.canvas_size} canvases ({args.sheets} sheets)')
+            for stage, rows, seconds, memory in time_stages(canvas_stages(args.canvas_size, args.sheets, folder),
+                                                            args.stages, args.repeats):
+                report['results'].append({
+                    'stage': stage,
+                    'participants': 0,
+                    'items': 0,
+                    'objects': 0,
+                    'events': 0,
+                    'coordinates': 0,
+                    'canvas': [args.canvas_size, args.canvas_size],
+                    'rows': rows,
+                    'seconds': seconds,
+                    'peak_mb': memory,
+                })
+
+    with ExitStack() as stack:
+        pools = {workers: stack.enter_context(ProcessPoolExecutor(max_workers=workers)) for workers in args.workers}
+
+        for participants in args.participants:
+            results = make_results(participants, args.items, args.objects, args.events, args.coordinates,
+                                   args.width, args.height)
+            events = int((results['Parameter'] == 'Drop').sum()) // (participants * args.items)
+            print(f'{participants} participants x {args.items} items x {args.objects} objects '
+                  f'({len(results)} rows)')
+
+            for stage, rows, seconds, memory in time_stages(run_stages(results, pools), args.stages, args.repeats):
+                report['results'].append({
+                    'stage': stage,
+                    'participants': participants,
+                    'items': args.items,
+                    'objects': args.objects,
+                    'events': events,
+                    'coordinates': args.coordinates,
+                    'canvas': [args.width, args.height],
+                    'rows': rows,
+                    'seconds': seconds,
+                    'peak_mb': memory,
+                })
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output_file)), exist_ok=True)
+    with open(args.output_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f'Report saved as {args.output_file}')
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f'{len(regressions)} stage(s) are more than {args.threshold}x slower than the baseline.')
+            sys.exit(1)
@@ -0,0 +1,227 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+
+
+###############################################################################
+# Constants
+###############################################################################
+
+# Columns of a PC Ibex results file (as named by `process_raw_data`), along with
+# the descriptions in the raw file's header comments.
+RESULTS_COLUMNS = {
+    'Results.reception.time': 'Results reception time',
+    'MD5.hash.of.participant.s.IP.address': "MD5 hash of participant's IP address",
+    'Controller.name': 'Controller name',
+    'Order.number.of.item': 'Order number of item',
+    'Inner.element.number': 'Inner element number',
+    'Label': 'Label',
+    'Latin.Square.Group': 'Latin Square Group',
+    'PennElementType': 'PennElementType',
+    'PennElementName': 'PennElementName',
+    'Parameter': 'Parameter',
+    'Value': 'Value',
+    'EventTime': 'EventTime',
+    'item': 'item',
+    'Comments': 'Comments',
+}
+
+# Label and element name of the synthetic trials (as in the first sample pipeline).
+TRIAL_LABEL = 'trials'
+ELEMENT_NAME = 'experimental-trials'
+
+# First event time (ms since the epoch), and the range of the gaps between events.
+START_TIME = 1743628525864
+EVENT_GAP = (150, 2500)
+
+
+###############################################################################
+# Functions
+###############################################################################
+
+def make_results(participants=10, items=20, objects=6, events=None, coordinates=4,
+                 canvas_width=34, canvas_height=14, seed=0):
+    """
+    Build a synthetic (cleaned) GRIS results table, like the output of
+    `process_raw_data`: every trial has a `Start`, a `Drag` and `Drop` per
+    event, the `Final` positions of the objects, and an `End`.
+
+    Every object is dragged at least once (if there are enough events), and
+    the remaining events move random objects again. No two drops of a trial
+    share a cell, so no drop swaps two objects.
+
+    Parameters:
+    - participants (int): Number of participants.
+    - items (int): Number of items (trials) per participant.
+    - objects (int): Number of objects per trial.
+    - events (int): Number of drag-and-drop events per trial (defaults to 1.5 x objects).
+    - coordinates (int): 2 for (x, y) locations, or 4 for (x_cat, y_cat, x, y).
+    - canvas_width (int): Number of canvas columns.
+    - canvas_height (int): Number of canvas rows.
+    - seed (int): Random seed.
+
+    Returns:
+    - pd.DataFrame: Results table with the columns of `RESULTS_COLUMNS`.
+    """
+    if coordinates not in (2, 4):
+        raise ValueError(f'Coordinates must have 2 or 4 parts, not {coordinates}.')
+
+    rng = np.random.default_rng(seed)
+    events = events if events is not None else (3 * objects) // 2
+    if events > canvas_width * canvas_height:
+        raise ValueError(f'Cannot drop {events} objects on different cells of a '
+                         f'{canvas_width} x {canvas_height} canvas.')
+    num_trials = participants * items
+    rows_per_trial = 2 * events + 3
+
+    # Which object each event moves (every object once first, then at random).
+    moved = np.argsort(rng.random((num_trials, objects)), axis=1)[:, :min(events, objects)]
+    if events > objects:
+        moved = np.concatenate([moved, rng.integers(0, objects, (num_trials, events - objects))], axis=1)
+
+    # Where each event drops its object: the cells of a trial are all different, since GRIS swaps
+    # an object dropped on an occupied cell with its occupant (which `Final` would then reflect).
+    cells = rng.integers(0, canvas_width * canvas_height, (num_trials, events))
+    while True:
+        order = np.argsort(cells, axis=1, kind='stable')
+        repeated = np.diff(np.take_along_axis(cells, order, axis=1), axis=1) == 0
+        if not repeated.any():
+            break
+        rows, columns = np.nonzero(repeated)
+        cells[rows, order[rows, columns + 1]] = rng.integers(0, canvas_width * canvas_height, len(rows))
+
+    # The coordinates of each cell, and its category (aka canvas quadrant).
+    x = cells % canvas_width + 1
+    y = cells // canvas_width + 1
+    x_cat = 1 + (x > canvas_width // 2)
+    y_cat = 1 + (y > canvas_height // 2)
+
+    parts = [x_cat, y_cat, x, y] if coordinates == 4 else [x, y]
+    locations = pd.Series(parts[0].ravel().astype(str))
+    for part in parts[1:]:
+        locations = locations + '%2C ' + pd.Series(part.ravel().astype(str))
+    locations = ('(' + locations + ')').to_numpy().reshape(num_trials, events)
+
+    # Final location of each object (that of its last move).
+    last_move = np.where(moved[:, :, None] == np.arange(objects), np.arange(events)[:, None], -1).max(axis=1)
+    labels = np.array([f'object {obj + 1}' for obj in range(objects)], dtype=object)
+    finals = [';'.join(f'{labels[obj]}:{locations[trial, move]}'
+                       for obj, move in enumerate(last_move[trial]) if move >= 0)
+              for trial in range(num_trials)]
+
+    # Lay out the rows of every trial: Start, (Drag, Drop) x events, Final, End.
+    parameter = np.array(['_Trial_'] + ['Drag', 'Drop'] * events + ['Final', '_Trial_'], dtype=object)
+    element_type = np.array(['PennController'] + ['DragDrop'] * (2 * events + 1) + ['PennController'], dtype=object)
+
+    value = np.empty((num_trials, rows_per_trial), dtype=object)
+    value[:, 0] = 'Start'
+    value[:, 1:-2:2] = labels[moved]
+    value[:, 2:-2:2] = locations
+    value[:, -2] = finals
+    value[:, -1] = 'End'
+
+    comments = np.full((num_trials, rows_per_trial), 'NULL', dtype=object)
+    comments[:, 1:-2:2] = 'Dropped on ' + locations
+    comments[:, 2:-2:2] = 'Dopped ' + labels[moved]
+
+    # Event times increase within each participant (and End shares Final's time).
+    gaps = rng.integers(*EVENT_GAP, (num_trials, rows_per_trial))
+    gaps[:, -1] = 0
+    gaps = gaps.reshape(participants, -1)
+    gaps[:, 0] = 0
+    event_time = START_TIME + np.cumsum(gaps, axis=1).ravel()
+
+    trial = np.repeat(np.arange(num_trials), rows_per_trial)
+    participant = trial // items
+    item = trial % items + 1
+    hashes = np.array([bytes(number).hex() for number in rng.integers(0, 256, (participants, 16), dtype=np.uint8)], dtype=object)
+
+    return pd.DataFrame({
+        'Results.reception.time': (event_time[trial * rows_per_trial + rows_per_trial - 1] // 1000),
+        'MD5.hash.of.participant.s.IP.address': hashes[participant],
+        'Controller.name': 'PennController',
+        'Order.number.of.item': item,
+        'Inner.element.number': 0,
+        'Label': TRIAL_LABEL,
+        'Latin.Square.Group': 'NULL',
+        'PennElementType': np.tile(element_type, num_trials),
+        'PennElementName': np.where(np.tile(element_type, num_trials) == 'DragDrop', ELEMENT_NAME, item.astype(str)),
+        'Parameter': np.tile(parameter, num_trials),
+        'Value': value.ravel(),
+        'EventTime': event_time,
+        'item': np.char.add('item', item.astype(str)),
+        'Comments': comments.ravel(),
+    })
+
+
+def write_raw(df, filepath):
+    """
+    Write a results table as a raw PC Ibex results file (header comments, then unquoted rows).
+
+    Parameters:
+    - df (pd.DataFrame): Output of `make_results`.
+    - filepath (str): Output file.
+
+    Returns:
+    - None
+    """
+    with open(filepath, 'w', encoding='utf-8', newline='\n') as f:
+        f.write('#\n# Results on Wed, 02 Apr 2025 21:15:53 GMT\n#\n')
+        f.write('# Columns below this comment are as follows:\n')
+        for number, description in enumerate(RESULTS_COLUMNS.values(), start=1):
+            f.write(f'# {number}. {description}.\n')
+        df.to_csv(f, header=False, index=False)
+
+
+
+###############################################################################
+# MAIN
+###############################################################################
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-o', '--output_file', type=str,
+                        default='./data/synthetic-raw.csv',
+                        help='Output file.')
+
+    parser.add_argument('--cleaned', action='store_true',
+                        help='Write a cleaned CSV (as from process_raw_data) instead of a raw results file.')
+
+    parser.add_argument('-p', '--participants', type=int, default=10,
+                        help='Number of participants.')
+
+    parser.add_argument('-i', '--items', type=int, default=20,
+                        help='Number of items (trials) per participant.')
+
+    parser.add_argument('-n', '--objects', type=int, default=6,
+                        help='Number of objects per trial.')
+
+    parser.add_argument('-e', '--events', type=int, default=None,
+                        help='Number of drag-and-drop events per trial (defaults to 1.5 x objects).')
+
+    parser.add_argument('-c', '--coordinates', type=int, choices=[2, 4], default=4,
+                        help='Parts per location: (x, y) or (x_cat, y_cat, x, y).')
+
+    parser.add_argument('--width', type=int, default=34,
+                        help='Number of canvas columns.')
+
+    parser.add_argument('--height', type=int, default=14,
+                        help='Number of canvas rows.')
+
+    parser.add_argument('-s', '--seed', type=int, default=0,
+                        help='Random seed.')
+
+    args = parser.parse_args()
+
+    results = make_results(args.participants, args.items, args.objects, args.events, args.coordinates,
+                           args.width, args.height, args.seed)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output_file)), exist_ok=True)
+    if args.cleaned:
+        results.to_csv(args.output_file, index=False)
+    else:
+        write_raw(results, args.output_file)
+    print(f'Wrote {len(results)} rows to {args.output_file}')
@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+import tracemalloc
+
+# The benchmarks are run as scripts (e.g., `python benchmarks/run_benchmarks.py`):
+# importing this module first makes the pipeline modules (`utils`, `gris`, ...) importable.
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+
+###############################################################################
+# Measuring
+###############################################################################
+
+def best_time(function, repeats):
+    """
+    Time several runs of a function.
+
+    Parameters:
+    - function (function): Function to run (without arguments).
+    - repeats (int): Number of timed runs.
+
+    Returns:
+    - seconds (float): Time of the fastest run.
+    - output (object): Output of the last run.
+    """
+    times = []
+    output = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        output = function()
+        times.append(time.perf_counter() - start)
+    return min(times), output
+
+
+def peak_memory(function):
+    """Return the peak memory (in MB) allocated during a run (numpy and pandas included)."""
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024 ** 2
@@ -0,0 +1,99 @@
+import argparse
+import os
+import tempfile
+import numpy as np
+
+from timing import best_time
+from gris.xlsx import load_color_arrays
+
+
+###############################################################################
+# Load arguments
+###############################################################################
+
+parser = argparse.ArgumentParser()
+
+parser.add_argument('-n', '--size', type=int,
+                    default=200,
+                    help='Number of rows and columns of each drawn sheet.')
+
+parser.add_argument('-s', '--sheets', type=int,
+                    default=4,
+                    help='Number of sheets in the workbook.')
+
+parser.add_argument('-r', '--repeats', type=int,
+                    default=3,
+                    help='Number of timed runs (the best run is reported).')
+
+
+
+###############################################################################
+# Functions
+###############################################################################
+
+def legacy_color_arrays(filename):
+    """The original `xlsx.py` reader (full workbook, one coordinate lookup per cell), on every sheet."""
+    from openpyxl import load_workbook
+    from openpyxl.utils import get_column_letter
+
+    workbook = load_workbook(filename)
+    color_arrays = {}
+    for sheet in workbook.worksheets:
+        num_rows, num_cols = sheet.max_row, sheet.max_column
+        array = np.empty((num_rows, num_cols), dtype=object)
+        for row in range(1, num_rows+1):
+            for column in range(1, num_cols+1):
+                color = sheet[get_column_letter(column)+str(row)].fill.start_color.index
+                array[row-1, column-1] = f'#{color[2:]}'
+        color_arrays[sheet.title] = array
+
+    return color_arrays
+
+
+def make_workbook(filename, num_sheets, size, num_colors=4, block=7):
+    """A workbook of drawn canvases (square blocks of filled cells, with a few cells left empty)."""
+    from openpyxl import Workbook
+    from openpyxl.styles import PatternFill
+
+    fills = [PatternFill('solid', start_color=f'FF{index * 40:02X}{index * 20:02X}{index * 10:02X}')
+             for index in range(num_colors)]
+
+    workbook = Workbook()
+    workbook.remove(workbook.active)
+    for position in range(num_sheets):
+        sheet = workbook.create_sheet(f'drawing{position}')
+        for row in range(size):
+            for column in range(size):
+                if (row + column + position) % 11 == 0:
+                    continue
+                color = (row // block * 3 + column // block + position) % num_colors
+                sheet.cell(row=row + 1, column=column + 1).fill = fills[color]
+    workbook.save(filename)
+
+
+
+
+###############################################################################
+# MAIN
+###############################################################################
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        filename = os.path.join(folder, 'drawings.xlsx')
+        make_workbook(filename, args.sheets, args.size)
+        print(f'{args.sheets} sheets of {args.size} x {args.size} cells')
+
+        legacy_time, legacy = best_time(lambda: legacy_color_arrays(filename), args.repeats)
+        bulk_time, bulk = best_time(lambda: load_color_arrays(filename), args.repeats)
+
+    assert list(legacy) == list(bulk)
+    for sheetname in legacy:
+        assert legacy[sheetname].shape == bulk[sheetname].shape
+        assert (legacy[sheetname] == bulk[sheetname]).all()
+    print('identical colors on every sheet')
+
+    print(f'legacy (full workbook, per cell): {legacy_time:8.3f} s')
+    print(f'read-only, bulk:                  {bulk_time:8.3f} s')
+    print(f'speedup:                          {legacy_time / bulk_time:8.1f}x')
@@ -0,0 +1,490 @@
+import os
+import json
+import time
+import pickle
+import hashlib
+import inspect
+import argparse
+import sys
+import sysconfig
+import weakref
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+
+###############################################################################
+# Constants
+###############################################################################
+
+# Where cached stage outputs are stored (relative to where you run the pipeline).
+CACHE_DIR = './.gris_cache'
+
+# Once the cache is larger than this, the least recently used outputs are removed.
+MAX_CACHE_BYTES = 2 * 1024 ** 3
+
+# Name of the file that remembers the hash of each input file (by size and time
+# modified), so that unchanged files are not re-read just to be hashed.
+FILE_INDEX = 'files.json'
+
+# Extension of cached stage outputs.
+ENTRY_EXTENSION = '.pkl'
+
+# Bytes read at a time when hashing a file.
+HASH_BLOCK_SIZE = 1 << 20
+
+# Number of rows (evenly spaced) sampled to check that a cached dataframe is unchanged.
+FINGERPRINT_ROWS = 64
+
+# Part of every stage key: bump it to invalidate every cached output (e.g., after
+# a change that the source hashes cannot see, like a data file read by a stage).
+CACHE_VERSION = 1
+
+# Where installed libraries live (their code is keyed by version, not by source).
+LIBRARY_PATHS = tuple(sorted({os.path.abspath(sysconfig.get_paths()[name])
+                              for name in ('stdlib', 'platstdlib', 'purelib', 'platlib')}))
+
+
+###############################################################################
+# Hashing
+###############################################################################
+
+def hash_file(filepath):
+    """
+    Hash the contents of a file.
+
+    Parameters:
+    - filepath (str): File to hash.
+
+    Returns:
+    - str: SHA-256 hex digest of the file.
+    """
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_column(digest, values):
+    """
+    Add the contents of a column to a hash: numeric columns and Arrow-backed
+    columns (e.g., strings) through their buffers, and others value by value.
+
+    Parameters:
+    - digest (hashlib hash): Hash to update.
+    - values (pd.Series): Column to hash.
+
+    Returns:
+    - None
+    """
+    dtype = values.dtype
+    if isinstance(dtype, np.dtype) and dtype.kind in 'biufcmM':
+        digest.update(np.ascontiguousarray(values.to_numpy()).data)
+        return
+
+    if isinstance(dtype, pd.ArrowDtype) or getattr(dtype, 'storage', None) == 'pyarrow':
+        import pyarrow as pa
+
+        array = pa.array(values.array)
+        digest.update(f'{array.offset}:{len(array)}'.encode())
+        for buffer in array.buffers():
+            if buffer is not None:
+                digest.update(buffer)
+        return
+
+    try:
+        digest.update(pd.util.hash_pandas_object(values, index=False).to_numpy().tobytes())
+    except TypeError:
+        # Columns of unhashable objects (e.g., lists) are hashed through their pickle.
+        digest.update(pickle.dumps(values.to_numpy(), protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def hash_frame(df):
+    """
+    Hash the contents of a dataframe (its values, index, columns, and dtypes).
+
+    Parameters:
+    - df (pd.DataFrame): Dataframe to hash.
+
+    Returns:
+    - str: SHA-256 hex digest of the dataframe.
+    """
+    digest = hashlib.sha256()
+    digest.update(repr(list(df.columns)).encode())
+    digest.update(repr([str(dtype) for dtype in df.dtypes]).encode())
+    digest.update(pd.util.hash_pandas_object(df.index).to_numpy().tobytes())
+
+    for position in range(df.shape[1]):
+        hash_column(digest, df.iloc[:, position])
+
+    return digest.hexdigest()
+
+
+def fingerprint_frame(df):
+    """
+    Cheap check of a dataframe's contents: its shape, columns, dtypes, and a
+    sample of its rows (see `FINGERPRINT_ROWS`). Changes that add or drop rows
+    or columns, change a dtype, or touch a sampled row are caught; other
+    in-place edits are not.
+
+    Parameters:
+    - df (pd.DataFrame): Dataframe to check.
+
+    Returns:
+    - str: SHA-256 hex digest of the sample.
+    """
+    positions = np.unique(np.linspace(0, len(df) - 1, min(len(df), FINGERPRINT_ROWS)).astype(np.int64))
+    return f'{df.shape}:{hash_frame(df.iloc[positions])}'
+
+
+def local_module(obj):
+    """The module (of this project, not an installed library) that defines `obj`, if any."""
+    module = obj if inspect.ismodule(obj) else sys.modules.get(getattr(obj, '__module__', None) or '')
+    filepath = getattr(module, '__file__', None)
+    if filepath is None or not filepath.endswith('.py'):
+        return None
+    if os.path.abspath(filepath).startswith(LIBRARY_PATHS):
+        return None
+    return module
+
+
+def module_dependencies(module):
+    """
+    A module, and every module of this project that it uses (directly or not),
+    found through the names it imports.
+
+    Parameters:
+    - module (module): Module to start from.
+
+    Returns:
+    - list of module: The modules, sorted by name.
+    """
+    found = {}
+    pending = [module]
+    while pending:
+        module = pending.pop()
+        if module is None or module.__name__ in found:
+            continue
+        found[module.__name__] = module
+        pending += [local_module(value) for value in vars(module).values()
+                    if inspect.ismodule(value) or hasattr(value, '__module__')]
+    return [found[name] for name in sorted(found)]
+
+
+@lru_cache(maxsize=None)
+def hash_source(module):
+    """SHA-256 hex digest of a module's source file."""
+    with open(module.__file__, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def hash_function(func):
+    """
+    Hash a function by its name and source code, and by the source of every
+    module of this project it depends on (e.g., `utils.py` and `distances.py`
+    for `compute_pairwise_distances`), so that editing the function or anything
+    it calls invalidates its cached outputs. Library functions (e.g., `pd.read_csv`)
+    are keyed by the pandas version instead.
+
+    Parameters:
+    - func (function): Function to hash.
+
+    Returns:
+    - str: SHA-256 hex digest of the function.
+    """
+    name = f'{getattr(func, "__module__", "")}.{getattr(func, "__qualname__", repr(func))}'
+    try:
+        source = inspect.getsource(func)
+    except (OSError, TypeError):
+        source = ''
+
+    digest = hashlib.sha256(f'{CACHE_VERSION}\n{pd.__version__}\n{name}\n{source}'.encode())
+    for module in module_dependencies(local_module(func)):
+        digest.update(f'\n{module.__name__}:{hash_source(module)}'.encode())
+
+    return digest.hexdigest()
+
+
+###############################################################################
+# Cache
+###############################################################################
+
+class Cache:
+    """
+    Content-addressed, on-disk cache of pipeline stage outputs.
+
+    Each output is stored under a key made from the function (name and source,
+    along with the modules it depends on), its parameters, and the keys of its
+    inputs. Input files are keyed by the hash of their contents, and dataframes
+    returned by the cache remember the key they were stored under, so a whole
+    chain of stages (e.g., `compute_action_times` -> `expand_graphs` ->
+    `compute_pairwise_distances`) is keyed by where its data came from, without
+    hashing any data. Other dataframes, and cached ones whose fingerprint (see
+    `fingerprint_frame`) has changed since, are keyed by the hash of their contents.
+
+    Outputs are pickled (which keeps every dtype, and tuples like `location`,
+    exactly), and the least recently used ones are removed once the cache grows
+    past `max_bytes`.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lineage = {}
+        os.makedirs(directory, exist_ok=True)
+
+    ##### KEYS
+    def entry_path(self, key):
+        """Path of the cached output stored under `key`."""
+        return os.path.join(self.directory, key + ENTRY_EXTENSION)
+
+    def file_key(self, filepath):
+        """
+        Key of an input file: the hash of its contents, which is only recomputed
+        when the file's size or time modified changes.
+
+        Parameters:
+        - filepath (str): Input file.
+
+        Returns:
+        - str: Hash of the file.
+        """
+        index_path = os.path.join(self.directory, FILE_INDEX)
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+
+        stat = os.stat(filepath)
+        path = os.path.abspath(filepath)
+        signature = [stat.st_size, stat.st_mtime_ns]
+
+        if path in index and index[path]['signature'] == signature:
+            return index[path]['hash']
+
+        index[path] = {'signature': signature, 'hash': hash_file(filepath)}
+        self._write_atomic(index_path, json.dumps(index).encode())
+        return index[path]['hash']
+
+    def value_key(self, value):
+        """
+        Key of a stage input: the key it was cached under (for outputs of the
+        cache whose fingerprint has not changed since), the hash of its contents
+        (for other dataframes), or its repr.
+
+        Parameters:
+        - value (object): Stage input.
+
+        Returns:
+        - str: Key of the input.
+        """
+        if isinstance(value, pd.DataFrame):
+            known = self.lineage.get(id(value))
+            if known is not None and known[0]() is value and known[1] == fingerprint_frame(value):
+                return known[2]
+            return hash_frame(value)
+
+        if isinstance(value, (list, tuple)):
+            return repr(type(value)(self.value_key(item) for item in value))
+
+        if isinstance(value, dict):
+            return repr(sorted((str(k), self.value_key(v)) for k, v in value.items()))
+
+        return repr(value)
+
+    def stage_key(self, func, args, kwargs):
+        """Key of a stage output: the function, plus the keys of its arguments."""
+        parts = [hash_function(func)]
+        parts += [self.value_key(arg) for arg in args]
+        parts += [f'{name}={self.value_key(kwargs[name])}' for name in sorted(kwargs)]
+        return hashlib.sha256('\n'.join(parts).encode()).hexdigest()
+
+    def remember(self, value, key):
+        """Remember the key (and fingerprint) of each dataframe in a stage output (see `value_key`)."""
+        if isinstance(value, pd.DataFrame):
+            self.lineage[id(value)] = (weakref.ref(value), fingerprint_frame(value), key)
+        elif isinstance(value, tuple):
+            for position, item in enumerate(value):
+                self.remember(item, f'{key}:{position}')
+        return value
+
+    ##### STORAGE
+    def _write_atomic(self, path, data):
+        """Write a file all at once (so an interrupted run never leaves half a file)."""
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, path)
+
+    def get(self, key):
+        """
+        Load the output stored under `key`.
+
+        Parameters:
+        - key (str): Key of the output.
+
+        Returns:
+        - found (bool): Whether the output is cached.
+        - value (object): The output (None if not found).
+        """
+        path = self.entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return False, None
+
+        # Mark the output as recently used.
+        os.utime(path)
+        return True, value
+
+    def put(self, key, value):
+        """
+        Store an output under `key`, then make room if the cache is too large.
+
+        Parameters:
+        - key (str): Key of the output.
+        - value (object): Output to store.
+
+        Returns:
+        - None
+        """
+        self._write_atomic(self.entry_path(key), pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        self.evict()
+
+    def entries(self):
+        """Cached outputs, as (path, size in bytes, time last used), least recently used first."""
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.endswith(ENTRY_EXTENSION):
+                    stat = entry.stat()
+                    entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def size(self):
+        """Total size (in bytes) of the cached outputs."""
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, max_bytes=None):
+        """
+        Remove the least recently used outputs until the cache fits in `max_bytes`.
+
+        Parameters:
+        - max_bytes (int): Size to fit in (defaults to `self.max_bytes`).
+
+        Returns:
+        - int: Number of outputs removed.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+
+        removed = 0
+        for path, size, _ in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+
+        return removed
+
+    def clear(self):
+        """Remove every cached output (and the hashes of the input files)."""
+        self.evict(max_bytes=0)
+        index_path = os.path.join(self.directory, FILE_INDEX)
+        if os.path.exists(index_path):
+            os.remove(index_path)
+        self.lineage.clear()
+
+    ##### STAGES
+    def load(self, filepath, reader=pd.read_csv, **kwargs):
+        """
+        Read an input file, keyed by the hash of its contents (plus the reader and its options).
+
+        Parameters:
+        - filepath (str): Input file.
+        - reader (function): Function that reads the file (e.g., `pd.read_csv`).
+        - kwargs: Extra options for the reader.
+
+        Returns:
+        - object: Output of `reader(filepath, **kwargs)`.
+        """
+        key = self.stage_key(reader, [f'file:{self.file_key(filepath)}'], kwargs)
+        found, value = self.get(key)
+        if not found:
+            value = reader(filepath, **kwargs)
+            self.put(key, value)
+        return self.remember(value, key)
+
+    def run(self, func, *args, **kwargs):
+        """
+        Run a pipeline stage, or load its output if it has already been run on
+        the same inputs with the same parameters, e.g.
+        `cache.run(compute_pairwise_distances, graphs, group_cols=['Participant', 'item'])`.
+
+        Parameters:
+        - func (function): Stage to run.
+        - args: Positional arguments of the stage.
+        - kwargs: Keyword arguments of the stage.
+
+        Returns:
+        - object: Output of `func(*args, **kwargs)`.
+        """
+        key = self.stage_key(func, args, kwargs)
+        found, value = self.get(key)
+        if not found:
+            value = func(*args, **kwargs)
+            self.put(key, value)
+        return self.remember(value, key)
+
+    def cached(self, func):
+        """Decorator version of `run` (e.g., `@cache.cached` above a stage of your own)."""
+        def wrapper(*args, **kwargs):
+            return self.run(func, *args, **kwargs)
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        wrapper.__wrapped__ = func
+        return wrapper
+
+
+
+###############################################################################
+# MAIN
+###############################################################################
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-c', '--cache_dir', type=str,
+                        default=CACHE_DIR,
+                        help='Cache directory.')
+
+    parser.add_argument('--clear', action='store_true',
+                        help='Remove every cached output.')
+
+    parser.add_argument('--max_mb', type=float,
+                        default=None,
+                        help='Remove the least recently used outputs until the cache fits in this many megabytes.')
+
+    args = parser.parse_args()
+
+    cache = Cache(args.cache_dir)
+    if args.clear:
+        cache.clear()
+    elif args.max_mb is not None:
+        cache.evict(int(args.max_mb * 1024 ** 2))
+
+    entries = cache.entries()
+    print(f'{len(entries)} cached output(s), {sum(size for _, size, _ in entries) / 1024 ** 2:.1f} MB '
+          f'in {args.cache_dir}')
+    if entries:
+        print(f'Last used: {time.ctime(entries[-1][2])}')
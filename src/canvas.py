@@ -1,12 +1,16 @@
 import argparse
-import numpy as np
-import pandas as pd
-import math
+import os
+import sys
+from gris.canvas import (NUM_COLUMNS, NUM_ROWS, WIDTH, HEIGHT, X_MIN, X_MAX, Y_MIN, Y_MAX,
+                         CATEGORIES, COLORS, canvas_grid, assign_colors, write_canvas)
+from gris.batch import OUTPUT_FOLDER, MANIFEST_NAME, load_spec, resolve_canvases, build_batch, write_manifest
 
 ###############################################################################
 # Load arguments 
 ###############################################################################
 
+# The canvas functions live in `gris/canvas.py` (importable without side
+# effects); this script only reads the command line and writes the file.
 parser = argparse.ArgumentParser()
 
 parser.add_argument('-o', '--output_name', type=str,
@@ -14,285 +18,111 @@ parser.add_argument('-o', '--output_name', type=str,
                     help='Output data file.')
 
 parser.add_argument('-c', '--categories', type=int,
-                    default=[1,1],
+                    default=list(CATEGORIES),
                     nargs=2,
                     help='Specify distinct number of categories for rows X and columns Y in form X Y.')
 
-parser.add_argument('-s', '--shades', type=list,
+parser.add_argument('-s', '--shades', type=str,
                     nargs='+', 
-                    default=['lightgray'],
+                    default=list(COLORS),
                     help='Number of colors for canvas.')
 
 parser.add_argument('-nc', '--num_columns', type=int,
-                    default=34,
+                    default=NUM_COLUMNS,
                     help='Number of columns.')
 
 parser.add_argument('-nr', '--num_rows', type=int,
-                    default=14,
+                    default=NUM_ROWS,
                     help='Number of rows.')
 
 parser.add_argument('-cw', '--width', type=str,
-                    default=30,
+                    default=WIDTH,
                     help='Column width (in pixels.')
 
 parser.add_argument('-hr', '--height', type=str, 
-                    default=30,
+                    default=HEIGHT,
                     help='Row height (in pixels).')
 
 parser.add_argument('-xmin', '--x_minimum', type=int,
-                    default=250,
+                    default=X_MIN,
                     help='Leftmost bound of the canvas on the screen.')
 
 parser.add_argument('-xmax', '--x_maximum', type=int,
-                    default=1270,
+                    default=X_MAX,
                     help='Rightmost bound of canvas on the screen.')
 
 parser.add_argument('-ymin', '--y_minimum', type=int,
-                    default=50,
+                    default=Y_MIN,
                     help='Topmost bound of the canvas on the screen.')
 
 parser.add_argument('-ymax', '--y_maximum', type=int,
-                    default=470,
+                    default=Y_MAX,
                     help='Bottommost bound of the canvas on the screen.')
 
 parser.add_argument('-a', '--auto_fit', action='store_true',
                     default=False,
                     help='Build that automatically scales.')
 
-args = parser.parse_args()
-
-
-OUTPUT_NAME = args.output_name
-CATEGORIES = args.categories
-COLORS = args.shades 
-NUM_COLS = int(args.num_columns)
-NUM_ROWS = int(args.num_rows)
-WIDTH = int(args.width)
-HEIGHT = int(args.height)
-XMIN = args.x_minimum 
-XMAX = args.x_maximum
-YMIN = args.y_minimum
-YMAX = args.y_maximum
-
-if args.auto_fit:
-    XMIN = 0
-    XMAX = 100
-    YMIN = 0 
-    YMAX = 100
-
-    # Ensure autofit boundaries to reduce scrolling
-    if NUM_COLS*WIDTH >= 100:
-        raise Exception('Width specification too wide for autofit specification; please ensure the total width <100vh.')
-    if NUM_ROWS*HEIGHT >= 100:
-        raise Exception('Height specification too wide for autofit specification; please ensure the total height <100 vh.')
-
-
-# Ensure non-zero amount of categories
-if 0 in set(CATEGORIES):
-    raise Exception('Failed to specify number of rows or columns.')
+parser.add_argument('-m', '--merge', action='store_true',
+                    default=False,
+                    help='Merge the rectangle of same-colored cells of each category into a single canvas, for far fewer page elements.')
 
-# Multiple shades should be whole strings 
-if len(COLORS) > 1: 
-    COLORS = [''.join(shade) for shade in COLORS]
+parser.add_argument('--spec', type=str,
+                    default=None,
+                    help='Build every canvas listed in a JSON, TOML, or YAML spec file (instead of a single canvas).')
 
-# Single shades should also be one string:
-if (len(COLORS) == 1) and (COLORS[0][0] == '#'):
-    COLORS = [''.join(string) for string in COLORS]
+parser.add_argument('--output_folder', type=str,
+                    default=None,
+                    help="Output folder of a spec's canvases (defaults to the spec's output_folder, or ./outputs/canvases).")
 
-# Ensure subdivisions for both rows and cols 
-if (CATEGORIES[0] != 0) and (NUM_COLS % CATEGORIES[0] != 0):
-    raise Exception('Specified number of columns cannot be evenly divided by the number of column categories.')
+parser.add_argument('--manifest', type=str,
+                    default=None,
+                    help="Manifest of a spec's canvases (defaults to manifest.json in the output folder).")
 
-if (CATEGORIES[1] != 0) and (NUM_ROWS % CATEGORIES[1] != 0):
-    raise Exception('Specified number of rows cannot be evenly divided by the number of row categories.')
+parser.add_argument('-w', '--workers', type=int,
+                    default=1,
+                    help="Number of worker processes that build a spec's canvases.")
 
 
 
 
 
 ###############################################################################
-# Functions
+# Generate canvas code 
 ###############################################################################
 
-##### WRITING IBEX CODE 
-# Constructs newCanvas objects
-def make_newCanvas(label, xlocation, ylocation, color, 
-                   width=WIDTH, height=HEIGHT, autofit=False):
-
-    if autofit == True:
-        return f'newCanvas("{label}", "{width}vw", "{height}vh").color("{color}").print("{xlocation}", "{ylocation}"),'
-    
-    return f'newCanvas("{label}", {width}, {height}).color("{color}").print({xlocation}, {ylocation}),'
-
-# Constructs getCanvas objects
-def make_getCanvas(label):
-    return f'getCanvas("{label}"),'
-
-
-
-##### CANVAS OPERATIONS
-
-# Find the locations for all canvas values
-def generate_range(midpoint, step, num_X):
-    
-    # num_X is the number of rows/columns that we want.
-    # Repetitions is the number of canvases we want on each side
-    # of the midpoint.
-    
-    step = int(step)
-    repetitions = num_X/2 
-
-    # If repetitions isn't an integer, set the first cell to cross the midpoint.
-    if repetitions != int(repetitions):
-        midpoint = midpoint - (step / 2)
-    
-    # Calculate steps from the midpoint 
-    int_repetitions = math.floor(repetitions)
-    left_steps = [midpoint - i * step for i in range(int_repetitions, -1, -1)]
-    
-    # Odd number of repetitions have extra value (center)
-    if repetitions != int(repetitions):
-        right_steps = [midpoint + i * step for i in range(1, int_repetitions + 1)]
-    
-    # Even number of repetitions have the same number of X on other side of the midpoint
-    else:
-        right_steps = [midpoint + i * step for i in range(1, int_repetitions)]
-    
-    return left_steps + right_steps
-
-
-
-# Centers canvas both horizontally/vertically; x-range (250, 1270) | y-range (50, 470)
-def canvas_positions(num_rows=NUM_ROWS, num_cols=NUM_COLS,
-                     col_width=WIDTH, row_height=HEIGHT,
-                     x_min=XMIN, x_max=XMAX, 
-                     y_min=YMIN, y_max=YMAX):
-    
-    # Spread outward from the center:
-    x_mid = (x_max+x_min)/2 
-    y_mid = (y_max+y_min)/2
-    
-    # Column positions 
-    col_positions = generate_range(x_mid, col_width, num_cols) 
-    
-    # Row positions    
-    row_positions = generate_range(y_mid, row_height, num_rows)
-
-    return col_positions, row_positions 
-
-
-
-# Make (grid) labels for categorical canvases
-def canvas_labels(num_rows=NUM_ROWS, num_cols=NUM_COLS,
-                  categories = CATEGORIES):
-    
-    # Blank canvas condition | Covers case where people leave default
-    # category specification, or choose its flip ([0,1])
-    if np.prod(categories) == 1:
-        return [(1, 1, x, y) for x in range(num_cols) for y in range(num_rows)]
-
-    # Category canvas condition
-
-    cat_cols = args.categories[0]
-    cat_rows = args.categories[1]
-    
-    # Building arrays that are easy to loop through (ugly, but clean) |
-    # accounts for 0 specification
-    col_bins = np.array_split([x for x in range(num_cols)], max(cat_cols, 1))
-    row_bins = np.array_split([y for y in range(num_rows)], max(cat_rows, 1))
-    
-    # More ugliness, but accounts for 0 specification
-    labels = []
-    for c_idx, c_bin in enumerate(col_bins):
-        for r_idx, r_bin in enumerate(row_bins):
-            c_vals = c_bin if c_bin.size else [0]
-            r_vals = r_bin if r_bin.size else [0]
-            for c_val in c_vals:
-                for r_val in r_vals:
-                    labels.append((c_idx, r_idx, c_val, r_val))
-    
-    return labels 
-
-
-# Assign colors to categories:
-def assign_colors(colors=COLORS, cat_cols = CATEGORIES[0], cat_rows = CATEGORIES[1]):
-    color_count = len(colors)
-    pos2color = dict()
-    
-    print('# COLOR-CATEGORY MATCHING #')
-    
-    # Handling blank canvas case
-    if (cat_cols == 1) and (cat_rows == 1):
-        pos2color[(1, 1)] = colors[0]
-        print(1, 1, colors[0])
-        return pos2color 
-    
-    # All other cases
-    for x in range(cat_cols):
-        for y in range(cat_rows):
-            shade = colors[(x * cat_rows + y) % color_count]
-            print(x, y, shade)
-            pos2color[(x, y)] = shade 
-    
-    return pos2color 
-
+if __name__ == '__main__':
 
+    args = parser.parse_args()
 
+    # Batch mode: every canvas of a spec file, plus a manifest of the outputs
+    if args.spec is not None:
+        spec = load_spec(args.spec)
+        canvases = resolve_canvases(spec, args.output_folder)
+        records = build_batch(canvases, args.workers)
 
+        folder = args.output_folder or (spec.get('output_folder') if isinstance(spec, dict) else None) or OUTPUT_FOLDER
+        manifest = args.manifest or os.path.join(folder, MANIFEST_NAME)
+        write_manifest(records, manifest)
 
+        failed = [record for record in records if 'error' in record]
+        for record in failed:
+            print(f"{record['name']}: {record['error']}")
+        print(f'Built {len(records) - len(failed)} of {len(records)} canvases; manifest saved as {manifest}')
+        sys.exit(1 if failed else 0)
 
-###############################################################################
-# Generate canvas code 
-###############################################################################
+    width, height = int(args.width), int(args.height)
+    x_positions, y_positions, labels = canvas_grid(int(args.num_rows), int(args.num_columns), args.categories,
+                                                   width, height,
+                                                   args.x_minimum, args.x_maximum, args.y_minimum, args.y_maximum,
+                                                   args.auto_fit)
+    color_dict = assign_colors(args.shades, *args.categories)
 
-if __name__ == '__main__':
+    print('# COLOR-CATEGORY MATCHING #')
+    for (x, y), shade in color_dict.items():
+        print(x, y, shade)
 
-    # Build positions
-    x_positions, y_positions = canvas_positions()
-
-    if (max(set(x_positions)) > XMAX) or (min(set(x_positions)) < XMIN):
-        raise Exception('Columns do not fit within bounds. Either specify fewer columns, increase horizontal bounds, or decrease column width.')
-
-    if (max(set(y_positions)) > YMAX) or (min(set(y_positions)) < YMIN):
-        raise Exception('Rows do not fit within bounds. Either specify fewer rows, increase vertical bounds, or decrease row height.')
-
-    positions = [(x_pos, y_pos) for y_pos in y_positions for x_pos in x_positions]
-    
-    # Build labels
-    labels = canvas_labels()
-    
-    # Build color_dict
-    color_dict = assign_colors()
-
-    # Ensure that the number of positions are identical to the number of labels
-    assert len(positions) == len(labels)
-
-    # Adding newCanvas Header
-    canvas_string = '############### NEW CANVAS ###############\n'
-    
-    # Building newCanvas items
-    idx1 = 0
-    for label in labels:
-        if label[0] != idx1:
-            idx1 += 1 
-            canvas_string += '\n'
-        if args.auto_fit:
-            canvas_string += make_newCanvas(label, f'{x_positions[label[2]]}vw', f'{y_positions[label[3]]}vh', color_dict[(label[0], label[1])], autofit=True)
-        else:
-            canvas_string += make_newCanvas(label, x_positions[label[2]], y_positions[label[3]], color_dict[(label[0], label[1])])
-
-    # Adding getCanvas Header
-    canvas_string += '\n\n\n\n\n############### GET CANVAS ###############\n'
-
-    # Building getCanvas items
-    idx2 = 0 
-    for label in labels:
-        if label[0] != idx2:
-            idx2 += 1
-            canvas_string += '\n'
-
-        canvas_string += make_getCanvas(label)
-
-    # Write to file
-    with open(OUTPUT_NAME, 'w') as w:
-        w.write(canvas_string)
+    # Write to file (as it is generated)
+    with open(args.output_name, 'w') as w:
+        write_canvas(labels, x_positions, y_positions, color_dict, width, height, args.auto_fit, out=w,
+                     merge=args.merge)
@@ -1,4 +1,5 @@
 import argparse
+from gris.colorize import colorize, colorize_file
 
 
 ###############################################################################
@@ -23,8 +24,6 @@ parser.add_argument('-n', '--output_name', type=str,
                     default='./data/sample_canvas_output.txt', 
                     help='Output canvas file.')
 
-args = parser.parse_args()
-
 
 
 
@@ -32,15 +31,9 @@ args = parser.parse_args()
 # Change colors
 ###############################################################################
 
-# Colorize function
-def colorize(canvas_string, input_hex, output_hex):
-    return canvas_string.replace(f".color('{input_hex}')", f".color('{output_hex}')")
-
+# The colorize function lives in `gris/colorize.py`
 if __name__ == '__main__':
 
-    with open(args.input_canvas) as inp:
-        canvas = inp.read()
-
-    with open(args.output_name, 'w') as out:
-        out.write(colorize(canvas, args.input_hex, args.output_hex))
+    args = parser.parse_args()
 
+    colorize_file(args.input_canvas, args.output_name, args.input_hex, args.output_hex)
@@ -0,0 +1,167 @@
+import numpy as np
+from gris.canvas import WIDTH, HEIGHT
+
+
+###############################################################################
+# Distance metrics
+###############################################################################
+
+# All metrics take two arrays of coordinates with the same shape (..., 2) or
+# (..., 4), where the last axis is (x, y) or (x_cat, y_cat, x, y), and return
+# one distance per coordinate pair (aka the last axis is reduced).
+
+# Cell size (in pixels) of the default canvas built by `canvas.py`.
+CELL_WIDTH = WIDTH
+CELL_HEIGHT = HEIGHT
+
+
+def _deltas(coords1, coords2, dims):
+    """Differences between the selected dimensions of two coordinate arrays (as floats)."""
+    coords1 = np.asarray(coords1)
+    coords2 = np.asarray(coords2)
+    return coords1[..., dims].astype(np.float64) - coords2[..., dims].astype(np.float64)
+
+
+def gradient_distance(coords1, coords2):
+    """
+    Euclidean distance between positions (the last two coordinates).
+
+    Parameters:
+    - coords1 (np.ndarray of int): Coordinates with dimensions (x, y) or (x_cat, y_cat, x, y).
+    - coords2 (np.ndarray of int): Coordinates with dimensions (x, y) or (x_cat, y_cat, x, y).
+
+    Returns:
+    - np.ndarray of float: Distance between each pair of coordinates.
+    """
+    deltas = _deltas(coords1, coords2, slice(-2, None))
+    return np.sqrt((deltas ** 2).sum(axis=-1))
+
+
+def categorical_distance(coords1, coords2):
+    """
+    Euclidean distance between categories (the first two coordinates).
+
+    Parameters:
+    - coords1 (np.ndarray of int): Coordinates with dimensions (x_cat, y_cat, x, y).
+    - coords2 (np.ndarray of int): Coordinates with dimensions (x_cat, y_cat, x, y).
+
+    Returns:
+    - np.ndarray of float: Distance between each pair of coordinates.
+    """
+    deltas = _deltas(coords1, coords2, slice(None, 2))
+    return np.sqrt((deltas ** 2).sum(axis=-1))
+
+
+def combined_distance(coords1, coords2, category_weight=1.0):
+    """
+    Weighted categorical distance plus the gradient distance, so that objects
+    in different categories are always pushed further apart than their
+    positions alone would suggest. Two-part coordinates have no categories,
+    so this is just the gradient distance for them.
+
+    Parameters:
+    - coords1 (np.ndarray of int): Coordinates with dimensions (x, y) or (x_cat, y_cat, x, y).
+    - coords2 (np.ndarray of int): Coordinates with dimensions (x, y) or (x_cat, y_cat, x, y).
+    - category_weight (float): How much one step between categories counts for.
+
+    Returns:
+    - np.ndarray of float: Distance between each pair of coordinates.
+    """
+    distances = gradient_distance(coords1, coords2)
+
+    if np.shape(coords1)[-1] == 4:
+        distances = distances + category_weight * categorical_distance(coords1, coords2)
+
+    return distances
+
+
+def manhattan_distance(coords1, coords2):
+    """
+    City-block distance between positions (aka the number of cells moved
+    horizontally plus the number of cells moved vertically).
+
+    Parameters:
+    - coords1 (np.ndarray of int): Coordinates with dimensions (x, y) or (x_cat, y_cat, x, y).
+    - coords2 (np.ndarray of int): Coordinates with dimensions (x, y) or (x_cat, y_cat, x, y).
+
+    Returns:
+    - np.ndarray of float: Distance between each pair of coordinates.
+    """
+    deltas = _deltas(coords1, coords2, slice(-2, None))
+    return np.abs(deltas).sum(axis=-1)
+
+
+def chebyshev_distance(coords1, coords2):
+    """
+    Chessboard distance between positions (aka the larger of the horizontal
+    and vertical number of cells moved).
+
+    Parameters:
+    - coords1 (np.ndarray of int): Coordinates with dimensions (x, y) or (x_cat, y_cat, x, y).
+    - coords2 (np.ndarray of int): Coordinates with dimensions (x, y) or (x_cat, y_cat, x, y).
+
+    Returns:
+    - np.ndarray of float: Distance between each pair of coordinates.
+    """
+    deltas = _deltas(coords1, coords2, slice(-2, None))
+    return np.abs(deltas).max(axis=-1)
+
+
+def grid_distance(coords1, coords2, cell_width=CELL_WIDTH, cell_height=CELL_HEIGHT):
+    """
+    Euclidean distance between positions on the screen, accounting for the
+    width and height of the canvas cells (which need not be square).
+
+    Parameters:
+    - coords1 (np.ndarray of int): Coordinates with dimensions (x, y) or (x_cat, y_cat, x, y).
+    - coords2 (np.ndarray of int): Coordinates with dimensions (x, y) or (x_cat, y_cat, x, y).
+    - cell_width (float): Column width (as in `canvas.py`'s `--width`).
+    - cell_height (float): Row height (as in `canvas.py`'s `--height`).
+
+    Returns:
+    - np.ndarray of float: Distance between each pair of coordinates.
+    """
+    deltas = _deltas(coords1, coords2, slice(-2, None)) * np.array([cell_width, cell_height], dtype=np.float64)
+    return np.sqrt((deltas ** 2).sum(axis=-1))
+
+
+# Metrics that can be selected by name (e.g., in `utils.compute_pairwise_distances`).
+METRICS = {
+    'gradient': gradient_distance,
+    'categorical': categorical_distance,
+    'combined': combined_distance,
+    'manhattan': manhattan_distance,
+    'chebyshev': chebyshev_distance,
+    'grid': grid_distance,
+}
+
+
+def get_metric(name):
+    """
+    Look up a distance metric by name.
+
+    Parameters:
+    - name (str): One of the keys of `METRICS`.
+
+    Returns:
+    - function: The distance metric.
+    """
+    if name not in METRICS:
+        raise ValueError(f'Unknown distance metric: {name} (choose from {", ".join(METRICS)})')
+    return METRICS[name]
+
+
+def compute_distances(coords1, coords2, metric='gradient', **params):
+    """
+    Compute the distance between each pair of coordinates with a named metric.
+
+    Parameters:
+    - coords1 (np.ndarray of int): Coordinates with dimensions (x, y) or (x_cat, y_cat, x, y).
+    - coords2 (np.ndarray of int): Coordinates with dimensions (x, y) or (x_cat, y_cat, x, y).
+    - metric (str): Name of the distance metric (see `METRICS`).
+    - params: Extra options for the metric (e.g., `cell_width` for `grid`).
+
+    Returns:
+    - np.ndarray of float: Distance between each pair of coordinates.
+    """
+    return get_metric(metric)(coords1, coords2, **params)
@@ -0,0 +1,4 @@
+# The layouts live in `gris/embedding.py`; this module keeps `import embedding`
+# working for the scripts and notebooks.
+from gris.embedding import (SMACOF_TOLERANCE, SMACOF_MAX_ITER, dissimilarity_matrix, fill_shortest_paths,
+                            classical_mds, stress, smacof, embed, graph_layout)
@@ -0,0 +1,34 @@
+"""
+Importable API of the GRIS toolkit scripts: `gris.canvas` (`canvas.py`),
+`gris.xlsx` (`xlsx.py`), `gris.colorize` (`colorize.py`), and
+`gris.visualizer` (`visualizer.py`), along with `gris.embedding` (the graph
+layouts of the visualizer) and `gris.profiling` (the profiler of the pipeline). Importing the package has no side effects
+(no command line parsing), and each module is only loaded when it is first
+used, so building a canvas never imports openpyxl, networkx, or matplotlib.
+"""
+import importlib
+
+
+# Submodules, and the functions available straight from `gris` (module, name).
+SUBMODULES = ('canvas', 'colorize', 'xlsx', 'visualizer', 'embedding', 'profiling')
+EXPORTS = {
+    'build_canvas': ('canvas', 'build_canvas'),
+    'load_sheet': ('xlsx', 'load_sheet'),
+    'load_color_arrays': ('xlsx', 'load_color_arrays'),
+    'build_sheet_canvas': ('xlsx', 'build_sheet_canvas'),
+}
+
+__all__ = list(SUBMODULES) + list(EXPORTS)
+
+
+def __getattr__(name):
+    if name in EXPORTS:
+        module, attribute = EXPORTS[name]
+        return getattr(importlib.import_module(f'{__name__}.{module}'), attribute)
+    if name in SUBMODULES:
+        return importlib.import_module(f'{__name__}.{name}')
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,250 @@
+import os
+import json
+import hashlib
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from gris.profiling import profiled
+from gris.canvas import (NUM_COLUMNS, NUM_ROWS, WIDTH, HEIGHT, X_MIN, X_MAX, Y_MIN, Y_MAX,
+                         CATEGORIES, COLORS, canvas_grid, assign_colors, write_canvas)
+
+
+###############################################################################
+# Constants
+###############################################################################
+
+# Options of each canvas in a spec file (the options of `canvas.py`), and their defaults.
+OPTIONS = {
+    'categories': list(CATEGORIES),
+    'shades': list(COLORS),
+    'num_columns': NUM_COLUMNS,
+    'num_rows': NUM_ROWS,
+    'width': WIDTH,
+    'height': HEIGHT,
+    'x_minimum': X_MIN,
+    'x_maximum': X_MAX,
+    'y_minimum': Y_MIN,
+    'y_maximum': Y_MAX,
+    'auto_fit': False,
+    'merge': False,
+}
+
+# Where canvases are written when the spec file does not say.
+OUTPUT_FOLDER = './outputs/canvases'
+
+# Name of the manifest (written in the output folder unless given).
+MANIFEST_NAME = 'manifest.json'
+
+# Number of distinct grids (positions and labels) kept in memory while building.
+GRID_CACHE_SIZE = 256
+
+
+###############################################################################
+# Spec files
+###############################################################################
+
+def load_spec(filepath):
+    """
+    Read a spec file of canvases: JSON (`.json`), TOML (`.toml`), or YAML
+    (`.yaml`/`.yml`, which requires `pyyaml`).
+
+    Parameters:
+    - filepath (str): Spec file.
+
+    Returns:
+    - dict or list: Contents of the spec file.
+    """
+    extension = os.path.splitext(filepath)[1].lower()
+
+    if extension == '.json':
+        with open(filepath, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    if extension == '.toml':
+        try:
+            import tomllib
+        except ImportError:  # Python < 3.11
+            import tomli as tomllib
+        with open(filepath, 'rb') as f:
+            return tomllib.load(f)
+
+    if extension in ('.yaml', '.yml'):
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError('Reading YAML spec files requires pyyaml (pip install pyyaml); or use a JSON or TOML spec.')
+        with open(filepath, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f)
+
+    raise ValueError(f'Unknown spec format for {filepath} (use .json, .toml, .yaml, or .yml)')
+
+
+def resolve_canvases(spec, output_folder=None):
+    """
+    List every canvas of a spec, with all of its options. A spec is either a
+    list of canvases, or a dict with `canvases` (a list), plus optional
+    `defaults` (options shared by every canvas) and `output_folder`. Each canvas
+    has the options of `canvas.py` (e.g., `num_rows`, `categories`, `shades`,
+    `auto_fit`; see `OPTIONS`), a `name`, and optionally an `output_name`
+    (defaults to `<output_folder>/<name>.txt`).
+
+    Parameters:
+    - spec (dict or list): Contents of a spec file (see `load_spec`).
+    - output_folder (str): Output folder (overrides the spec's).
+
+    Returns:
+    - list of dict: Options of each canvas, in the order of the spec.
+    """
+    if isinstance(spec, list):
+        spec = {'canvases': spec}
+
+    unknown = set(spec) - {'canvases', 'defaults', 'output_folder'}
+    if unknown:
+        raise ValueError(f'Unknown spec section(s): {", ".join(sorted(unknown))} (use canvases, defaults, output_folder)')
+
+    output_folder = output_folder or spec.get('output_folder', OUTPUT_FOLDER)
+    defaults = {**OPTIONS, **spec.get('defaults', {})}
+    canvases = []
+
+    for position, entry in enumerate(spec.get('canvases', [])):
+        unknown = set(entry) - set(OPTIONS) - {'name', 'output_name'}
+        if unknown:
+            raise ValueError(f'Unknown option(s) for canvas {position}: {", ".join(sorted(unknown))}')
+
+        options = {**defaults, **entry}
+        name = str(options.get('name', f'canvas_{position}'))
+        shades = options['shades']
+
+        canvases.append({
+            'name': name,
+            'output_name': options.get('output_name') or os.path.join(output_folder, f'{name}.txt'),
+            'categories': [int(count) for count in options['categories']],
+            'shades': [shades] if isinstance(shades, str) else [str(shade) for shade in shades],
+            'num_columns': int(options['num_columns']),
+            'num_rows': int(options['num_rows']),
+            'width': int(options['width']),
+            'height': int(options['height']),
+            'x_minimum': options['x_minimum'],
+            'x_maximum': options['x_maximum'],
+            'y_minimum': options['y_minimum'],
+            'y_maximum': options['y_maximum'],
+            'auto_fit': bool(options['auto_fit']),
+            'merge': bool(options['merge']),
+        })
+
+    outputs = [canvas['output_name'] for canvas in canvases]
+    duplicates = sorted({output for output in outputs if outputs.count(output) > 1})
+    if duplicates:
+        raise ValueError(f'Several canvases would be written to: {", ".join(duplicates)} (give them different names)')
+
+    return canvases
+
+
+###############################################################################
+# Building
+###############################################################################
+
+def grid_key(canvas):
+    """Options that determine a canvas's positions and labels (canvases with the same key share them)."""
+    return (canvas['num_rows'], canvas['num_columns'], tuple(canvas['categories']),
+            canvas['width'], canvas['height'],
+            canvas['x_minimum'], canvas['x_maximum'], canvas['y_minimum'], canvas['y_maximum'],
+            canvas['auto_fit'])
+
+
+@lru_cache(maxsize=GRID_CACHE_SIZE)
+def shared_grid(key):
+    """Positions and labels of a grid (see `canvas_grid`), computed once per process."""
+    return canvas_grid(*key)
+
+
+@profiled
+def build_group(canvases):
+    """
+    Build and write canvases (e.g., ones that share a grid), one after the other.
+
+    Parameters:
+    - canvases (list of dict): Options of each canvas (see `resolve_canvases`).
+
+    Returns:
+    - list of dict: Manifest record of each canvas.
+    """
+    records = []
+
+    for canvas in canvases:
+        record = {'name': canvas['name'], 'output_name': canvas['output_name'], 'options': canvas}
+        try:
+            x_positions, y_positions, labels = shared_grid(grid_key(canvas))
+            color_dict = assign_colors(canvas['shades'], *canvas['categories'])
+            canvas_string = write_canvas(labels, x_positions, y_positions, color_dict,
+                                         canvas['width'], canvas['height'], canvas['auto_fit'],
+                                         merge=canvas['merge'])
+        except ValueError as error:
+            records.append({**record, 'error': str(error)})
+            continue
+
+        folder = os.path.dirname(canvas['output_name'])
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(canvas['output_name'], 'w') as w:
+            w.write(canvas_string)
+
+        records.append({**record, 'cells': len(labels),
+                        'colors': {f'{x} {y}': shade for (x, y), shade in color_dict.items()},
+                        'sha256': hashlib.sha256(canvas_string.encode()).hexdigest()})
+
+    return records
+
+
+@profiled
+def build_batch(canvases, workers=1):
+    """
+    Build and write every canvas of a spec. Canvases with the same grid
+    (size, categories, and bounds) share its positions and labels, which are
+    only computed once; with several workers, each grid's canvases are built
+    in their own process.
+
+    Parameters:
+    - canvases (list of dict): Options of each canvas (see `resolve_canvases`).
+    - workers (int): Number of worker processes.
+
+    Returns:
+    - list of dict: Manifest record of each canvas (in the same order), with its
+                    output file, options, number of cells, colors, and the SHA-256
+                    of its contents (or the `error` that kept it from being built).
+    """
+    groups = {}
+    for position, canvas in enumerate(canvases):
+        groups.setdefault(grid_key(canvas), []).append(position)
+    groups = list(groups.values())
+
+    batches = [[canvases[position] for position in group] for group in groups]
+    if workers > 1 and len(groups) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            built = list(executor.map(build_group, batches))
+    else:
+        built = [build_group(batch) for batch in batches]
+
+    records = [None] * len(canvases)
+    for group, group_records in zip(groups, built):
+        for position, record in zip(group, group_records):
+            records[position] = record
+
+    return records
+
+
+def write_manifest(records, filepath):
+    """
+    Write the manifest of a batch (one record per canvas, see `build_batch`) as JSON.
+
+    Parameters:
+    - records (list of dict): Output of `build_batch`.
+    - filepath (str): Manifest file.
+
+    Returns:
+    - None
+    """
+    folder = os.path.dirname(filepath)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(filepath, 'w', encoding='utf-8') as f:
+        json.dump({'canvases': records}, f, indent=2)
@@ -0,0 +1,199 @@
+import re
+import numpy as np
+from gris.canvas import NEW_CANVAS_HEADER, GET_CANVAS_HEADER, emit_section
+
+
+###############################################################################
+# Constants
+###############################################################################
+
+# Order of the cell coordinates in each script's labels: `canvas.py` labels are
+# (x category, y category, column, row), and `xlsx.py` labels are
+# (x cluster, y cluster, row, column).
+ORDERS = ('column-row', 'row-column')
+
+# A range of cells in the label of a merged canvas, e.g. `0-33` in `(1, 1, 0-33, 0-13)`.
+CELL_RANGE = re.compile(r'(\d+)-(\d+)')
+
+
+###############################################################################
+# Merging
+###############################################################################
+
+def merge_runs(keys):
+    """
+    Merge a grid of cells into rectangular blocks of cells with the same key
+    (e.g., the same category and color): each row is split into runs of equal
+    keys, and runs are extended downward while the next row has the exact
+    same run.
+
+    Parameters:
+    - keys (np.ndarray of int): Key of each cell, with shape (rows, columns).
+
+    Returns:
+    - np.ndarray of int: (first row, first column, number of rows, number of columns,
+                         key) of each block, with shape (blocks, 5), ordered by
+                         first row, then first column.
+    """
+    keys = np.asarray(keys)
+    num_rows, num_cols = keys.shape
+    blocks = []
+    open_blocks = {}
+
+    for row in range(num_rows):
+        # Runs of equal keys in this row, as (first column, last column + 1, key)
+        starts = np.flatnonzero(np.r_[True, keys[row, 1:] != keys[row, :-1]])
+        stops = np.r_[starts[1:], num_cols]
+
+        still_open = {}
+        for start, stop in zip(starts.tolist(), stops.tolist()):
+            run = (start, stop, keys[row, start].item())
+            block = open_blocks.get(run)
+            if block is None:
+                block = [row, start, 0, stop - start, run[2]]
+                blocks.append(block)
+            block[2] += 1
+            still_open[run] = block
+        open_blocks = still_open
+
+    blocks.sort(key=lambda block: (block[0], block[1]))
+    return np.array(blocks, dtype=np.int64).reshape(-1, 5)
+
+
+def block_label(prefix, block, order='column-row'):
+    """Label of a merged canvas: its cell labels' prefix, then its (inclusive) ranges of cells."""
+    row, col, num_rows, num_cols = block[:4]
+    rows = f'{row}-{row + num_rows - 1}'
+    cols = f'{col}-{col + num_cols - 1}'
+    return f'{prefix}{cols}, {rows})' if order == 'column-row' else f'{prefix}{rows}, {cols})'
+
+
+def cell_at(block, prefix, fx, fy, order='column-row'):
+    """
+    Label of the cell at a relative position of a merged canvas.
+
+    Parameters:
+    - block (array-like of int): (first row, first column, number of rows, number of columns) of the block.
+    - prefix (str): Prefix of the block's cell labels, e.g. '(0, 1, '.
+    - fx, fy (float): Relative position in the block (0 to 1, from its top left).
+    - order (str): Order of the cell coordinates in labels ('column-row' or 'row-column').
+
+    Returns:
+    - str: Label of the cell, as it would have been in the unmerged canvas.
+    """
+    row, col, num_rows, num_cols = (int(value) for value in block[:4])
+    col += min(num_cols - 1, max(0, int(np.floor(fx * num_cols))))
+    row += min(num_rows - 1, max(0, int(np.floor(fy * num_rows))))
+    return f'{prefix}{col}, {row})' if order == 'column-row' else f'{prefix}{row}, {col})'
+
+
+def has_cell_ranges(label):
+    """Whether a label is the label of a merged canvas (with ranges of cells, see `block_label`) rather than of a cell."""
+    return CELL_RANGE.search(label) is not None
+
+
+def category_blocks(labels, color_dict):
+    """
+    Merge the cells of a `canvas.py` canvas into one block per rectangle of
+    cells in the same category.
+
+    Parameters:
+    - labels (list of tuple): Label of each cell (see `gris.canvas.canvas_grid`).
+    - color_dict (dict): Color of each (column category, row category).
+
+    Returns:
+    - blocks (np.ndarray of int): Blocks (see `merge_runs`).
+    - prefixes (list of str): Prefix of the cell labels of each block.
+    - colors (list of str): Color of each block.
+    """
+    cells = np.array([label[:4] for label in labels], dtype=np.int64).reshape(-1, 4)
+    categories, cell_keys = np.unique(cells[:, :2], axis=0, return_inverse=True)
+
+    keys = np.full((cells[:, 3].max() + 1, cells[:, 2].max() + 1), -1, dtype=np.int64)
+    keys[cells[:, 3], cells[:, 2]] = cell_keys.ravel()
+    blocks = merge_runs(keys)
+
+    block_categories = categories[blocks[:, 4]].tolist()
+    prefixes = [f'({x}, {y}, ' for x, y in block_categories]
+    colors = [color_dict[(x, y)] for x, y in block_categories]
+    return blocks, prefixes, colors
+
+
+def sheet_blocks(color_array, label_array):
+    """
+    Merge the cells of a drawn (`xlsx.py`) canvas into blocks of cells with the
+    same color and cluster.
+
+    Parameters:
+    - color_array (np.ndarray of str): Color of each cell, with shape (rows, columns).
+    - label_array (np.ndarray of tuple): Label of each cell (see `gris.xlsx.make_label_array`).
+
+    Returns:
+    - blocks (np.ndarray of int): Blocks (see `merge_runs`).
+    - prefixes (list of str): Prefix of the cell labels of each block.
+    - colors (list of str): Color of each block.
+    """
+    index = {}
+    cell_keys = [index.setdefault((label[0], label[1], color), len(index))
+                 for label, color in zip(label_array.ravel().tolist(), color_array.ravel().tolist())]
+    blocks = merge_runs(np.array(cell_keys, dtype=np.int64).reshape(color_array.shape))
+
+    keys = list(index)
+    prefixes = [f'({keys[key][0]}, {keys[key][1]}, ' for key in blocks[:, 4].tolist()]
+    colors = [keys[key][2] for key in blocks[:, 4].tolist()]
+    return blocks, prefixes, colors
+
+
+###############################################################################
+# Writing Ibex code
+###############################################################################
+
+def emit_blocks(out, blocks, prefixes, colors, x_positions, y_positions,
+                width, height, auto_fit=False, order='column-row'):
+    """
+    Write the code of a merged canvas: one `newCanvas` (and `getCanvas`) per
+    block, sized to cover its cells and labeled with its ranges of cells (see
+    `block_label`). Drops on a block only record the block, not the cell
+    within it, so results recorded on merged canvases are rejected by
+    `utils.clean_string`, `utils.parse_graphs`, and `trajectory.build_board_history`.
+
+    Parameters:
+    - out (file): Where to write.
+    - blocks (np.ndarray of int): Blocks (see `merge_runs`).
+    - prefixes (list of str): Prefix of the cell labels of each block, e.g. '(0, 1, '.
+    - colors (list of str): Color of each block.
+    - x_positions (list of float): Position of each column.
+    - y_positions (list of float): Position of each row.
+    - width (int): Column width.
+    - height (int): Row height.
+    - auto_fit (bool): Whether positions and sizes are in vw/vh.
+    - order (str): Order of the cell coordinates in labels ('column-row' or 'row-column').
+
+    Returns:
+    - None
+    """
+    if order not in ORDERS:
+        raise ValueError(f'Unknown label order: {order} (choose from {", ".join(ORDERS)})')
+
+    labels = [block_label(prefix, block, order) for prefix, block in zip(prefixes, blocks.tolist())]
+    breaks = np.flatnonzero(np.diff(blocks[:, 0])) + 1 if len(blocks) else []
+
+    def new_items(start, stop):
+        items = []
+        for label, color, (row, col, num_rows, num_cols) in zip(labels[start:stop], colors[start:stop],
+                                                                 blocks[start:stop, :4].tolist()):
+            if auto_fit:
+                items.append(f'newCanvas("{label}", "{width * num_cols}vw", "{height * num_rows}vh").color("{color}")'
+                             f'.print("{x_positions[col]}vw", "{y_positions[row]}vh"),')
+            else:
+                items.append(f'newCanvas("{label}", {width * num_cols}, {height * num_rows}).color("{color}")'
+                             f'.print({x_positions[col]}, {y_positions[row]}),')
+        return items
+
+    def get_items(start, stop):
+        return [f'getCanvas("{label}"),' for label in labels[start:stop]]
+
+    out.write(NEW_CANVAS_HEADER)
+    emit_section(out, new_items, len(labels), breaks)
+    out.write(GET_CANVAS_HEADER)
+    emit_section(out, get_items, len(labels), breaks)
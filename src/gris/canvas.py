@@ -0,0 +1,381 @@
+import io
+import math
+import numpy as np
+from gris.profiling import profiled
+
+
+###############################################################################
+# Constants
+###############################################################################
+
+# Default canvas: 34 columns x 14 rows of 30px cells, centered in (250, 1270) x (50, 470).
+NUM_COLUMNS = 34
+NUM_ROWS = 14
+WIDTH = 30
+HEIGHT = 30
+X_MIN, X_MAX = 250, 1270
+Y_MIN, Y_MAX = 50, 470
+
+# Bounds of autofit canvases (in vw/vh).
+AUTOFIT_BOUNDS = (0, 100, 0, 100)
+
+CATEGORIES = (1, 1)
+COLORS = ('lightgray',)
+
+# Section headers of a canvas file.
+NEW_CANVAS_HEADER = '############### NEW CANVAS ###############\n'
+GET_CANVAS_HEADER = '\n\n\n\n\n############### GET CANVAS ###############\n'
+
+# Number of cells whose code is joined and written at a time.
+EMIT_CHUNK = 4096
+
+
+###############################################################################
+# Functions
+###############################################################################
+
+##### WRITING IBEX CODE
+# Constructs newCanvas objects
+def make_newCanvas(label, xlocation, ylocation, color,
+                   width=WIDTH, height=HEIGHT, autofit=False):
+
+    if autofit == True:
+        return f'newCanvas("{label}", "{width}vw", "{height}vh").color("{color}").print("{xlocation}", "{ylocation}"),'
+
+    return f'newCanvas("{label}", {width}, {height}).color("{color}").print({xlocation}, {ylocation}),'
+
+# Constructs getCanvas objects
+def make_getCanvas(label):
+    return f'getCanvas("{label}"),'
+
+
+
+##### CANVAS OPERATIONS
+
+# Find the locations for all canvas values
+def generate_range(midpoint, step, num_X):
+
+    # num_X is the number of rows/columns that we want.
+    # Repetitions is the number of canvases we want on each side
+    # of the midpoint.
+
+    step = int(step)
+    repetitions = num_X/2
+
+    # If repetitions isn't an integer, set the first cell to cross the midpoint.
+    if repetitions != int(repetitions):
+        midpoint = midpoint - (step / 2)
+
+    # Calculate steps from the midpoint
+    int_repetitions = math.floor(repetitions)
+    left_steps = [midpoint - i * step for i in range(int_repetitions, -1, -1)]
+
+    # Odd number of repetitions have extra value (center)
+    if repetitions != int(repetitions):
+        right_steps = [midpoint + i * step for i in range(1, int_repetitions + 1)]
+
+    # Even number of repetitions have the same number of X on other side of the midpoint
+    else:
+        right_steps = [midpoint + i * step for i in range(1, int_repetitions)]
+
+    return left_steps + right_steps
+
+
+
+# Centers canvas both horizontally/vertically; x-range (250, 1270) | y-range (50, 470)
+def canvas_positions(num_rows=NUM_ROWS, num_cols=NUM_COLUMNS,
+                     col_width=WIDTH, row_height=HEIGHT,
+                     x_min=X_MIN, x_max=X_MAX,
+                     y_min=Y_MIN, y_max=Y_MAX):
+
+    # Spread outward from the center:
+    x_mid = (x_max+x_min)/2
+    y_mid = (y_max+y_min)/2
+
+    # Column positions
+    col_positions = generate_range(x_mid, col_width, num_cols)
+
+    # Row positions
+    row_positions = generate_range(y_mid, row_height, num_rows)
+
+    return col_positions, row_positions
+
+
+
+# Make (grid) labels for categorical canvases
+def canvas_labels(num_rows=NUM_ROWS, num_cols=NUM_COLUMNS,
+                  categories=CATEGORIES):
+
+    # Blank canvas condition | Covers case where people leave default
+    # category specification, or choose its flip ([0,1])
+    if np.prod(categories) == 1:
+        return [(1, 1, x, y) for x in range(num_cols) for y in range(num_rows)]
+
+    # Category canvas condition
+
+    cat_cols = categories[0]
+    cat_rows = categories[1]
+
+    # Building arrays that are easy to loop through (ugly, but clean) |
+    # accounts for 0 specification
+    col_bins = np.array_split([x for x in range(num_cols)], max(cat_cols, 1))
+    row_bins = np.array_split([y for y in range(num_rows)], max(cat_rows, 1))
+
+    # More ugliness, but accounts for 0 specification
+    labels = []
+    for c_idx, c_bin in enumerate(col_bins):
+        for r_idx, r_bin in enumerate(row_bins):
+            c_vals = c_bin if c_bin.size else [0]
+            r_vals = r_bin if r_bin.size else [0]
+            for c_val in c_vals:
+                for r_val in r_vals:
+                    labels.append((c_idx, r_idx, c_val, r_val))
+
+    return labels
+
+
+# Assign colors to categories:
+def assign_colors(colors=COLORS, cat_cols=CATEGORIES[0], cat_rows=CATEGORIES[1]):
+    color_count = len(colors)
+    pos2color = dict()
+
+    # Handling blank canvas case
+    if (cat_cols == 1) and (cat_rows == 1):
+        pos2color[(1, 1)] = colors[0]
+        return pos2color
+
+    # All other cases
+    for x in range(cat_cols):
+        for y in range(cat_rows):
+            pos2color[(x, y)] = colors[(x * cat_rows + y) % color_count]
+
+    return pos2color
+
+
+def check_canvas(num_rows, num_cols, categories, width, height, auto_fit):
+    """
+    Check that a canvas specification can be built (raises a ValueError otherwise).
+
+    Parameters:
+    - num_rows (int): Number of rows.
+    - num_cols (int): Number of columns.
+    - categories (tuple of int): Number of column and row categories.
+    - width (int): Column width.
+    - height (int): Row height.
+    - auto_fit (bool): Whether the canvas scales with the screen (in vw/vh).
+
+    Returns:
+    - None
+    """
+    if auto_fit:
+        # Ensure autofit boundaries to reduce scrolling
+        if num_cols*width >= 100:
+            raise ValueError('Width specification too wide for autofit specification; please ensure the total width <100vh.')
+        if num_rows*height >= 100:
+            raise ValueError('Height specification too wide for autofit specification; please ensure the total height <100 vh.')
+
+    # Ensure non-zero amount of categories
+    if 0 in set(categories):
+        raise ValueError('Failed to specify number of rows or columns.')
+
+    # Ensure subdivisions for both rows and cols
+    if num_cols % categories[0] != 0:
+        raise ValueError('Specified number of columns cannot be evenly divided by the number of column categories.')
+
+    if num_rows % categories[1] != 0:
+        raise ValueError('Specified number of rows cannot be evenly divided by the number of row categories.')
+
+
+@profiled
+def canvas_grid(num_rows=NUM_ROWS, num_cols=NUM_COLUMNS, categories=CATEGORIES,
+                width=WIDTH, height=HEIGHT, x_min=X_MIN, x_max=X_MAX, y_min=Y_MIN, y_max=Y_MAX,
+                auto_fit=False):
+    """
+    Positions and labels of the cells of a canvas (everything but the colors),
+    after checking that the canvas can be built.
+
+    Parameters: see `build_canvas`.
+
+    Returns:
+    - x_positions (list of float): Position of each column.
+    - y_positions (list of float): Position of each row.
+    - labels (list of tuple): (column category, row category, column, row) of each cell.
+    """
+    categories = tuple(categories)
+    check_canvas(num_rows, num_cols, categories, width, height, auto_fit)
+    if auto_fit:
+        x_min, x_max, y_min, y_max = AUTOFIT_BOUNDS
+
+    # Build positions
+    x_positions, y_positions = canvas_positions(num_rows, num_cols, width, height,
+                                                x_min, x_max, y_min, y_max)
+
+    if (max(x_positions) > x_max) or (min(x_positions) < x_min):
+        raise ValueError('Columns do not fit within bounds. Either specify fewer columns, increase horizontal bounds, or decrease column width.')
+
+    if (max(y_positions) > y_max) or (min(y_positions) < y_min):
+        raise ValueError('Rows do not fit within bounds. Either specify fewer rows, increase vertical bounds, or decrease row height.')
+
+    # Build labels
+    labels = canvas_labels(num_rows, num_cols, categories)
+
+    return x_positions, y_positions, labels
+
+
+def emit_section(out, make_items, count, breaks):
+    """
+    Write the items of a canvas section to `out`, a chunk at a time, with a
+    line break before each position in `breaks`.
+
+    Parameters:
+    - out (file): Where to write.
+    - make_items (function): Returns the code of cells [start, stop) as a list of str.
+    - count (int): Number of cells.
+    - breaks (list of int): Cell positions before which a line break is written
+                            (`count` adds one at the end).
+
+    Returns:
+    - None
+    """
+    start = 0
+    for position in list(breaks) + [None]:
+        stop = count if position is None else position
+        for chunk in range(start, stop, EMIT_CHUNK):
+            out.write(''.join(make_items(chunk, min(chunk + EMIT_CHUNK, stop))))
+        if position is not None:
+            out.write('\n')
+        start = stop
+
+
+def emit_canvas(out, labels, columns, rows, x_positions, y_positions, colors,
+                width=WIDTH, height=HEIGHT, auto_fit=False, breaks=()):
+    """
+    Write the `newCanvas` and `getCanvas` code of a canvas to a file (or any
+    object with a `write` method), in a single pass over the cells. This is the
+    emitter of both `canvas.py` and `xlsx.py`: cell positions are only formatted
+    once per row and column, and the code is written in chunks of joined strings.
+
+    Parameters:
+    - out (file): Where to write.
+    - labels (array-like): Label of each cell (written with `str`).
+    - columns (array-like of int): Column of each cell (an index into `x_positions`).
+    - rows (array-like of int): Row of each cell (an index into `y_positions`).
+    - x_positions (list of float): Position of each column.
+    - y_positions (list of float): Position of each row.
+    - colors (array-like of str): Color of each cell.
+    - width (int): Column width.
+    - height (int): Row height.
+    - auto_fit (bool): Whether positions and sizes are in vw/vh.
+    - breaks (list of int): Cell positions before which a line break is written,
+                            in both sections (the number of cells adds one at the end).
+
+    Returns:
+    - None
+    """
+    labels = [str(label) for label in labels]
+    breaks = [int(position) for position in breaks]
+
+    # Format each row and column position once, then look them up for every cell.
+    if auto_fit:
+        x_text = np.array([f'"{x}vw"' for x in x_positions], dtype=object)[np.asarray(columns, dtype=np.intp)]
+        y_text = np.array([f'"{y}vh"' for y in y_positions], dtype=object)[np.asarray(rows, dtype=np.intp)]
+        size = f'"{width}vw", "{height}vh"'
+    else:
+        x_text = np.array([f'{x}' for x in x_positions], dtype=object)[np.asarray(columns, dtype=np.intp)]
+        y_text = np.array([f'{y}' for y in y_positions], dtype=object)[np.asarray(rows, dtype=np.intp)]
+        size = f'{width}, {height}'
+    x_text, y_text = x_text.tolist(), y_text.tolist()
+    colors = [str(color) for color in colors]
+
+    def new_items(start, stop):
+        return [f'newCanvas("{label}", {size}).color("{color}").print({x}, {y}),'
+                for label, color, x, y in zip(labels[start:stop], colors[start:stop],
+                                              x_text[start:stop], y_text[start:stop])]
+
+    def get_items(start, stop):
+        return [f'getCanvas("{label}"),' for label in labels[start:stop]]
+
+    out.write(NEW_CANVAS_HEADER)
+    emit_section(out, new_items, len(labels), breaks)
+    out.write(GET_CANVAS_HEADER)
+    emit_section(out, get_items, len(labels), breaks)
+
+
+def category_breaks(labels):
+    """
+    Cell positions where `canvas.py` starts a new line: wherever the column
+    category changes (counting from category 0, so blank canvases start with one).
+    """
+    categories = np.array([label[0] for label in labels])
+    return np.flatnonzero(categories != np.concatenate([[0], categories[:-1]]))
+
+
+@profiled
+def write_canvas(labels, x_positions, y_positions, color_dict, width=WIDTH, height=HEIGHT, auto_fit=False,
+                 out=None, merge=False):
+    """
+    Write the `newCanvas` and `getCanvas` code of a canvas (see `emit_canvas`),
+    or, with `merge`, of one canvas per rectangle of same-colored cells (one per category)
+    (see `gris.blocks.emit_blocks`).
+
+    Parameters:
+    - labels (list of tuple): Label of each cell (see `canvas_grid`).
+    - x_positions (list of float): Position of each column.
+    - y_positions (list of float): Position of each row.
+    - color_dict (dict): Color of each (column category, row category) (see `assign_colors`).
+    - width (int): Column width.
+    - height (int): Row height.
+    - auto_fit (bool): Whether positions and sizes are in vw/vh.
+    - out (file): Where to write (by default, the code is returned as a string).
+    - merge (bool): Merge the rectangle of same-colored cells of each category into a single canvas.
+
+    Returns:
+    - str: Canvas code (None when written to `out`).
+    """
+    buffer = io.StringIO() if out is None else None
+    if buffer is not None:
+        out = buffer
+
+    if merge:
+        from gris.blocks import category_blocks, emit_blocks
+        blocks, prefixes, colors = category_blocks(labels, color_dict)
+        emit_blocks(out, blocks, prefixes, colors, x_positions, y_positions, width, height, auto_fit, 'column-row')
+    else:
+        emit_canvas(out, labels,
+                    [label[2] for label in labels], [label[3] for label in labels],
+                    x_positions, y_positions,
+                    [color_dict[(label[0], label[1])] for label in labels],
+                    width, height, auto_fit, category_breaks(labels))
+
+    return None if buffer is None else buffer.getvalue()
+
+
+@profiled
+def build_canvas(num_rows=NUM_ROWS, num_cols=NUM_COLUMNS, categories=CATEGORIES, colors=COLORS,
+                 width=WIDTH, height=HEIGHT, x_min=X_MIN, x_max=X_MAX, y_min=Y_MIN, y_max=Y_MAX,
+                 auto_fit=False, out=None, merge=False):
+    """
+    Build the `newCanvas` and `getCanvas` code of a (categorical) canvas, exactly
+    as `canvas.py` writes it to its output file.
+
+    Parameters:
+    - num_rows (int): Number of rows.
+    - num_cols (int): Number of columns.
+    - categories (tuple of int): Number of column and row categories.
+    - colors (list of str): Color of each category (cycled through if there are more categories).
+    - width (int): Column width (in pixels, or vw with `auto_fit`).
+    - height (int): Row height (in pixels, or vh with `auto_fit`).
+    - x_min, x_max (int): Horizontal bounds of the canvas on the screen.
+    - y_min, y_max (int): Vertical bounds of the canvas on the screen.
+    - auto_fit (bool): Scale the canvas with the screen (the bounds become 0-100 vw/vh).
+    - out (file): Where to write (by default, the code is returned as a string).
+    - merge (bool): Merge the rectangle of same-colored cells of each category into a single canvas (see `write_canvas`).
+
+    Returns:
+    - str: Canvas code (None when written to `out`).
+    """
+    x_positions, y_positions, labels = canvas_grid(num_rows, num_cols, categories, width, height,
+                                                   x_min, x_max, y_min, y_max, auto_fit)
+    color_dict = assign_colors(colors, categories[0], categories[1])
+
+    return write_canvas(labels, x_positions, y_positions, color_dict, width, height, auto_fit, out, merge)
@@ -0,0 +1,31 @@
+from gris.profiling import profiled
+
+
+###############################################################################
+# Change colors
+###############################################################################
+
+# Colorize function
+@profiled
+def colorize(canvas_string, input_hex, output_hex):
+    return canvas_string.replace(f".color('{input_hex}')", f".color('{output_hex}')")
+
+
+def colorize_file(input_canvas, output_name, input_hex, output_hex):
+    """
+    Change one color of the canvas objects in a file, and write the result to another file.
+
+    Parameters:
+    - input_canvas (str): Input canvas file.
+    - output_name (str): Output canvas file.
+    - input_hex (str): Input/current color.
+    - output_hex (str): Output/new color.
+
+    Returns:
+    - None
+    """
+    with open(input_canvas) as inp:
+        canvas = inp.read()
+
+    with open(output_name, 'w') as out:
+        out.write(colorize(canvas, input_hex, output_hex))
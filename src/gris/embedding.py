@@ -0,0 +1,223 @@
+import numpy as np
+
+
+###############################################################################
+# Constants
+###############################################################################
+
+# SMACOF stops once the (normalized) stress improves by less than this, or
+# after this many iterations.
+SMACOF_TOLERANCE = 1e-6
+SMACOF_MAX_ITER = 300
+
+
+###############################################################################
+# Dissimilarity matrices
+###############################################################################
+
+def dissimilarity_matrix(sources, targets, distances, nodes=None):
+    """
+    Build a symmetric object-by-object dissimilarity matrix from an edge list
+    (e.g., the output of `visualizer.aggregate_edges`).
+
+    Parameters:
+    - sources (array-like): First object of each pair.
+    - targets (array-like): Second object of each pair.
+    - distances (array-like of float): Distance between each pair.
+    - nodes (list): Object order along both axes (defaults to the sorted objects).
+
+    Returns:
+    - matrix (np.ndarray of float): Dissimilarities, with NaN for pairs without a distance
+                                    (and 0 on the diagonal).
+    - nodes (list): Object order along both axes.
+    """
+    sources = np.asarray(sources)
+    targets = np.asarray(targets)
+    if nodes is None:
+        nodes = sorted(set(sources.tolist()) | set(targets.tolist()))
+
+    index = {node: position for position, node in enumerate(nodes)}
+    rows = np.array([index[node] for node in sources.tolist()], dtype=np.int64)
+    cols = np.array([index[node] for node in targets.tolist()], dtype=np.int64)
+
+    matrix = np.full((len(nodes), len(nodes)), np.nan)
+    matrix[rows, cols] = distances
+    matrix[cols, rows] = distances
+    np.fill_diagonal(matrix, 0)
+
+    return matrix, list(nodes)
+
+
+def fill_shortest_paths(matrix):
+    """
+    Fill the missing (NaN) dissimilarities with the shortest path through the
+    known ones (Floyd-Warshall, one vectorized step per object). Pairs that are
+    not connected at all get the largest known dissimilarity.
+
+    Parameters:
+    - matrix (np.ndarray of float): Dissimilarities, with NaN for missing pairs.
+
+    Returns:
+    - np.ndarray of float: Complete dissimilarities.
+    """
+    missing = np.isnan(matrix)
+    if not missing.any():
+        return matrix
+
+    paths = np.where(missing, np.inf, matrix)
+    for k in range(len(paths)):
+        np.minimum(paths, paths[:, k, None] + paths[None, k, :], out=paths)
+
+    known = paths[np.isfinite(paths)]
+    largest = known.max() if len(known) else 1.0
+    paths[~np.isfinite(paths)] = largest
+
+    return np.where(missing, paths, matrix)
+
+
+###############################################################################
+# Embeddings
+###############################################################################
+
+def classical_mds(matrix, dim=2):
+    """
+    Classical (Torgerson) multidimensional scaling: place the objects so that
+    their Euclidean distances match the dissimilarities as closely as possible,
+    from a single eigendecomposition of the double-centered squared dissimilarities.
+
+    Parameters:
+    - matrix (np.ndarray of float): Complete, symmetric dissimilarities.
+    - dim (int): Number of dimensions (2 or 3).
+
+    Returns:
+    - np.ndarray of float: Coordinates of each object, with shape (num_objects, dim).
+    """
+    num_objects = len(matrix)
+    centering = np.eye(num_objects) - 1 / num_objects
+    gram = -0.5 * centering @ (matrix ** 2) @ centering
+
+    # Largest eigenvalues first (negative ones, from non-Euclidean data, are dropped).
+    values, vectors = np.linalg.eigh(gram)
+    order = np.argsort(values)[::-1][:dim]
+    values = np.clip(values[order], 0, None)
+
+    coords = np.zeros((num_objects, dim))
+    coords[:, :len(order)] = vectors[:, order] * np.sqrt(values)
+    return coords
+
+
+def stress(matrix, coords, weights=None):
+    """
+    Normalized stress (aka Kruskal's stress-1) of an embedding: how far its
+    distances are from the dissimilarities (0 is a perfect fit).
+
+    Parameters:
+    - matrix (np.ndarray of float): Dissimilarities.
+    - coords (np.ndarray of float): Coordinates of each object.
+    - weights (np.ndarray of float): Weight of each pair (defaults to 1 for every known pair).
+
+    Returns:
+    - float: Stress.
+    """
+    if weights is None:
+        weights = (~np.isnan(matrix)).astype(np.float64)
+    target = np.nan_to_num(matrix)
+    distances = np.sqrt(((coords[:, None, :] - coords[None, :, :]) ** 2).sum(axis=-1))
+
+    return np.sqrt((weights * (distances - target) ** 2).sum() / max((weights * target ** 2).sum(), 1e-12))
+
+
+def smacof(matrix, dim=2, init=None, weights=None, max_iter=SMACOF_MAX_ITER, tolerance=SMACOF_TOLERANCE):
+    """
+    Metric MDS by stress majorization (SMACOF): starting from `init` (e.g.,
+    classical MDS), repeatedly apply the Guttman transform, which can only
+    lower the stress. Missing (NaN) dissimilarities are simply left out.
+
+    Parameters:
+    - matrix (np.ndarray of float): Dissimilarities, with NaN for missing pairs.
+    - dim (int): Number of dimensions (2 or 3).
+    - init (np.ndarray of float): Starting coordinates (defaults to classical MDS).
+    - weights (np.ndarray of float): Weight of each pair (defaults to 1 for every known pair).
+    - max_iter (int): Maximum number of iterations.
+    - tolerance (float): Stop once the stress improves by less than this.
+
+    Returns:
+    - np.ndarray of float: Coordinates of each object, with shape (num_objects, dim).
+    """
+    num_objects = len(matrix)
+    if weights is None:
+        weights = (~np.isnan(matrix)).astype(np.float64)
+    weights = weights.copy()
+    np.fill_diagonal(weights, 0)
+    target = np.nan_to_num(matrix)
+
+    coords = classical_mds(fill_shortest_paths(matrix), dim) if init is None else np.array(init, dtype=np.float64)
+    if num_objects < 2:
+        return coords
+
+    # With equal weights, the Guttman transform only needs to divide by the number of objects.
+    uniform = np.all(weights[~np.eye(num_objects, dtype=bool)] == 1)
+    if not uniform:
+        laplacian = np.diag(weights.sum(axis=1)) - weights
+        inverse = np.linalg.pinv(laplacian)
+
+    previous = stress(matrix, coords, weights)
+    for _ in range(max_iter):
+        distances = np.sqrt(((coords[:, None, :] - coords[None, :, :]) ** 2).sum(axis=-1))
+        ratios = np.divide(weights * target, distances, out=np.zeros_like(distances), where=distances > 0)
+        guttman = np.diag(ratios.sum(axis=1)) - ratios
+
+        coords = guttman @ coords / num_objects if uniform else inverse @ guttman @ coords
+
+        current = stress(matrix, coords, weights)
+        if previous - current < tolerance:
+            break
+        previous = current
+
+    return coords
+
+
+def embed(matrix, dim=2, method='mds'):
+    """
+    Place objects in 2D or 3D so that their distances reflect their dissimilarities.
+
+    Parameters:
+    - matrix (np.ndarray of float): Dissimilarities, with NaN for missing pairs.
+    - dim (int): Number of dimensions (2 or 3).
+    - method (str): 'mds' (classical MDS) or 'smacof' (classical MDS, refined with SMACOF).
+
+    Returns:
+    - np.ndarray of float: Coordinates of each object, with shape (num_objects, dim).
+    """
+    if method == 'mds':
+        return classical_mds(fill_shortest_paths(matrix), dim)
+    if method == 'smacof':
+        return smacof(matrix, dim)
+    raise ValueError(f'Unknown embedding method: {method} (choose from mds, smacof)')
+
+
+def graph_layout(G, dim=2, method='mds', weight='weight'):
+    """
+    Layout of a `networkx` graph whose edge weights are distances, in the same
+    format as `nx.spring_layout` (a dict of node -> coordinates).
+
+    Parameters:
+    - G (nx.Graph): Graph with distances as edge weights.
+    - dim (int): Number of dimensions (2 or 3).
+    - method (str): 'mds' or 'smacof' (see `embed`).
+    - weight (str): Edge attribute holding the distances.
+
+    Returns:
+    - dict: Coordinates (np.ndarray of float) of each node.
+    """
+    nodes = list(G.nodes())
+    edges = [(u, v, data[weight]) for u, v, data in G.edges(data=True) if u != v]
+    if not edges:
+        return {node: np.zeros(dim) for node in nodes}
+
+    sources, targets, distances = zip(*edges)
+    matrix, nodes = dissimilarity_matrix(np.array(sources, dtype=object), np.array(targets, dtype=object),
+                                         np.array(distances, dtype=np.float64), nodes)
+    coords = embed(matrix, dim, method)
+
+    return {node: coords[position] for position, node in enumerate(nodes)}
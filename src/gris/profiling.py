@@ -0,0 +1,347 @@
+import os
+import json
+import atexit
+import time
+import logging
+import cProfile
+import threading
+import tracemalloc
+import functools
+from contextlib import contextmanager
+
+
+###############################################################################
+# Constants
+###############################################################################
+
+# Environment variable that turns profiling on for any script, e.g.
+# `GRIS_PROFILE=log python canvas.py` or
+# `GRIS_PROFILE=jsonl:outputs/profile.jsonl,cprofile:outputs/profiles python gris_pipeline.py`.
+PROFILE_VARIABLE = 'GRIS_PROFILE'
+
+# Logger used by `LogSink`.
+LOGGER = logging.getLogger('gris.profiling')
+
+
+###############################################################################
+# Sinks
+###############################################################################
+
+class Sink:
+    """
+    Where profiling records go. `begin` is called when a stage starts, and `end`
+    with the finished record (a dict with the stage's `name`, `seconds`, `rows_in`,
+    `rows_out`, `peak_mb`, `depth`, `parent`, and anything added with `note`).
+    """
+
+    def begin(self, name, depth):
+        pass
+
+    def end(self, record):
+        pass
+
+    def close(self):
+        pass
+
+
+class LogSink(Sink):
+    """Log one line per stage (to the `gris.profiling` logger, or stderr if logging is not set up)."""
+
+    def __init__(self, logger=LOGGER, level=logging.INFO):
+        self.logger = logger
+        self.level = level
+        if not logging.getLogger().handlers and not logger.handlers:
+            logger.addHandler(logging.StreamHandler())
+            logger.setLevel(level)
+
+    def end(self, record):
+        message = f"{'  ' * record.get('depth', 0)}{record['name']}: {record['seconds']:.4f} s"
+        if record.get('calls') is not None:
+            message += f" over {record['calls']} calls"
+        if record.get('rows_in') is not None or record.get('rows_out') is not None:
+            rows_in = record.get('rows_in')
+            message += f", {'' if rows_in is None else f'{rows_in} '}-> {record.get('rows_out')} rows"
+        if record.get('groups') is not None:
+            message += f", {record['groups']} groups"
+        if record.get('peak_mb') is not None:
+            message += f", {record['peak_mb']:.1f} MB peak"
+        self.logger.log(self.level, message)
+
+
+class JsonLinesSink(Sink):
+    """Append one JSON object per stage to a file."""
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.file = None
+
+    def end(self, record):
+        if self.file is None:
+            self.file = open(self.filepath, 'a', encoding='utf-8')
+        self.file.write(json.dumps(record, default=str) + '\n')
+        self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class CProfileSink(Sink):
+    """
+    Run cProfile during every top-level stage, and dump the statistics to
+    `<directory>/<stage>-<n>.prof` (open them with `pstats` or `snakeviz`).
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.profiler = None
+        self.count = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def begin(self, name, depth):
+        if depth == 0:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def end(self, record):
+        if record['depth'] == 0 and self.profiler is not None:
+            self.profiler.disable()
+            self.count += 1
+            name = record['name'].replace('.', '-').replace('/', '-')
+            self.profiler.dump_stats(os.path.join(self.directory, f'{name}-{self.count}.prof'))
+            self.profiler = None
+
+
+class CollectSink(Sink):
+    """Keep the records in memory (e.g., to look at them in a notebook with `pd.DataFrame(sink.records)`)."""
+
+    def __init__(self):
+        self.records = []
+
+    def end(self, record):
+        self.records.append(record)
+
+
+###############################################################################
+# Profiler state
+###############################################################################
+
+# Active sinks (profiling is off when there are none), and whether peak memory is measured.
+SINKS = []
+MEMORY = {'enabled': False}
+
+# Call counts and times of aggregated functions, reported when the outermost stage ends.
+TALLIES = {}
+
+# Stages currently running (per thread).
+STATE = threading.local()
+
+
+def enable(*sinks, memory=False):
+    """
+    Turn profiling on.
+
+    Parameters:
+    - sinks (Sink): Where records go (defaults to a `LogSink`).
+    - memory (bool): Also measure the peak memory of each stage (with `tracemalloc`,
+                     which slows the code down noticeably).
+
+    Returns:
+    - None
+    """
+    SINKS[:] = list(sinks) or [LogSink()]
+    MEMORY['enabled'] = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    """Turn profiling off (reporting any aggregated calls, and closing the sinks)."""
+    flush_tallies()
+    for sink in SINKS:
+        sink.close()
+    SINKS.clear()
+    if MEMORY['enabled'] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    MEMORY['enabled'] = False
+
+
+def is_enabled():
+    return bool(SINKS)
+
+
+@contextmanager
+def session(*sinks, memory=False):
+    """Profile the code in a `with` block (see `enable`)."""
+    enable(*sinks, memory=memory)
+    try:
+        yield
+    finally:
+        disable()
+
+
+def enable_from_environment(variable=PROFILE_VARIABLE):
+    """
+    Turn profiling on if the `GRIS_PROFILE` environment variable is set, to a
+    comma-separated list of sinks: `log`, `jsonl:<file>`, or `cprofile:<directory>`
+    (add `memory` to measure peak memory).
+    """
+    spec = os.environ.get(variable)
+    if not spec:
+        return
+
+    sinks = []
+    memory = False
+    for part in spec.split(','):
+        kind, _, target = part.strip().partition(':')
+        if kind == 'log':
+            sinks.append(LogSink())
+        elif kind == 'jsonl':
+            sinks.append(JsonLinesSink(target or 'profile.jsonl'))
+        elif kind == 'cprofile':
+            sinks.append(CProfileSink(target or 'profiles'))
+        elif kind == 'memory':
+            memory = True
+        else:
+            raise ValueError(f'Unknown profiling sink in {variable}: {part} (use log, jsonl:<file>, cprofile:<dir>, or memory)')
+
+    enable(*sinks, memory=memory)
+    atexit.register(disable)
+
+
+###############################################################################
+# Hooks
+###############################################################################
+
+def count_rows(value):
+    """Number of rows of a dataframe or array (or the first one in a tuple), if any."""
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    if hasattr(value, 'shape') and len(getattr(value, 'shape', ())) > 0:
+        return int(value.shape[0])
+    if isinstance(value, list):
+        return len(value)
+    return None
+
+
+def flush_tallies():
+    """Report the call counts and total times of aggregated functions (see `profiled`)."""
+    for name, (calls, seconds) in TALLIES.items():
+        record = {'name': name, 'calls': calls, 'seconds': seconds, 'depth': 0, 'parent': None}
+        for sink in SINKS:
+            sink.end(record)
+    TALLIES.clear()
+
+
+@contextmanager
+def stage(name, rows_in=None):
+    """
+    Profile a block of code as a stage (e.g., a notebook cell), just like a
+    profiled function. Does nothing when profiling is off.
+
+    Parameters:
+    - name (str): Name of the stage.
+    - rows_in (int): Number of input rows, if known.
+
+    Returns:
+    - dict: The stage's record (add to it with `note`); None when profiling is off.
+    """
+    if not SINKS:
+        yield None
+        return
+
+    stack = getattr(STATE, 'stack', None)
+    if stack is None:
+        stack = STATE.stack = []
+
+    record = {'name': name, 'depth': len(stack), 'parent': stack[-1]['name'] if stack else None,
+              'rows_in': rows_in, 'rows_out': None}
+    for sink in SINKS:
+        sink.begin(name, record['depth'])
+
+    # Peak memory is measured from the stage's start (nested stages pass theirs on).
+    memory = MEMORY['enabled'] and tracemalloc.is_tracing()
+    if memory:
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1]['_peak'] = max(stack[-1].get('_peak', 0), peak)
+        tracemalloc.reset_peak()
+        record['_start'], record['_peak'] = current, current
+
+    stack.append(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['seconds'] = time.perf_counter() - start
+        stack.pop()
+
+        if memory:
+            peak = max(record.pop('_peak'), tracemalloc.get_traced_memory()[1])
+            record['peak_mb'] = (peak - record.pop('_start')) / 1024 ** 2
+            if stack:
+                stack[-1]['_peak'] = max(stack[-1].get('_peak', 0), peak)
+
+        for sink in SINKS:
+            sink.end(record)
+        if not stack:
+            flush_tallies()
+
+
+def note(**values):
+    """
+    Add values (e.g., `groups=...`) to the record of the innermost running stage.
+    Does nothing when profiling is off.
+    """
+    if not SINKS:
+        return
+    stack = getattr(STATE, 'stack', None)
+    if stack:
+        stack[-1].update(values)
+
+
+def profiled(func=None, aggregate=False):
+    """
+    Decorator that profiles every call of a function (as a stage, named after
+    the function) when profiling is on. When it is off, the only cost is one check.
+
+    Parameters:
+    - func (function): Function to profile.
+    - aggregate (bool): Only count the calls and their total time (for small
+                        functions that are called once per row or cell).
+
+    Returns:
+    - function: The profiled function.
+    """
+    if func is None:
+        return functools.partial(profiled, aggregate=aggregate)
+
+    name = f'{func.__module__}.{func.__qualname__}'
+
+    if aggregate:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not SINKS:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                tally = TALLIES.setdefault(name, [0, 0.0])
+                tally[0] += 1
+                tally[1] += time.perf_counter() - start
+        return wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not SINKS:
+            return func(*args, **kwargs)
+        with stage(name, rows_in=count_rows(args[0]) if args else None) as record:
+            result = func(*args, **kwargs)
+            record['rows_out'] = count_rows(result)
+            return result
+    return wrapper
+
+
+enable_from_environment()
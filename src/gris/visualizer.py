@@ -0,0 +1,236 @@
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from gris.profiling import profiled
+from gris.embedding import graph_layout
+
+
+###############################################################################
+# Constants
+###############################################################################
+
+# Defaults of `visualizer.py` (matplotlib, networkx, and Pillow are only
+# imported by the functions that draw or lay out a graph).
+FOLDER = './outputs/'
+OUTPUT = 'image'
+TITLE = 'Object Relationship Graph (distance~similarity)'
+CONDITION = 'object'
+AGGREGATE = 'mean'
+LAYOUT = 'spring'
+FRAMES = 180
+FPS = 10
+DPI = 100
+WORKERS = 1
+
+
+
+###############################################################################
+# Visualization functions
+###############################################################################
+
+@profiled
+def aggregate_edges(df, condition=CONDITION):
+    """
+    Reduce a distance table to one row per object pair, with the mean, median,
+    and number of distances of each pair (in a single groupby). Pairs are
+    undirected, so (A, B) and (B, A) are counted together.
+    """
+    obj1, obj2 = df[f'{condition}'], df[f'{condition}_2']
+    keep = (obj1.notna() & obj2.notna() & df['distance'].notna()).to_numpy()
+    obj1 = obj1[keep].astype(str).to_numpy()
+    obj2 = obj2[keep].astype(str).to_numpy()
+
+    # Put each pair's labels in sorted order, so that both directions are the same edge.
+    swap = obj1 > obj2
+    edges = pd.DataFrame({
+        'source': np.where(swap, obj2, obj1),
+        'target': np.where(swap, obj1, obj2),
+        'distance': df['distance'].to_numpy()[keep],
+    })
+
+    return (edges.groupby(['source', 'target'], sort=True)['distance']
+                 .agg(['mean', 'median', 'count'])
+                 .reset_index())
+
+
+@profiled
+def build_graph_from_df(df, condition=CONDITION, aggregate=AGGREGATE):
+    """Helper function to create a weighted undirected graph from a DataFrame (one edge per object pair)."""
+    import networkx as nx
+
+    edges = aggregate_edges(df, condition)
+
+    G = nx.Graph()
+    G.add_edges_from(
+        (source, target, {'weight': weight, 'mean': mean, 'median': median, 'count': count})
+        for source, target, weight, mean, median, count in zip(
+            edges['source'], edges['target'], edges[aggregate],
+            edges['mean'], edges['median'], edges['count'])
+    )
+    return G
+
+
+@profiled
+def compute_layout(G, dim=3, layout=LAYOUT):
+    """Place the nodes of the object graph in 2D or 3D, with a spring layout or an embedding (see `embedding.py`)."""
+    if layout == 'spring':
+        import networkx as nx
+        return nx.spring_layout(G, dim=dim, weight='weight', seed=42)
+    return graph_layout(G, dim=dim, method=layout, weight='weight')
+
+
+def draw_scene(scene):
+    """Create the figure and artists of a 3D object graph once (see `render_frames`)."""
+    import matplotlib.pyplot as plt
+    from mpl_toolkits.mplot3d.art3d import Line3DCollection
+
+    fig = plt.figure(figsize=(10, 8), dpi=scene['dpi'])
+    ax = fig.add_subplot(111, projection='3d')
+    ax.set_title(scene['title'], fontsize=14)
+    ax.set_axis_off()
+
+    xyz = scene['xyz']
+
+    # Nodes, every edge in a single collection, and node labels.
+    ax.scatter(xyz[:, 0], xyz[:, 1], xyz[:, 2], s=300, c='skyblue', edgecolors='k')
+    ax.add_collection3d(Line3DCollection(scene['segments'], colors='gray'))
+    for i, node in enumerate(scene['nodes']):
+        ax.text(*xyz[i], node, fontsize=10, ha='center', va='center')
+
+    # Keep the same limits as the scatter alone (collections do not update them).
+    ax.auto_scale_xyz(xyz[:, 0], xyz[:, 1], xyz[:, 2])
+
+    return fig, ax
+
+
+def render_frames(scene, azimuths):
+    """
+    Render the frames of a 3D object graph at the given view angles. The artists
+    are only created once; each frame just rotates the view.
+
+    Parameters:
+    - scene (dict): Node coordinates (`xyz`), labels (`nodes`), edge `segments`, `title`, and `dpi`.
+    - azimuths (list of float): View angle of each frame.
+
+    Returns:
+    - list of PIL.Image: Frames (with a 256-color palette, ready for a GIF).
+    """
+    import matplotlib.pyplot as plt
+    from PIL import Image
+
+    fig, ax = draw_scene(scene)
+    frames = []
+
+    for azimuth in azimuths:
+        ax.view_init(elev=20, azim=azimuth)
+        fig.canvas.draw()
+        rgb = np.asarray(fig.canvas.buffer_rgba())[:, :, :3]
+        frames.append(Image.fromarray(rgb).quantize(256, method=Image.Quantize.FASTOCTREE))
+
+    plt.close(fig)
+    return frames
+
+
+@profiled
+def graph_3d_animate(df, save_path=f'{FOLDER}/{OUTPUT}_3D.gif', title=TITLE,
+                     frames=FRAMES, fps=FPS, dpi=DPI, workers=WORKERS,
+                     condition=CONDITION, aggregate=AGGREGATE, layout=LAYOUT):
+    """
+    Create a 3D animated rotation of the object graph and save as a GIF.
+    Frames can be rendered in several worker processes, then encoded together.
+    """
+    G = build_graph_from_df(df, condition, aggregate)
+    pos_3d = compute_layout(G, dim=3, layout=layout)
+    
+    nodes = list(G.nodes())
+    xyz = np.array([pos_3d[node] for node in nodes])
+    segments = np.array([[pos_3d[u], pos_3d[v]] for u, v in G.edges()]).reshape(-1, 2, 3)
+
+    scene = {'xyz': xyz, 'nodes': [str(node) for node in nodes], 'segments': segments,
+             'title': title, 'dpi': dpi}
+    azimuths = np.linspace(0, 360, frames, endpoint=False)
+
+    if workers > 1:
+        # Contiguous chunks of angles, so the frames come back in order.
+        chunks = [chunk for chunk in np.array_split(azimuths, workers) if len(chunk)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            images = [image for chunk in executor.map(render_frames, [scene] * len(chunks), chunks)
+                      for image in chunk]
+    else:
+        images = render_frames(scene, azimuths)
+
+    images[0].save(save_path, save_all=True, append_images=images[1:],
+                   duration=round(1000 / fps), loop=0)
+    print(f"3D animation saved as '{save_path}'")
+
+
+@profiled
+def graph_3d_static(df, save_path=f'{FOLDER}/{OUTPUT}_3D_static.pdf', title=TITLE,
+                    condition=CONDITION, aggregate=AGGREGATE, layout=LAYOUT):
+    """Save a static 3D image of the object graph."""
+    import matplotlib.pyplot as plt
+
+    G = build_graph_from_df(df, condition, aggregate)
+    pos_3d = compute_layout(G, dim=3, layout=layout)
+
+    nodes = list(G.nodes())
+    edges = list(G.edges())
+    xyz = np.array([pos_3d[node] for node in nodes])
+
+    fig = plt.figure(figsize=(10, 8))
+    ax = fig.add_subplot(111, projection='3d')
+    ax.set_title(title, fontsize=14)
+    ax.set_axis_off()
+    ax.view_init(elev=20, azim=45)
+
+    ax.scatter(xyz[:, 0], xyz[:, 1], xyz[:, 2], s=300, c='skyblue', edgecolors='k')
+
+    for u, v in edges:
+        x = [pos_3d[u][0], pos_3d[v][0]]
+        y = [pos_3d[u][1], pos_3d[v][1]]
+        z = [pos_3d[u][2], pos_3d[v][2]]
+        ax.plot(x, y, z, c='gray')
+
+    for i, node in enumerate(nodes):
+        ax.text(*xyz[i], node, fontsize=10, ha='center', va='center')
+
+    plt.tight_layout()
+    plt.savefig(save_path, bbox_inches='tight')
+    plt.close()
+    print(f"Static 3D graph saved as '{save_path}'")
+
+
+@profiled
+def graph_2d_static(df, save_path=f'{FOLDER}/{OUTPUT}_2D.pdf', title=TITLE,
+                    condition=CONDITION, aggregate=AGGREGATE, layout=LAYOUT):
+    """Draw and save a 2D layout of the object graph using inverse distance as force strength (or an embedding, see `layout`)."""
+    import networkx as nx
+    import matplotlib.pyplot as plt
+
+    G = build_graph_from_df(df, condition, aggregate)
+
+    # Set inverse weights for spring layout
+    inv_weights = {(u, v): 1 / d['weight'] for u, v, d in G.edges(data=True)}
+    nx.set_edge_attributes(G, inv_weights, 'inv_weight')
+
+    if layout == 'spring':
+        pos = nx.spring_layout(G, weight='inv_weight', seed=42)
+    else:
+        pos = compute_layout(G, dim=2, layout=layout)
+
+    plt.figure(figsize=(10,8))
+    nx.draw_networkx_nodes(G, pos, node_color='lightblue', node_size=2000, edgecolors='k')
+    nx.draw_networkx_edges(G, pos, width=2, edge_color='gray')
+    nx.draw_networkx_labels(G, pos, font_size=10, font_weight='bold')
+
+    # Show actual distances on edges
+    edge_labels = nx.get_edge_attributes(G, 'weight')
+    edge_labels = {k: f"{v:.1f}" for k, v in edge_labels.items()}
+    nx.draw_networkx_edge_labels(G, pos, edge_labels=edge_labels, font_size=9)
+
+    plt.title(title, fontsize=14)
+    plt.axis('off')
+    plt.tight_layout()
+    plt.savefig(save_path, bbox_inches='tight')
+    plt.close()
+    print(f"2D graph saved as '{save_path}'")
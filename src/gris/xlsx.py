@@ -0,0 +1,333 @@
+import io
+import numpy as np
+from gris.profiling import profiled
+from gris.canvas import (WIDTH, HEIGHT, X_MIN, X_MAX, Y_MIN, Y_MAX, AUTOFIT_BOUNDS,
+                         canvas_positions, emit_canvas)
+from gris.blocks import sheet_blocks, emit_blocks
+
+
+###############################################################################
+# Constants
+###############################################################################
+
+# Color of cells without a fill (openpyxl's default fill color, 00000000).
+EMPTY_COLOR = '#000000'
+
+
+###############################################################################
+# Functions
+###############################################################################
+
+
+##### PROCESSING EXCEL SHEET
+@profiled
+def load_sheet(filename, sheetname):
+
+    # openpyxl is only needed (and imported) when a spreadsheet is read
+    from openpyxl import load_workbook
+
+    # Load workbook
+    workbook = load_workbook(filename)
+
+    return workbook[sheetname] # Return the sheet that we want
+
+
+def fill_id(cell):
+    """Index of a cell's fill in its workbook's fills (None for cells missing from a read-only sheet)."""
+    style = getattr(cell, 'style_array', None) or getattr(cell, '_style', None)
+    return None if style is None else style.fillId
+
+
+def fill_color(fill):
+    """Color of a cell fill, as written in canvas code (cells without a fill are EMPTY_COLOR)."""
+    if fill is None:
+        return EMPTY_COLOR
+    return f'#{fill.start_color.index[2:]}'
+
+
+def make_color_indices(rows, num_cols=None, fills=None, palette=None):
+    """
+    Color index of each cell of a sheet, read row by row. Each distinct fill is
+    only converted to a color once (cells with the same fill share its index
+    in the workbook), so each cell costs a single lookup.
+
+    Parameters:
+    - rows (iterable of tuple): Cells of each row (e.g., from `sheet.iter_rows()`);
+                                short rows are padded with empty cells.
+    - num_cols (int): Number of columns (defaults to the longest row; trailing
+                      rows without cells are then dropped).
+    - fills (dict): Color index of each fill already seen (see `fill_id`), updated in place.
+    - palette (dict): Index of each color already seen, updated in place (pass
+                      the same dict for every sheet of a workbook to share indices).
+
+    Returns:
+    - np.ndarray of int: Index (in `palette`) of each cell's color, with shape (rows, columns).
+    """
+    fills = {} if fills is None else fills
+    palette = {} if palette is None else palette
+    empty = palette.setdefault(EMPTY_COLOR, len(palette))
+    indices = []
+
+    for row in rows:
+        row_indices = []
+        for cell in row:
+            key = fill_id(cell)
+            index = fills.get(key)
+            if index is None:
+                index = fills[key] = palette.setdefault(fill_color(cell.fill), len(palette))
+            row_indices.append(index)
+        indices.append(row_indices)
+
+    if num_cols is None:
+        while indices and not indices[-1]:
+            indices.pop()
+        num_cols = max([len(row_indices) for row_indices in indices] + [1])
+        indices = indices or [[]]
+
+    indices = [row_indices + [empty] * (num_cols - len(row_indices)) for row_indices in indices]
+    return np.array(indices, dtype=np.int64).reshape(len(indices), num_cols)
+
+
+def palette_colors(palette, indices):
+    """Colors of an array of color indices (see `make_color_indices`)."""
+    return np.array(list(palette), dtype=object)[indices]
+
+
+def make_color_array(sheet, num_rows, num_cols):
+
+    # Read the cells row by row (works for full and read-only sheets)
+    rows = sheet.iter_rows(min_row=1, max_row=num_rows, min_col=1, max_col=num_cols)
+
+    # Map each cell to its color in bulk
+    palette = {}
+    indices = make_color_indices(rows, num_cols, {}, palette)
+
+    return palette_colors(palette, indices)
+
+
+@profiled
+def load_color_arrays(filename, sheetnames=None):
+    """
+    Colors of the cells of every (or some) sheet of a workbook, in one pass:
+    the workbook is opened in read-only mode and each sheet is streamed row by
+    row, without building the full workbook in memory. Each sheet spans up to
+    its last row and column with a cell, as `sheet.max_row` and
+    `sheet.max_column` do in `load_sheet`.
+
+    Parameters:
+    - filename (str): Input xlsx file.
+    - sheetnames (list of str): Sheets to read (defaults to every sheet, in workbook order).
+
+    Returns:
+    - dict: Color array (np.ndarray of str, with shape (rows, columns)) of each sheet.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(filename, read_only=True)
+    try:
+        if sheetnames is None:
+            sheetnames = [sheet.title for sheet in workbook.worksheets]
+        missing = [sheetname for sheetname in sheetnames if sheetname not in workbook.sheetnames]
+        if missing:
+            raise ValueError(f'Sheet(s) not found in {filename}: {", ".join(missing)} (choose from {", ".join(workbook.sheetnames)})')
+
+        # Fills and colors are shared by every sheet of the workbook
+        fills, palette = {}, {}
+        color_arrays = {}
+        for sheetname in sheetnames:
+            sheet = workbook[sheetname]
+
+            # The stored dimensions may be missing or stale: read every row instead
+            sheet.reset_dimensions()
+            indices = make_color_indices(sheet.iter_rows(), None, fills, palette)
+            color_arrays[sheetname] = palette_colors(palette, indices)
+    finally:
+        workbook.close()
+
+    return color_arrays
+
+
+def make_location_array(x_positions, y_positions):
+
+    # Build the canvas as an np array
+    array = np.empty((len(y_positions), len(x_positions)), dtype=object)
+
+    # Assign the location labels to the position
+    for row in range(len(x_positions)):
+        for column in range(len(y_positions)):
+            array[column, row] = (y_positions[column], x_positions[row])
+
+    return array
+
+
+def get_cluster_bounds(arr):
+    bounds = {}
+    for val in np.unique(arr):
+        positions = np.argwhere(arr == val)
+        r1, c1 = positions.min(axis=0)
+        r2, c2 = positions.max(axis=0) + 1  # exclusive
+        bounds[val] = (r1, r2, c1, c2)
+    return bounds
+
+
+def assign_cluster_indices(bounds):
+    sorted_vals = sorted(bounds.items(), key=lambda x: (x[1][0], x[1][2]))
+    cluster_rows = []
+    coords = {}
+
+    for val, (r1, r2, c1, c2) in sorted_vals:
+        # Find a row with the same top row (r1)
+        for row_idx, row in enumerate(cluster_rows):
+            if bounds[row[0]][0] == r1:
+                col_idx = len(row)
+                row.append(val)
+                coords[val] = (row_idx, col_idx)
+                break
+        else:
+            # New cluster row
+            cluster_rows.append([val])
+            coords[val] = (len(cluster_rows) - 1, 0)
+
+    return coords
+
+
+# Make label arrays
+def make_label_array(arr):
+
+    arr = np.array(arr)
+    bounds = get_cluster_bounds(arr)
+    cluster_coords = assign_cluster_indices(bounds)
+
+    output = np.empty(arr.shape, dtype=object)
+    for val, (r1, r2, c1, c2) in bounds.items():
+        x_cluster, y_cluster = cluster_coords[val]
+        for i in range(r1, r2):
+            for j in range(c1, c2):
+                output[i, j] = (x_cluster, y_cluster, i, j)
+
+    return output
+
+
+##### WRITING IBEX CODE
+@profiled
+def color_grid(color_array, width=WIDTH, height=HEIGHT, x_min=X_MIN, x_max=X_MAX,
+               y_min=Y_MIN, y_max=Y_MAX, auto_fit=False):
+    """
+    Labels and positions of the cells of a drawn canvas, given the color of
+    each cell (e.g., from `load_color_arrays`), after checking that the canvas
+    can be built.
+
+    Parameters: see `build_sheet_canvas` (`color_array` is the color of each cell,
+    with shape (rows, columns)).
+
+    Returns: see `sheet_grid`.
+    """
+    num_rows, num_cols = color_array.shape
+
+    if auto_fit:
+        x_min, x_max, y_min, y_max = AUTOFIT_BOUNDS
+
+        # Ensure autofit boundaries to reduce scrolling
+        if num_cols*width >= 100:
+            raise ValueError(f'Width specification too wide for autofit specification; please ensure the total width <100vh. Currently: {num_cols*width}')
+        if num_rows*height >= 100:
+            raise ValueError(f'Height specification too wide for autofit specification; please ensure the total height <100 vh. Currently: {num_rows*height}')
+
+    # Make label array:
+    label_array = make_label_array(color_array)
+
+    # Drawing grid
+    x_positions, y_positions = canvas_positions(num_rows, num_cols,
+                                                width, height,
+                                                x_min, x_max,
+                                                y_min, y_max)
+
+    return color_array, label_array, x_positions, y_positions
+
+
+@profiled
+def sheet_grid(sheet, width=WIDTH, height=HEIGHT, x_min=X_MIN, x_max=X_MAX,
+               y_min=Y_MIN, y_max=Y_MAX, auto_fit=False):
+    """
+    Colors, labels, and positions of the cells of a canvas drawn on a
+    spreadsheet, after checking that the canvas can be built.
+
+    Parameters: see `build_sheet_canvas`.
+
+    Returns:
+    - color_array (np.ndarray of str): Color of each cell, with shape (rows, columns).
+    - label_array (np.ndarray of tuple): Label of each cell (see `make_label_array`).
+    - x_positions (list of float): Position of each column.
+    - y_positions (list of float): Position of each row.
+    """
+    # Make color array
+    color_array = make_color_array(sheet, sheet.max_row, sheet.max_column)
+
+    return color_grid(color_array, width, height, x_min, x_max, y_min, y_max, auto_fit)
+
+
+@profiled
+def write_sheet_canvas(color_array, label_array, x_positions, y_positions,
+                       width=WIDTH, height=HEIGHT, auto_fit=False, out=None, merge=False):
+    """
+    Write the `newCanvas` and `getCanvas` code of a drawn canvas, one line per
+    row of cells (see `gris.canvas.emit_canvas`), or, with `merge`, of one
+    canvas per rectangle of same-colored cells (see `gris.blocks.emit_blocks`).
+
+    Parameters:
+    - color_array (np.ndarray of str): Color of each cell (see `sheet_grid`).
+    - label_array (np.ndarray of tuple): Label of each cell.
+    - x_positions (list of float): Position of each column.
+    - y_positions (list of float): Position of each row.
+    - width (int): Column width.
+    - height (int): Row height.
+    - auto_fit (bool): Whether positions and sizes are in vw/vh.
+    - out (file): Where to write (by default, the code is returned as a string).
+    - merge (bool): Merge rectangles of same-colored cells into single canvases.
+
+    Returns:
+    - str: Canvas code (None when written to `out`).
+    """
+    buffer = io.StringIO() if out is None else None
+    if buffer is not None:
+        out = buffer
+
+    if merge:
+        blocks, prefixes, colors = sheet_blocks(color_array, label_array)
+        emit_blocks(out, blocks, prefixes, colors, x_positions, y_positions, width, height, auto_fit, 'row-column')
+    else:
+        num_rows, num_cols = color_array.shape
+        rows, columns = np.divmod(np.arange(num_rows * num_cols), num_cols)
+
+        emit_canvas(out, label_array.ravel(), columns, rows, x_positions, y_positions,
+                    color_array.ravel(), width, height, auto_fit,
+                    breaks=num_cols * np.arange(1, num_rows + 1))
+
+    return None if buffer is None else buffer.getvalue()
+
+
+@profiled
+def build_sheet_canvas(sheet, width=WIDTH, height=HEIGHT, x_min=X_MIN, x_max=X_MAX,
+                       y_min=Y_MIN, y_max=Y_MAX, auto_fit=False, out=None, merge=False):
+    """
+    Build the `newCanvas` and `getCanvas` code of a canvas drawn on a spreadsheet
+    (one canvas per cell, colored and grouped by the cell's fill color), exactly
+    as `xlsx.py` writes it to its output file.
+
+    Parameters:
+    - sheet (openpyxl.worksheet.worksheet.Worksheet): Drawn canvas (see `load_sheet`).
+    - width (int): Column width (in pixels, or vw with `auto_fit`).
+    - height (int): Row height (in pixels, or vh with `auto_fit`).
+    - x_min, x_max (int): Horizontal bounds of the canvas on the screen.
+    - y_min, y_max (int): Vertical bounds of the canvas on the screen.
+    - auto_fit (bool): Scale the canvas with the screen (the bounds become 0-100 vw/vh).
+    - out (file): Where to write (by default, the code is returned as a string).
+    - merge (bool): Merge rectangles of same-colored cells into single canvases (see `write_sheet_canvas`).
+
+    Returns:
+    - str: Canvas code (None when written to `out`).
+    """
+    color_array, label_array, x_positions, y_positions = sheet_grid(sheet, width, height, x_min, x_max,
+                                                                     y_min, y_max, auto_fit)
+
+    return write_sheet_canvas(color_array, label_array, x_positions, y_positions, width, height, auto_fit, out, merge)
@@ -0,0 +1,279 @@
+import argparse
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from process_raw_data import NA_VALUES, read_pcibex, convert_blanks, iter_participants
+from utils import compute_action_times, expand_graphs, compute_pairwise_distances
+from distances import METRICS
+from parallel import parallel_compute_action_times, parallel_compute_pairwise_distances
+from tables import write_table
+
+
+# Participant column of PC Ibex results files.
+PARTICIPANT_COL = 'MD5.hash.of.participant.s.IP.address'
+
+
+###############################################################################
+# Functions
+###############################################################################
+
+##### READING
+def is_raw_results(filepath):
+    """Raw PC Ibex results files start with comments; cleaned files start with a header."""
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return f.readline().startswith('#')
+
+
+def read_chunks(filepath, chunksize):
+    """
+    Stream a (raw or cleaned) results file in chunks of whole participants.
+
+    Parameters:
+    - filepath (str): Raw PC Ibex results file, or a cleaned CSV (from `process_raw_data`).
+    - chunksize (int): Number of rows to read at a time.
+
+    Returns:
+    - iterator of pd.DataFrame: Chunks made of whole participants.
+    """
+    if is_raw_results(filepath):
+        chunks = read_pcibex(filepath, chunksize=chunksize)
+    else:
+        # Same missing values as raw files (see `process_raw_data.NA_VALUES`)
+        chunks = (convert_blanks(chunk) for chunk in
+                  pd.read_csv(filepath, chunksize=chunksize, keep_default_na=False, na_values=NA_VALUES))
+
+    return iter_participants(chunks, participant_col=PARTICIPANT_COL)
+
+
+def iter_batches(chunks, participants=1):
+    """
+    Regroup chunks of whole participants into batches of `participants` participants,
+    so that memory is bounded by the batch (and not by the chunk size).
+
+    Parameters:
+    - chunks (iterable of pd.DataFrame): Chunks made of whole participants.
+    - participants (int): Number of participants per batch.
+
+    Returns:
+    - iterator of pd.DataFrame: Batches of participants.
+    """
+    pending = []
+
+    for chunk in chunks:
+        for _, participant in chunk.groupby(PARTICIPANT_COL, sort=False):
+            pending.append(participant)
+            if len(pending) == participants:
+                yield pd.concat(pending, ignore_index=True)
+                pending = []
+
+    if pending:
+        yield pd.concat(pending, ignore_index=True)
+
+
+##### WRITING
+class TableAppender:
+    """
+    Write a table one piece at a time: either to a CSV file (the header is only
+    written once), or to a Parquet dataset partitioned by participant (any other path,
+    e.g. `distances.parquet`; see `tables.write_table`). Either way, the first
+    piece replaces whatever an earlier run wrote to the same path.
+
+    The columns of the first non-empty piece are the columns of the table, and
+    later pieces are written in the same order. Empty pieces are skipped, since
+    their columns may not match (e.g., the `x` and `y` columns of a participant
+    without any `Final` rows, in a study with 4-part locations).
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.columns = None
+        self.empty = None
+
+    def write(self, df):
+        if self.filepath is None:
+            return
+        if len(df) == 0:
+            self.empty = df
+            return
+
+        first = self.columns is None
+        if first:
+            self.columns = list(df.columns)
+        elif set(df.columns) != set(self.columns):
+            raise ValueError(f'Columns of {self.filepath} changed from {", ".join(self.columns)} '
+                             f'to {", ".join(df.columns)}')
+        self._write(df[self.columns], first)
+
+    def close(self):
+        """If every piece was empty, write the last one (so that the output still has its columns)."""
+        if self.filepath is not None and self.columns is None and self.empty is not None:
+            self._write(self.empty, first=True)
+
+    def _write(self, df, first):
+        if self.filepath.endswith('.csv'):
+            df.to_csv(self.filepath, mode='w' if first else 'a', header=first, index=False)
+        else:
+            write_table(df, self.filepath, partition_by=['Participant'], append=not first)
+
+
+##### PIPELINE STAGES
+def select_final(incremental, element_type='DragDrop', element_name=None):
+    """
+    Keep the rows with the `Final` positions of all objects.
+
+    Parameters:
+    - incremental (pd.DataFrame): Output of `compute_action_times`.
+    - element_type (str): Keep only `Final` rows of this PennElementType (if given).
+    - element_name (str): Keep only `Final` rows of this PennElementName (if given).
+
+    Returns:
+    - pd.DataFrame: `Final` rows.
+    """
+    keep = incremental['Parameter'] == 'Final'
+    if element_type is not None:
+        keep &= incremental['PennElementType'] == element_type
+    if element_name is not None:
+        keep &= incremental['PennElementName'] == element_name
+    return incremental[keep]
+
+
+def run_pipeline(input_file, incremental_output=None, distance_output=None, trials_output=None,
+                 chunksize=100000, participants=1, label=None, element_type='DragDrop',
+                 element_name=None, group_cols=['Participant', 'item'], metric='gradient', workers=1):
+    """
+    Run the `pipeline.ipynb` steps (`compute_action_times` -> `Final` rows ->
+    `expand_graphs` -> `compute_pairwise_distances`) as a stream, a batch of
+    participants at a time, appending each batch's results to the output files.
+    Memory is bounded by the largest batch, not by the size of the study.
+
+    Parameters:
+    - input_file (str): Raw PC Ibex results file, or a cleaned CSV.
+    - incremental_output (str): Output for the incremental (per event) table (skipped if None);
+                                a CSV file, or a Parquet dataset (e.g., `incremental.parquet`).
+    - distance_output (str): Output for the pairwise distances (skipped if None); as above.
+    - trials_output (str): If given, the distances only keep their trial key, and the
+                           trial columns are written to this output instead.
+    - chunksize (int): Number of rows to read at a time.
+    - participants (int): Number of participants per batch.
+    - label (str): Keep only rows with this `Label` (e.g., 'trials').
+    - element_type (str): Keep only `Final` rows of this PennElementType.
+    - element_name (str): Keep only `Final` rows of this PennElementName.
+    - group_cols (list of str): Columns that delineate trials.
+    - metric (str): Name of the distance metric (see `distances.METRICS`).
+    - workers (int): Number of worker processes (one pool for the whole run, see `parallel.py`);
+                     with more than one worker, use batches of many participants.
+
+    Returns:
+    - iterator of dict: Number of participants, events, and pairs in each batch.
+    """
+    incremental_writer = TableAppender(incremental_output)
+    distance_writer = TableAppender(distance_output)
+    trials_writer = TableAppender(trials_output)
+
+    # Steps for each batch (split across processes, if asked, with one pool for the whole run).
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    if executor is not None:
+        action_times = partial(parallel_compute_action_times, workers=workers, executor=executor)
+        pairwise_distances = partial(parallel_compute_pairwise_distances, workers=workers, executor=executor)
+    else:
+        action_times = compute_action_times
+        pairwise_distances = compute_pairwise_distances
+
+    try:
+        for batch in iter_batches(read_chunks(input_file, chunksize), participants):
+            if label is not None:
+                batch = batch[batch['Label'] == label]
+
+            # Incremental drag-and-drop events.
+            incremental = action_times(batch)
+            incremental_writer.write(incremental)
+
+            # Pairwise distances between the final positions of the objects.
+            final = select_final(incremental, element_type, element_name)
+            graphs = expand_graphs(final, columnar=True)
+
+            if trials_output is not None:
+                distances, trials = pairwise_distances(graphs, group_cols=group_cols, metric=metric, split_metadata=True)
+                trials_writer.write(trials)
+            else:
+                distances = pairwise_distances(graphs, group_cols=group_cols, metric=metric)
+            distance_writer.write(distances)
+
+            yield {'participants': incremental['Participant'].nunique(),
+                   'events': len(incremental),
+                   'pairs': len(distances)}
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    for writer in [incremental_writer, distance_writer, trials_writer]:
+        writer.close()
+
+
+
+###############################################################################
+# MAIN
+###############################################################################
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(prog='gris-pipeline')
+
+    parser.add_argument('-i', '--input_file', type=str,
+                        default='./data/demo-2-raw.csv',
+                        help='Raw PC Ibex results file (or a cleaned CSV).')
+
+    parser.add_argument('-ri', '--incremental_output', type=str,
+                        default='./outputs/incremental.csv',
+                        help='Output file for incremental (per event) data (.csv, or .parquet for a Parquet dataset).')
+
+    parser.add_argument('-d', '--distance_output', type=str,
+                        default='./outputs/distances.csv',
+                        help='Output file for pairwise distances (.csv, or .parquet for a Parquet dataset).')
+
+    parser.add_argument('-t', '--trials_output', type=str,
+                        default=None,
+                        help='If given, write trial columns to this file and keep only trial keys in the distances.')
+
+    parser.add_argument('-n', '--chunksize', type=int,
+                        default=100000,
+                        help='Number of rows to read at a time.')
+
+    parser.add_argument('-p', '--participants', type=int,
+                        default=1,
+                        help='Number of participants to process at a time.')
+
+    parser.add_argument('-l', '--label', type=str,
+                        default=None,
+                        help='Only keep rows with this Label (e.g., trials).')
+
+    parser.add_argument('-e', '--element_name', type=str,
+                        default=None,
+                        help='Only use Final positions from this PennElementName (e.g., experimental-trials).')
+
+    parser.add_argument('-g', '--group_cols', type=str,
+                        nargs='+',
+                        default=['Participant', 'item'],
+                        help='Columns that delineate trials.')
+
+    parser.add_argument('-m', '--metric', type=str,
+                        choices=list(METRICS),
+                        default='gradient',
+                        help='Distance metric.')
+
+    parser.add_argument('-w', '--workers', type=int,
+                        default=1,
+                        help='Number of worker processes for each batch of participants.')
+
+    args = parser.parse_args()
+
+    totals = {'participants': 0, 'events': 0, 'pairs': 0}
+    for stats in run_pipeline(args.input_file, args.incremental_output, args.distance_output,
+                              args.trials_output, chunksize=args.chunksize,
+                              participants=args.participants, label=args.label,
+                              element_name=args.element_name, group_cols=args.group_cols,
+                              metric=args.metric, workers=args.workers):
+        for key in totals:
+            totals[key] += stats[key]
+        print(f"Processed {totals['participants']} participant(s): "
+              f"{totals['events']} events, {totals['pairs']} pairs")
@@ -0,0 +1,356 @@
+import os
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from utils import (compute_action_times, check_action_time_cols, action_time_stats, add_action_times,
+                   factorize_groups, sort_groups, group_pair_indices, get_locations, build_pairwise_output,
+                   compute_pairwise_distances)
+from distances import compute_distances
+
+
+# Number of shards per worker (more shards balance uneven participants better).
+SHARDS_PER_WORKER = 4
+
+# Columns added by `utils.compute_action_times` (and with `event_stats`).
+ACTION_TIME_STATS = ["EventIndex", "TimeSinceLastEvent", "TotalItemTime"]
+EVENT_STATS = ["DragDuration", "IdleTime"]
+
+
+###############################################################################
+# Shared memory
+###############################################################################
+
+def to_shared(array):
+    """
+    Copy an array into a new shared memory block, so that worker processes can
+    read it without it being pickled.
+
+    Parameters:
+    - array (np.ndarray): Array to share.
+
+    Returns:
+    - shm (SharedMemory): The shared memory block (close and unlink it when done).
+    - spec (tuple): (name, shape, dtype) needed to attach to the array (see `from_shared`).
+    """
+    array = np.ascontiguousarray(array)
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def from_shared(spec):
+    """
+    Attach to an array shared with `to_shared`.
+
+    Parameters:
+    - spec (tuple): (name, shape, dtype) from `to_shared`.
+
+    Returns:
+    - shm (SharedMemory): The shared memory block (close it when done).
+    - array (np.ndarray): View of the shared array.
+    """
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+###############################################################################
+# Sharding
+###############################################################################
+
+def split_balanced(weights, num_shards):
+    """
+    Split a sequence of units (e.g., participants or trials) into contiguous
+    shards with roughly equal total weight.
+
+    Parameters:
+    - weights (np.ndarray of int): Weight (e.g., number of rows) of each unit.
+    - num_shards (int): Maximum number of shards.
+
+    Returns:
+    - list of (int, int): Start (inclusive) and end (exclusive) unit of each non-empty shard.
+    """
+    total = np.cumsum(weights)
+    if len(total) == 0:
+        return []
+
+    targets = np.linspace(0, total[-1], num_shards + 1)[1:-1]
+    cuts = np.unique(np.concatenate([[0], np.searchsorted(total, targets, side='right'), [len(weights)]]))
+
+    return [(start, end) for start, end in zip(cuts[:-1], cuts[1:]) if end > start]
+
+
+###############################################################################
+# Worker pools
+###############################################################################
+
+@contextmanager
+def worker_pool(executor=None, workers=None):
+    """
+    Use `executor` if given (e.g., one pool for a whole pipeline run), or else a
+    new process pool that is shut down on exit.
+
+    Parameters:
+    - executor (concurrent.futures.Executor): Pool to reuse (left running).
+    - workers (int): Number of worker processes of a new pool.
+
+    Returns:
+    - context manager of concurrent.futures.Executor.
+    """
+    if executor is not None:
+        yield executor
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield pool
+
+
+def share_arrays(arrays):
+    """
+    Put several arrays in shared memory (see `to_shared`).
+
+    Parameters:
+    - arrays (dict): Arrays (np.ndarray) to share, by name.
+
+    Returns:
+    - blocks (list of SharedMemory): Shared memory blocks (release them with `release`).
+    - specs (dict): Spec of each array, by name (see `attach_arrays`).
+    """
+    blocks, specs = [], {}
+    try:
+        for name, array in arrays.items():
+            shm, specs[name] = to_shared(array)
+            blocks.append(shm)
+    except BaseException:
+        release(blocks)
+        raise
+    return blocks, specs
+
+
+def attach_arrays(specs):
+    """Attach to arrays shared with `share_arrays` (close the blocks when done, after dropping the arrays)."""
+    blocks, arrays = [], {}
+    for name, spec in specs.items():
+        shm, arrays[name] = from_shared(spec)
+        blocks.append(shm)
+    return blocks, arrays
+
+
+def release(blocks, unlink=True):
+    """Close (and unlink) shared memory blocks."""
+    for shm in blocks:
+        shm.close()
+        if unlink:
+            shm.unlink()
+
+
+###############################################################################
+# Workers
+###############################################################################
+
+def _pairwise_worker(specs, start, end, offset, metric, metric_params):
+    """
+    Build and measure the pairs of a shard of trials (`start` to `end`, in
+    sorted order) from the shared locations, and write their rows and
+    distances to the shared outputs, from pair `offset` on.
+    """
+    blocks, arrays = attach_arrays(specs)
+    try:
+        idx1, idx2 = group_pair_indices(arrays['starts'][start:end], arrays['sizes'][start:end])
+
+        stop = offset + len(idx1)
+        arrays['idx1'][offset:stop] = idx1
+        arrays['idx2'][offset:stop] = idx2
+        arrays['distances'][offset:stop] = compute_distances(arrays['locations'][idx1], arrays['locations'][idx2],
+                                                             metric=metric, **(metric_params or {}))
+    finally:
+        # The views have to go before their blocks can be closed.
+        del arrays
+        release(blocks, unlink=False)
+
+
+def _action_times_worker(specs, offset, stop, event_stats):
+    """
+    Compute the action time statistics of a shard of participants (rows
+    `offset` to `stop` of the rows sorted by participant) from shared columns,
+    and write them to the same slice of the shared outputs.
+    """
+    blocks, arrays = attach_arrays(specs)
+    try:
+        rows = arrays['rows'][offset:stop].copy()
+        events = (arrays['is_drag'][rows], arrays['is_drop'][rows]) if event_stats else ()
+        order, stats = action_time_stats(arrays['keys'][rows], arrays['valid'][rows],
+                                         arrays['event_time'][rows], *events)
+
+        arrays['order'][offset:stop] = rows[order]
+        for col, values in stats.items():
+            arrays[col][offset:stop] = values
+    finally:
+        # The views have to go before their blocks can be closed.
+        del arrays
+        release(blocks, unlink=False)
+
+
+###############################################################################
+# Parallel pipeline steps
+###############################################################################
+
+def parallel_compute_pairwise_distances(df, group_cols, location_col='location', object_col='object',
+                                        categorical=False, split_metadata=False, metric=None,
+                                        metric_params=None, workers=None, executor=None):
+    """
+    Parallel version of `utils.compute_pairwise_distances` (with the same output).
+
+    The data are sorted once, and the locations (and where each trial starts)
+    are put in shared memory, along with the outputs. The trials are split
+    into contiguous shards (balanced by their number of pairs), and each
+    worker process builds and measures the pairs of its shard and writes
+    their rows and distances to its own slice of the outputs, so no
+    dataframes are pickled. The output is then built once, from all the
+    pairs, as in the serial version.
+
+    Parameters:
+    - df (pd.DataFrame): Expanded dataframe (see `expand_graphs`).
+    - group_cols (list of str): Columns to group by (e.g., ['Participant', 'item']).
+    - location_col (str): Name of the coordinate column (expects vectors).
+    - object_col (str): Name of the object identifier column.
+    - categorical (bool): Determining categorical differences (True) or not (False).
+    - split_metadata (bool): Whether to return the trial columns in a separate table.
+    - metric (str): Name of the distance metric (see `distances.METRICS`); overrides `categorical`.
+    - metric_params (dict): Extra options for the metric.
+    - workers (int): Number of worker processes (defaults to the number of CPUs).
+    - executor (concurrent.futures.Executor): Pool to use (e.g., one pool for a whole
+                                              pipeline run); by default, a new one.
+
+    Returns:
+    - pd.DataFrame: Compact pairwise comparison results.
+                    (If `split_metadata`, a tuple of the pairwise results and the trial table.)
+    """
+    workers = workers or os.cpu_count()
+    if metric is None:
+        metric = 'categorical' if categorical else 'gradient'
+
+    # Sort once (rows without a trial are dropped, as in the serial version).
+    sorted_df, starts, sizes = sort_groups(df, group_cols)
+    locations = get_locations(sorted_df, location_col)
+
+    # Balance the shards by their number of pairs (not their number of trials).
+    num_pairs = sizes * (sizes - 1) // 2
+    shards = split_balanced(num_pairs + sizes, workers * SHARDS_PER_WORKER)
+
+    # Only numeric locations can be shared (others are left to the serial version).
+    if len(shards) < 2 or locations.dtype.kind not in 'iuf':
+        return compute_pairwise_distances(df, group_cols, location_col, object_col, split_metadata=split_metadata,
+                                          metric=metric, metric_params=metric_params)
+
+    total = int(num_pairs.sum())
+    outputs = {'idx1': np.zeros(total, dtype=np.int64), 'idx2': np.zeros(total, dtype=np.int64),
+               'distances': np.zeros(total, dtype=np.float64)}
+
+    # Each shard's pairs start where the pairs of the trials before it end.
+    ends = np.cumsum(num_pairs)
+    blocks, specs = share_arrays({'locations': locations, 'starts': starts, 'sizes': sizes, **outputs})
+    try:
+        with worker_pool(executor, workers) as pool:
+            futures = [pool.submit(_pairwise_worker, specs, start, end,
+                                   ends[start - 1] if start else 0, metric, metric_params)
+                       for start, end in shards]
+            for future in futures:
+                future.result()
+
+        attached, arrays = attach_arrays({name: specs[name] for name in outputs})
+        pairs = {name: array.copy() for name, array in arrays.items()}
+        del arrays
+        release(attached, unlink=False)
+    finally:
+        release(blocks)
+
+    return build_pairwise_output(sorted_df, group_cols, starts, pairs['idx1'], pairs['idx2'], pairs['distances'],
+                                 location_col, object_col, split_metadata)
+
+
+def parallel_compute_action_times(df, participant_col="MD5.hash.of.participant.s.IP.address",
+                                  item_col="Order.number.of.item", inplace=False, event_stats=False,
+                                  workers=None, executor=None):
+    """
+    Parallel version of `utils.compute_action_times` (with the same output).
+
+    The columns the statistics need (trial codes, times, and drag/drop flags)
+    are put in shared memory, along with the outputs. The study is sharded by
+    participant (each shard is a contiguous range of participants, in sorted
+    order, with rows without a participant last), and each worker process
+    sorts its shard and writes its statistics to its own slice of the outputs,
+    so no dataframes are pickled. The statistics are then added to the data
+    as in the serial version.
+
+    Parameters:
+    - df (pd.DataFrame): Input dataframe.
+    - participant_col (str): Name for column that defines participant.
+    - item_col (str): Name for column that defines item.
+    - inplace (bool): Add the statistics to `df` itself (see `utils.compute_action_times`).
+    - event_stats (bool): Also compute DragDuration and IdleTime.
+    - workers (int): Number of worker processes (defaults to the number of CPUs).
+    - executor (concurrent.futures.Executor): Pool to use (e.g., one pool for a whole
+                                              pipeline run); by default, a new one.
+
+    Returns:
+    - df (pd.DataFrame): Output dataframe with the action time statistics
+                         (see `utils.compute_action_times`).
+    """
+    workers = workers or os.cpu_count()
+    check_action_time_cols(df, participant_col, item_col, event_stats)
+
+    # Give each participant a slot in sorted order (rows without a participant go
+    # in the last slot, where the serial version sorts them), then balance shards by rows.
+    codes, participants = pd.factorize(df[participant_col], sort=True)
+    slots = np.where(codes >= 0, codes, len(participants))
+    counts = np.bincount(slots, minlength=len(participants) + 1)
+    shards = split_balanced(counts, workers * SHARDS_PER_WORKER)
+
+    # Only numeric times can be shared (others are left to the serial version).
+    event_time = df["EventTime"].to_numpy()
+    if len(shards) < 2 or event_time.dtype.kind not in 'iuf':
+        return compute_action_times(df, participant_col, item_col, inplace=inplace, event_stats=event_stats)
+
+    keys, valid = factorize_groups(df, [participant_col, item_col])
+    num_rows = len(df)
+
+    # Rows sorted by participant slot, so that each shard is a slice of them.
+    rows = np.argsort(slots, kind='stable')
+    columns = {'rows': rows, 'keys': keys, 'valid': valid, 'event_time': event_time}
+    if event_stats:
+        parameter = df["Parameter"].to_numpy()
+        columns.update(is_drag=parameter == "Drag", is_drop=parameter == "Drop")
+
+    stat_cols = ACTION_TIME_STATS + (EVENT_STATS if event_stats else [])
+    outputs = {'order': np.zeros(num_rows, dtype=np.int64)}
+    outputs.update({col: np.zeros(num_rows, dtype=np.float64) for col in stat_cols})
+
+    # Each shard's rows start where the rows of the participants before it end.
+    ends = np.cumsum(counts)
+    blocks, specs = share_arrays({**columns, **outputs})
+    try:
+        with worker_pool(executor, workers) as pool:
+            futures = [pool.submit(_action_times_worker, specs, ends[start - 1] if start else 0, ends[end - 1],
+                                   event_stats)
+                       for start, end in shards]
+            for future in futures:
+                future.result()
+
+        attached, arrays = attach_arrays({name: specs[name] for name in outputs})
+        order = arrays['order'].copy()
+        stats = {col: arrays[col].copy() for col in stat_cols}
+        del arrays
+        release(attached, unlink=False)
+    finally:
+        release(blocks)
+
+    # Same types as the serial version: counts and times stay integers when nothing is missing.
+    if valid.all():
+        stats['EventIndex'] = stats['EventIndex'].astype(np.int64)
+    time_dtype = (event_time[:0] - event_time[:0]).dtype
+    if not np.isnan(stats['TotalItemTime']).any():
+        stats['TotalItemTime'] = stats['TotalItemTime'].astype(time_dtype)
+
+    return add_action_times(df, order, stats, participant_col, item_col, inplace)
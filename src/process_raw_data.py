@@ -0,0 +1,323 @@
+import argparse
+import re
+import numpy as np
+import pandas as pd
+
+
+###############################################################################
+# Constants
+###############################################################################
+
+# Column declarations in PC Ibex results files look like `# 2. MD5 hash of participant's IP address.`
+HEADER_PATTERN = re.compile(rb'^# (\d+)\. (.+)\.\r?$', re.MULTILINE)
+
+# Any full line that starts with a `#` is a comment (header, user agent, etc.)
+COMMENT_PATTERN = re.compile(r'^#[^\n]*(\n|$)', re.MULTILINE)
+
+# Typed columns that PC Ibex always writes. Low-cardinality columns are stored
+# as categories, which cuts memory considerably on large results files.
+RESULTS_DTYPES = {
+    'Results.reception.time': 'int64',
+    'MD5.hash.of.participant.s.IP.address': 'string',
+    'Controller.name': 'category',
+    'Order.number.of.item': 'int64',
+    'Inner.element.number': 'int64',
+    'Label': 'category',
+    'PennElementType': 'category',
+    'PennElementName': 'category',
+    'Parameter': 'category',
+    'Value': 'string',
+    'EventTime': 'int64',
+}
+
+# Size of the blocks (in bytes/characters) read from disk at a time.
+BLOCK_SIZE = 1 << 20
+
+# Strings read as missing values: only "NA", as in R's `read.csv` (pandas' defaults
+# would also turn PC Ibex's "NULL" placeholders, and empty strings, into NaN).
+# Empty strings are only missing in numeric columns (see `convert_blanks`).
+NA_VALUES = ['NA']
+
+
+###############################################################################
+# Functions
+###############################################################################
+
+##### COLUMN NAMES
+def make_name(name):
+    """
+    Turn a PC Ibex column description into the name R's `read.csv` would give it
+    (e.g., "MD5 hash of participant's IP address" -> "MD5.hash.of.participant.s.IP.address").
+
+    Parameters:
+    - name (str): Column description from a `# N. Name.` header comment.
+
+    Returns:
+    - str: Syntactically valid column name.
+    """
+    name = re.sub(r'[^A-Za-z0-9._]', '.', name)
+
+    # Names have to start with a letter (or a dot that is not followed by a number).
+    if not re.match(r'[A-Za-z]|\.(?![0-9])', name):
+        name = 'X' + name
+
+    return name
+
+
+def iter_header_comments(filepath):
+    """
+    Yield every `# N. Name.` column declaration in a raw results file, in order.
+
+    The file is searched a block at a time, so this pass is much cheaper than
+    parsing the file.
+
+    Parameters:
+    - filepath (str): Location of the raw results file.
+
+    Returns:
+    - iterator of (int, str): Column index (starting at 1) and column description.
+    """
+    with open(filepath, 'rb') as f:
+        remainder = b''
+        while True:
+            block = f.read(BLOCK_SIZE)
+
+            # Only search complete lines; keep the rest for the next block.
+            if block:
+                block = remainder + block
+                cut = block.rfind(b'\n') + 1
+                block, remainder = block[:cut], block[cut:]
+            else:
+                block, remainder = remainder, b''
+
+            for match in HEADER_PATTERN.finditer(block):
+                yield int(match.group(1)), match.group(2).decode('utf-8')
+
+            if not remainder and not block:
+                break
+
+
+def read_column_names(filepath):
+    """
+    Collect the column names of a raw PC Ibex results file from its `# N. Name.` comments.
+
+    PC Ibex only re-declares the columns that change between controllers, so the
+    names are taken at the point where the widest set of columns is first declared
+    (mirroring `read.pcibex` in `process_raw_data.R`).
+
+    Parameters:
+    - filepath (str): Location of the raw results file.
+
+    Returns:
+    - output (list of str): Column names, in order.
+    """
+    cols = {}
+    names = []
+    max_index = 0
+
+    for index, value in iter_header_comments(filepath):
+
+        # A repeated name means the earlier column was PC Ibex's own.
+        for other, name in cols.items():
+            if (name == value) and (other != index):
+                cols[other] = f'{value}.Ibex'
+        cols[index] = value
+
+        # Snapshot the names whenever the widest declaration grows.
+        if index > max_index:
+            max_index = index
+            names = [cols.get(i, f'V{i}') for i in range(1, max_index + 1)]
+
+    # Sanitize names and make them unique.
+    output = []
+    seen = {}
+    for name in names:
+        name = make_name(name)
+        if name in seen:
+            seen[name] += 1
+            name = f'{name}.{seen[name]}'
+        else:
+            seen[name] = 0
+        output.append(name)
+
+    return output
+
+
+##### READING RESULTS
+class ResultsStream:
+    """
+    File-like wrapper over a raw results file that skips every comment line.
+
+    Comments are stripped a block at a time (not line by line), so pandas
+    can parse the file in a single streaming pass.
+    """
+
+    def __init__(self, filepath, encoding='utf-8'):
+        self.handle = open(filepath, 'r', encoding=encoding, newline='')
+
+    def read(self, size=-1):
+        while True:
+            block = self.handle.read(size if size and size > 0 else -1)
+            if not block:
+                return ''
+
+            # Finish the current line so that comments are never split.
+            if not block.endswith('\n'):
+                block += self.handle.readline()
+
+            block = COMMENT_PATTERN.sub('', block)
+
+            # A block made only of comments would otherwise look like the end of the file.
+            if block:
+                return block
+
+    def close(self):
+        self.handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def convert_blanks(df, typed=()):
+    """
+    Convert the columns whose non-empty values are all numbers to numbers, with
+    empty strings as NaN (as R's `type.convert` does; other columns keep their
+    empty strings).
+
+    Parameters:
+    - df (pd.DataFrame): Results, read with `keep_default_na=False`.
+    - typed (iterable of str): Columns with a declared type, left as they are.
+
+    Returns:
+    - pd.DataFrame: Same results (converted in place).
+    """
+    for col in df.columns:
+        if col in typed or df[col].dtype.kind in 'biuf':
+            continue
+
+        blank = df[col] == ''
+        if not blank.any():
+            continue
+
+        numbers = pd.to_numeric(df[col].mask(blank), errors='coerce')
+        if numbers.notna().sum() == (~blank).sum():
+            df[col] = numbers
+
+    return df
+
+
+def read_pcibex(filepath, chunksize=None, dtype=None, usecols=None, names=None):
+    """
+    Read a raw PC Ibex results file (a Python version of `process_raw_data.R`).
+
+    The columns are named from the file's `# N. Name.` comments and typed with
+    `RESULTS_DTYPES`. As in R, only "NA" is read as a missing value (see
+    `NA_VALUES`), so "NULL" cells stay strings, and empty cells are only
+    missing in numeric columns (see `convert_blanks`). With `chunksize`, the
+    file is streamed instead of being loaded in full, which keeps memory
+    bounded for very large results files (each chunk's columns are then
+    converted on their own).
+
+    Parameters:
+    - filepath (str): Location of the raw results file.
+    - chunksize (int): Number of rows per chunk; if None, the whole file is read.
+    - dtype (dict): Column types, updating the defaults in `RESULTS_DTYPES`.
+    - usecols (list of str): Subset of columns to keep.
+    - names (list of str): Column names; if None, they are read from the file.
+
+    Returns:
+    - pd.DataFrame (or an iterator of pd.DataFrames, if `chunksize` is given).
+    """
+    if names is None:
+        names = read_column_names(filepath)
+
+    # Only type the columns that are actually present.
+    dtypes = {**RESULTS_DTYPES, **(dtype or {})}
+    dtypes = {col: kind for col, kind in dtypes.items() if col in names}
+
+    stream = ResultsStream(filepath)
+    reader = pd.read_csv(stream, header=None, names=names, dtype=dtypes,
+                         usecols=usecols, chunksize=chunksize,
+                         keep_default_na=False, na_values=NA_VALUES)
+
+    if chunksize is None:
+        stream.close()
+        return convert_blanks(reader, dtypes)
+
+    return _iterate_and_close(reader, stream, dtypes)
+
+
+def _iterate_and_close(reader, stream, typed):
+    with stream, reader:
+        for chunk in reader:
+            yield convert_blanks(chunk, typed)
+
+
+def iter_participants(chunks, participant_col='MD5.hash.of.participant.s.IP.address'):
+    """
+    Re-cut a stream of chunks so that no participant is split across two chunks
+    (which lets each chunk go straight into `utils.compute_action_times`).
+
+    PC Ibex appends each participant's rows as one block, so only the last
+    participant of each chunk has to be carried over to the next one.
+
+    Parameters:
+    - chunks (iterable of pd.DataFrame): Chunks, e.g. from `read_pcibex(..., chunksize=N)`.
+    - participant_col (str): Name for column that defines participant.
+
+    Returns:
+    - iterator of pd.DataFrame: Chunks made of whole participants.
+    """
+    carry = None
+
+    for chunk in chunks:
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+
+        if chunk.empty:
+            carry = chunk
+            continue
+
+        # Everything from the last participant's first row onward waits for the next chunk.
+        values = chunk[participant_col].to_numpy()
+        changes = np.flatnonzero(values[1:] != values[:-1]) + 1
+        cut = changes[-1] if len(changes) else 0
+
+        carry = chunk.iloc[cut:]
+        if cut:
+            yield chunk.iloc[:cut].reset_index(drop=True)
+
+    if (carry is not None) and (not carry.empty):
+        yield carry.reset_index(drop=True)
+
+
+###############################################################################
+# MAIN
+###############################################################################
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-i', '--input_file', type=str,
+                        default='./data/demo-3-raw.csv',
+                        help='Raw PC Ibex results file.')
+
+    parser.add_argument('-o', '--output_file', type=str,
+                        default='./data/demo-3-cleaned.csv',
+                        help='Output (cleaned) CSV file.')
+
+    parser.add_argument('-n', '--chunksize', type=int,
+                        default=100000,
+                        help='Number of rows to process at a time.')
+
+    args = parser.parse_args()
+
+    # Stream the results into the cleaned file, one chunk at a time.
+    header = True
+    for chunk in read_pcibex(args.input_file, chunksize=args.chunksize):
+        chunk.to_csv(args.output_file, mode='w' if header else 'a', header=header, index=False)
+        header = False
@@ -0,0 +1,5 @@
+# Profiling lives in `gris/profiling.py`; this module keeps `import profiling`
+# working for the scripts and notebooks (it is the same profiler, with the same state).
+from gris.profiling import (PROFILE_VARIABLE, LOGGER, Sink, LogSink, JsonLinesSink, CProfileSink, CollectSink,
+                            SINKS, MEMORY, TALLIES, STATE, enable, disable, is_enabled, session,
+                            enable_from_environment, count_rows, flush_tallies, stage, note, profiled)
@@ -0,0 +1,219 @@
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from utils import COORDINATE_COLS
+
+
+###############################################################################
+# Constants
+###############################################################################
+
+# Columns that only take a handful of (repeated) values; these are stored as
+# categories, which Parquet/Arrow dictionary-encode.
+DICTIONARY_COLS = [
+    'Participant',
+    'MD5.hash.of.participant.s.IP.address',
+    'object',
+    'object_2',
+    'Controller.name',
+    'Label',
+    'PennElementType',
+    'PennElementName',
+    'Parameter',
+]
+
+# Location columns (tuples, or strings like "(19, 1)" from a CSV), and the
+# suffix of the integer coordinate columns that replace them.
+LOCATION_COLS = {
+    'location': '',
+    'location_2': '_2',
+}
+
+# Object-location tuples from `clean_string`; these are already stored in `Value`.
+DROPPED_COLS = ['final_graphs']
+
+# Table formats, by file extension.
+FORMATS = {
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.feather': 'feather',
+    '.arrow': 'feather',
+}
+
+
+###############################################################################
+# Functions
+###############################################################################
+
+##### PREPARING TABLES
+def split_locations(df, location_cols=LOCATION_COLS):
+    """
+    Replace location columns (tuples, or strings like "(19, 1)") with integer
+    coordinate columns, e.g. `location` -> `x_cat`, `y_cat`, `x`, `y` and
+    `location_2` -> `x_cat_2`, `y_cat_2`, `x_2`, `y_2`.
+
+    Parameters:
+    - df (pd.DataFrame): Input dataframe.
+    - location_cols (dict): Location columns and the suffix of their coordinate columns.
+
+    Returns:
+    - df (pd.DataFrame): Output dataframe with integer coordinate columns.
+    """
+    df = df.copy()
+
+    for location_col, suffix in location_cols.items():
+        if location_col not in df.columns:
+            continue
+
+        values = df[location_col]
+        first = values.dropna().iloc[0] if values.notna().any() else ()
+
+        # Tuples can be stacked directly; strings (from CSVs) are parsed in bulk.
+        if isinstance(first, (tuple, list, np.ndarray)):
+            coords = np.stack(values.to_numpy()).astype(np.int32)
+        else:
+            coords = (values.astype('string')
+                            .str.extractall(r'(-?\d+)')[0]
+                            .astype(np.int32)
+                            .to_numpy()
+                            .reshape(len(df), -1))
+
+        # Put the coordinate columns where the location column was.
+        position = df.columns.get_loc(location_col)
+        df = df.drop(columns=[location_col])
+        for offset, col in enumerate(COORDINATE_COLS[-coords.shape[1]:]):
+            df.insert(position + offset, f'{col}{suffix}', coords[:, offset])
+
+    return df
+
+
+def prepare_table(df):
+    """
+    Get an incremental or distance table ready for a columnar format: locations
+    become integer coordinate columns, repeated columns become categories, and
+    columns of Python objects are dropped.
+
+    Parameters:
+    - df (pd.DataFrame): Input dataframe (e.g., from `compute_pairwise_distances`).
+
+    Returns:
+    - df (pd.DataFrame): Output dataframe.
+    """
+    df = split_locations(df.drop(columns=[col for col in DROPPED_COLS if col in df.columns]))
+
+    for col in DICTIONARY_COLS:
+        if (col in df.columns) and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+
+    return df.reset_index(drop=True)
+
+
+def get_format(path, format=None):
+    """Infer the table format from a path (directories are partitioned Parquet datasets)."""
+    if format is not None:
+        return format
+    if os.path.isdir(path):
+        return 'parquet'
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f'Unknown table format for {path} (use one of: {", ".join(FORMATS)})')
+    return FORMATS[extension]
+
+
+def clear_partitions(path, partition_by):
+    """
+    Remove the partitions of an earlier dataset written to `path` (the folders
+    named `<column>=<value>` for the first partition column), leaving any other
+    files alone.
+
+    Parameters:
+    - path (str): Partitioned directory.
+    - partition_by (list of str): Columns the dataset is partitioned by.
+
+    Returns:
+    - None
+    """
+    if not os.path.isdir(path):
+        return
+
+    prefix = f'{partition_by[0]}='
+    with os.scandir(path) as scan:
+        for entry in scan:
+            if entry.is_dir() and entry.name.startswith(prefix):
+                shutil.rmtree(entry.path)
+
+
+##### WRITING AND READING
+def write_table(df, path, format=None, partition_by=None, append=False):
+    """
+    Write an incremental or distance table as Parquet or Feather (Arrow IPC).
+
+    Unlike CSVs, locations keep their integer types (so they do not need to be
+    re-parsed on reload), and participant/object columns are dictionary-encoded.
+    Parquet tables can also be partitioned (e.g., by participant) into a directory
+    with one folder per participant. The table replaces any dataset already in
+    the directory, unless `append` is set: then only the participants in `df`
+    are replaced, and the others are kept.
+
+    Parameters:
+    - df (pd.DataFrame): Input dataframe.
+    - path (str): Output file (.parquet or .feather), or a directory if partitioned.
+    - format (str): 'parquet' or 'feather'; inferred from `path` if None.
+    - partition_by (list of str): Columns to partition by (Parquet only), e.g. ['Participant'].
+    - append (bool): Add to the partitioned dataset already in `path` (see above).
+
+    Returns:
+    - None
+    """
+    format = format or ('parquet' if partition_by else get_format(path))
+    df = prepare_table(df)
+
+    if format == 'feather':
+        if partition_by:
+            raise ValueError('Feather tables cannot be partitioned; use Parquet instead.')
+
+        # Uncompressed Feather files can be memory-mapped when they are read.
+        df.to_feather(path, compression='uncompressed')
+        return
+
+    if partition_by:
+        if not append:
+            clear_partitions(path, partition_by)
+        df.to_parquet(path, engine='pyarrow', index=False, partition_cols=partition_by,
+                      existing_data_behavior='delete_matching')
+    else:
+        df.to_parquet(path, engine='pyarrow', index=False)
+
+
+def read_table(path, columns=None, participants=None, participant_col='Participant', format=None):
+    """
+    Read a table written with `write_table`, memory-mapping the file where possible.
+
+    Parameters:
+    - path (str): Table file, or partitioned directory.
+    - columns (list of str): Subset of columns to read.
+    - participants (list of str): Only read these participants.
+    - participant_col (str): Name for column that defines participant.
+    - format (str): 'parquet' or 'feather'; inferred from `path` if None.
+
+    Returns:
+    - pd.DataFrame: The table.
+    """
+    format = get_format(path, format)
+
+    if format == 'feather':
+        from pyarrow import feather
+
+        table = feather.read_table(path, columns=columns, memory_map=True)
+        df = table.to_pandas()
+        if participants is not None:
+            df = df[df[participant_col].isin(participants)].reset_index(drop=True)
+        return df
+
+    filters = None
+    if participants is not None:
+        filters = [(participant_col, 'in', list(participants))]
+
+    return pd.read_parquet(path, engine='pyarrow', columns=columns, filters=filters, memory_map=True)
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The pipeline modules are scripts in `src/` (e.g., `import utils`), not a package.
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SRC_DIR)
+
+DATA_DIR = os.path.join(SRC_DIR, 'data')
@@ -0,0 +1,55 @@
+import os
+import pandas as pd
+import pytest
+from conftest import DATA_DIR
+from gris_pipeline import PARTICIPANT_COL, TableAppender, run_pipeline
+
+
+def run(input_file, folder):
+    """Run the pipeline with CSV outputs, and read them back."""
+    incremental_output = os.path.join(folder, 'incremental.csv')
+    distance_output = os.path.join(folder, 'distances.csv')
+    list(run_pipeline(input_file, incremental_output, distance_output))
+    return pd.read_csv(incremental_output), pd.read_csv(distance_output)
+
+
+def test_participant_without_final_rows(tmp_path):
+    # A participant who dropped out after the first `Start` comes first, so the
+    # first batch has no `Final` rows (and no 4-part locations).
+    study = pd.read_csv(os.path.join(DATA_DIR, 'demo-3-cleaned.csv'))
+    dropout = study.iloc[[0]].assign(**{PARTICIPANT_COL: 'dropout'})
+    assert (dropout['Value'] == 'Start').all()
+
+    with_dropout = tmp_path / 'with_dropout.csv'
+    pd.concat([dropout, study]).to_csv(with_dropout, index=False)
+    os.mkdir(tmp_path / 'expected')
+    os.mkdir(tmp_path / 'actual')
+
+    _, expected = run(os.path.join(DATA_DIR, 'demo-3-cleaned.csv'), tmp_path / 'expected')
+    incremental, distances = run(str(with_dropout), tmp_path / 'actual')
+
+    assert 'dropout' in set(incremental['Participant'])
+    assert ['x_cat', 'y_cat', 'x', 'y'] == [col for col in distances.columns if col in ['x_cat', 'y_cat', 'x', 'y']]
+    pd.testing.assert_frame_equal(distances, expected)
+
+
+def test_appender_checks_columns(tmp_path):
+    writer = TableAppender(str(tmp_path / 'table.csv'))
+    writer.write(pd.DataFrame({'x': [], 'y': []}))
+    writer.write(pd.DataFrame({'x_cat': [0], 'y_cat': [1], 'x': [2], 'y': [3]}))
+    writer.write(pd.DataFrame({'y': [7], 'x': [6], 'y_cat': [5], 'x_cat': [4]}))
+
+    table = pd.read_csv(tmp_path / 'table.csv')
+    assert list(table.columns) == ['x_cat', 'y_cat', 'x', 'y']
+    assert table.to_numpy().tolist() == [[0, 1, 2, 3], [4, 5, 6, 7]]
+
+    with pytest.raises(ValueError):
+        writer.write(pd.DataFrame({'x': [0], 'y': [1]}))
+
+
+def test_appender_writes_empty_table(tmp_path):
+    writer = TableAppender(str(tmp_path / 'table.csv'))
+    writer.write(pd.DataFrame({'x': [], 'y': []}))
+    writer.close()
+
+    assert list(pd.read_csv(tmp_path / 'table.csv').columns) == ['x', 'y']
@@ -0,0 +1,13 @@
+import pandas as pd
+from tables import write_table, read_table
+
+
+def test_partitioned_table_replaces_earlier_dataset(tmp_path):
+    path = str(tmp_path / 'distances.parquet')
+    write_table(pd.DataFrame({'Participant': ['a', 'b'], 'distance': [1.0, 2.0]}), path, partition_by=['Participant'])
+    write_table(pd.DataFrame({'Participant': ['c'], 'distance': [3.0]}), path, partition_by=['Participant'])
+    assert sorted(read_table(path)['Participant'].astype(str)) == ['c']
+
+    write_table(pd.DataFrame({'Participant': ['a'], 'distance': [4.0]}), path, partition_by=['Participant'], append=True)
+    table = read_table(path).sort_values('distance')
+    assert table['Participant'].astype(str).tolist() == ['c', 'a']
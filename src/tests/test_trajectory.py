@@ -0,0 +1,24 @@
+import os
+import warnings
+import pandas as pd
+from conftest import DATA_DIR
+from trajectory import build_board_history, check_final_boards
+from utils import compute_action_times
+
+PARTICIPANT = 'abda418378729d84a1a46fe1f54043bc'
+
+
+def test_drops_on_occupied_cells_swap_objects():
+    incremental = compute_action_times(pd.read_csv(os.path.join(DATA_DIR, 'demo-1-cleaned.csv')))
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        history = build_board_history(incremental)
+    assert len(check_final_boards(history, incremental)) == 0
+
+    # The sunflower is dropped on the rose's cell, so the rose moves to where the
+    # sunflower came from, (3, 3), which is where `Final` has it.
+    trial = history.trial_id(PARTICIPANT, 5)
+    displaced, coords = history.swaps(trial)
+    assert history.trial_objects(trial)[0] == 'I smelled the rose next to the house.'
+    assert displaced[2] == 0 and coords[2].tolist() == [3, 3]
+    assert history.board_at(trial, history.num_events(trial))[0].tolist() == [3, 3]
@@ -0,0 +1,17 @@
+import pandas as pd
+import pytest
+from utils import clean_string, parse_graphs
+
+MERGED = 'cat:(1%2C 1%2C 0-33%2C 0-13);dog:(0%2C 0%2C 2%2C 3)'
+CELLS = 'cat:(1%2C 1%2C 4%2C 5);dog:(0%2C 0%2C 2%2C 3)'
+
+
+def test_merged_canvas_graphs_are_rejected():
+    with pytest.raises(ValueError):
+        clean_string(MERGED)
+
+    with pytest.warns(UserWarning, match='merged canvases'):
+        rows, objects, coords, malformed = parse_graphs(pd.Series([MERGED, CELLS]))
+    assert rows.tolist() == [1, 1]
+    assert coords.tolist() == [[1, 1, 4, 5], [0, 0, 2, 3]]
+    assert malformed.tolist() == [MERGED]
@@ -0,0 +1,678 @@
+import warnings
+import numpy as np
+import pandas as pd
+from utils import sort_groups, parse_graphs
+from distances import compute_distances
+
+
+###############################################################################
+# Constants
+###############################################################################
+
+# Coordinate value of objects that are not on the board (aka still in, or
+# dropped back into, the reservoir).
+MISSING = np.iinfo(np.int16).min
+
+# A dropped object's location, e.g. `(19%2C 5)` or `(1%2C 1%2C 19%2C 5)` (or, on a
+# merged canvas, its ranges of cells, e.g. `(1%2C 1%2C 0-33%2C 0-13)`).
+LOCATION_PATTERN = r'^\((-?\d+), ?(-?\d+)(?:, ?(-?\d+)(?:-(\d+))?, ?(-?\d+)(?:-(\d+))?)?\)$'
+
+# Number of drops between stored board snapshots.
+SNAPSHOT_EVERY = 16
+
+# Number of drops replayed at a time by `BoardHistory.distance_updates` (rounded
+# to whole snapshot intervals).
+UPDATE_BLOCK_SIZE = 1024
+
+
+###############################################################################
+# Functions
+###############################################################################
+
+def fill_states(num_objects, event_objects, event_coords, initial=None, displaced=None, displaced_coords=None):
+    """
+    Build the board after every event from the moves alone (no board is copied per event).
+
+    Each object's coordinates after event k are those of its last move at or before k,
+    which is found for every (event, object) cell at once with a running maximum.
+
+    Parameters:
+    - num_objects (int): Number of objects on the board.
+    - event_objects (np.ndarray of int): Object moved by each event.
+    - event_coords (np.ndarray of int16): Where each object was moved to, with shape (num_events, d).
+    - initial (np.ndarray of int16): Board before the first event (defaults to every object missing).
+    - displaced (np.ndarray of int): Object swapped out by each event (-1 if none; see `find_swaps`).
+    - displaced_coords (np.ndarray of int16): Where the swapped object was moved to, with shape (num_events, d).
+
+    Returns:
+    - np.ndarray of int16: Boards, with shape (num_events + 1, num_objects, d); row 0 is the initial board.
+    """
+    num_events = len(event_objects)
+    dims = event_coords.shape[1] if event_coords.ndim == 2 else 2
+
+    if initial is None:
+        initial = np.full((num_objects, dims), MISSING, dtype=np.int16)
+
+    # Rows of `values` hold the initial coordinates, then the coordinates of each event
+    # (and of the object it swapped out, if any), in order.
+    values = np.full((num_objects + 2 * num_events, dims), MISSING, dtype=np.int16)
+    values[:num_objects] = initial
+    values[num_objects::2] = np.asarray(event_coords, dtype=np.int16).reshape(num_events, dims)
+
+    # Mark which row of `values` each event sets, then carry it forward in time.
+    latest = np.full((num_events + 1, num_objects), -1, dtype=np.int64)
+    latest[0] = np.arange(num_objects)
+    latest[np.arange(1, num_events + 1), event_objects] = num_objects + 2 * np.arange(num_events)
+
+    swaps = np.flatnonzero(displaced >= 0) if displaced is not None else []
+    if len(swaps):
+        values[num_objects + 2 * swaps + 1] = displaced_coords[swaps]
+        latest[swaps + 1, displaced[swaps]] = num_objects + 2 * swaps + 1
+
+    latest = np.maximum.accumulate(latest, axis=0)
+
+    return values[latest]
+
+
+def find_swaps(event_offsets, event_objects, event_coords):
+    """
+    Find the drops that land on a cell another object occupies. As in PC Ibex,
+    the two objects are then swapped: the other object moves to where the
+    dropped one came from (or back to the reservoir, if it came from there).
+
+    Trials where no drop lands on an occupied cell (nearly all of them) are
+    found at once: before the first swap of a trial, a cell is occupied by the
+    last object dropped on it, unless that object has moved since. Only the
+    other trials are replayed one drop at a time.
+
+    Parameters:
+    - event_offsets (np.ndarray of int): First drop of each trial (and the total at the end).
+    - event_objects (np.ndarray of int): Object moved by each drop (within its trial).
+    - event_coords (np.ndarray of int16): Where each object was dropped, with shape (num_events, d).
+
+    Returns:
+    - displaced (np.ndarray of int16): Object swapped out by each drop (-1 if none).
+    - displaced_coords (np.ndarray of int16): Where the swapped object was moved to, with shape (num_events, d).
+    """
+    num_events = len(event_objects)
+    displaced = np.full(num_events, -1, dtype=np.int16)
+    displaced_coords = np.full(event_coords.shape, MISSING, dtype=np.int16)
+    if num_events == 0:
+        return displaced, displaced_coords
+
+    event_trials = np.repeat(np.arange(len(event_offsets) - 1), np.diff(event_offsets))
+    positions = np.arange(num_events)
+    on_board = event_coords[:, 0] != MISSING
+
+    # The previous drop on the same cell of the same trial (sorting by position last
+    # keeps the drops in order within each cell).
+    keys = np.column_stack([event_trials, event_coords])
+    order = np.lexsort((positions, *keys.T[::-1]))
+    same_cell = (keys[order[1:]] == keys[order[:-1]]).all(axis=1)
+    previous = np.full(num_events, -1, dtype=np.int64)
+    previous[order[1:][same_cell]] = order[:-1][same_cell]
+
+    # The next drop of the same object.
+    order = np.lexsort((positions, event_objects, event_trials))
+    same_object = ((event_trials[order[1:]] == event_trials[order[:-1]])
+                   & (event_objects[order[1:]] == event_objects[order[:-1]]))
+    following = np.full(num_events, num_events, dtype=np.int64)
+    following[order[:-1][same_object]] = order[1:][same_object]
+
+    # A drop lands on an occupied cell if another object was dropped there last and has not moved since.
+    found = on_board & (previous >= 0)
+    found[found] = ((event_objects[previous[found]] != event_objects[found])
+                    & (following[previous[found]] > positions[found]))
+
+    for trial in np.unique(event_trials[found]):
+        board, cells = {}, {}
+        for k in range(event_offsets[trial], event_offsets[trial + 1]):
+            obj, target = event_objects[k], tuple(event_coords[k].tolist())
+            origin = board.pop(obj, None)
+            if origin is not None:
+                del cells[origin]
+            if not on_board[k]:
+                continue
+
+            other = cells.get(target)
+            if other is not None:
+                displaced[k] = other
+                if origin is None:
+                    del board[other]
+                else:
+                    displaced_coords[k] = origin
+                    board[other], cells[origin] = origin, other
+            board[obj], cells[target] = target, obj
+
+    return displaced, displaced_coords
+
+
+def fill_snapshots(object_offsets, event_offsets, event_objects, event_coords, snapshot_every=SNAPSHOT_EVERY,
+                   displaced=None, displaced_coords=None):
+    """
+    Build the board of every trial after every `snapshot_every`-th drop (0, k, 2k, ...),
+    without building the boards in between.
+
+    Each object's coordinates in a snapshot are those of its last move before it,
+    which is found for every (snapshot, object) cell at once by a binary search
+    in the moves, sorted by object, then time.
+
+    Parameters:
+    - object_offsets (np.ndarray of int): First object of each trial (and the total at the end).
+    - event_offsets (np.ndarray of int): First drop of each trial (and the total at the end).
+    - event_objects (np.ndarray of int): Object moved by each drop (within its trial).
+    - event_coords (np.ndarray of int16): Where each object was moved to, with shape (num_events, d).
+    - snapshot_every (int): Number of drops between snapshots.
+    - displaced (np.ndarray of int): Object swapped out by each drop (-1 if none; see `find_swaps`).
+    - displaced_coords (np.ndarray of int16): Where the swapped object was moved to, with shape (num_events, d).
+
+    Returns:
+    - snapshots (np.ndarray of int16): Boards of every trial, one after the other, with shape (rows, d).
+    - snapshot_offsets (np.ndarray of int): First row of each trial's snapshots (and the total at the end).
+    """
+    num_trials = len(object_offsets) - 1
+    num_events = np.diff(event_offsets)
+    num_objects = np.diff(object_offsets)
+
+    # Moves (drops, and the objects they swapped out) keyed (and sorted) by object
+    # (numbered across trials), then position in the trial.
+    event_trials = np.repeat(np.arange(num_trials), num_events)
+    positions = np.arange(len(event_objects)) - event_offsets[event_trials]
+    move_objects, move_coords = event_objects.astype(np.int64), event_coords
+    swaps = np.flatnonzero(displaced >= 0) if displaced is not None else []
+    if len(swaps):
+        event_trials = np.concatenate([event_trials, event_trials[swaps]])
+        positions = np.concatenate([positions, positions[swaps]])
+        move_objects = np.concatenate([move_objects, displaced[swaps].astype(np.int64)])
+        move_coords = np.concatenate([move_coords, displaced_coords[swaps]])
+
+    span = int(num_events.max(initial=0)) + 1
+    move_keys = (object_offsets[event_trials] + move_objects) * span + positions
+    order = np.argsort(move_keys, kind='stable')
+    move_keys = move_keys[order]
+
+    # One row per trial, snapshot, and object (a trial with k drops has k // snapshot_every + 1 snapshots).
+    num_rows = (num_events // snapshot_every + 1) * num_objects
+    snapshot_offsets = np.concatenate([[0], np.cumsum(num_rows)]).astype(np.int64)
+    row_trials = np.repeat(np.arange(num_trials), num_rows)
+    snapshot, row_objects = np.divmod(np.arange(snapshot_offsets[-1]) - snapshot_offsets[row_trials],
+                                      num_objects[row_trials])
+    row_objects += object_offsets[row_trials]
+
+    # The last move of each object before the snapshot (objects that have not moved yet are missing).
+    found = np.searchsorted(move_keys, row_objects * span + snapshot * snapshot_every) - 1
+    moved = found >= 0
+    moved[moved] = move_keys[found[moved]] // span == row_objects[moved]
+
+    snapshots = np.full((len(row_objects), event_coords.shape[1]), MISSING, dtype=np.int16)
+    snapshots[moved] = move_coords[order[found[moved]]]
+
+    return snapshots, snapshot_offsets
+
+
+def to_float(boards):
+    """Coordinates as floats, with NaN for objects that are not on the board."""
+    boards = boards.astype(np.float64)
+    boards[boards == MISSING] = np.nan
+    return boards
+
+
+class BoardHistory:
+    """
+    Board states of every trial of a study, replayed from its Drag/Drop events.
+
+    The history is stored compactly as the moves themselves (which object was
+    dropped where, as int16 coordinates) plus a snapshot of the board every
+    `snapshot_every` drops. The board after any drop is then a snapshot plus
+    a few moves, and the full (event x object x coordinate) tensor of a trial
+    can be rebuilt without copying the board for each event. A drop on an
+    occupied cell also moves the object it swaps out (see `find_swaps`).
+
+    Build it with `build_board_history`.
+    """
+
+    def __init__(self, trials, objects, object_offsets, event_offsets, event_objects,
+                 event_coords, event_index, snapshots, snapshot_offsets, snapshot_every,
+                 displaced, displaced_coords):
+        self.trials = trials
+        self.objects = objects
+        self.object_offsets = object_offsets
+        self.event_offsets = event_offsets
+        self.event_objects = event_objects
+        self.event_coords = event_coords
+        self.event_index = event_index
+        self.snapshots = snapshots
+        self.snapshot_offsets = snapshot_offsets
+        self.snapshot_every = snapshot_every
+        self.displaced = displaced
+        self.displaced_coords = displaced_coords
+        self.swap_offsets = np.searchsorted(np.flatnonzero(displaced >= 0), event_offsets)
+
+    @property
+    def num_trials(self):
+        return len(self.trials)
+
+    def trial_id(self, participant, item):
+        """Position of a trial (by participant and item) in `trials`."""
+        match = np.flatnonzero((self.trials.iloc[:, 0] == participant).to_numpy()
+                               & (self.trials.iloc[:, 1] == item).to_numpy())
+        if len(match) == 0:
+            raise KeyError(f'No trial for participant {participant} and item {item}')
+        return int(match[0])
+
+    def trial_objects(self, trial):
+        """Object labels of a trial, in the order used along the object axis."""
+        return self.objects[self.object_offsets[trial]:self.object_offsets[trial + 1]]
+
+    def num_events(self, trial):
+        """Number of drops in a trial."""
+        return int(self.event_offsets[trial + 1] - self.event_offsets[trial])
+
+    def moves(self, trial):
+        """
+        The drops of a trial, in order.
+
+        Returns:
+        - objects (np.ndarray of int16): Object moved by each drop.
+        - coords (np.ndarray of int16): Where the object was moved to (MISSING for the reservoir).
+        - event_index (np.ndarray of int): `EventIndex` of each drop (see `utils.compute_action_times`).
+        """
+        start, end = self.event_offsets[trial], self.event_offsets[trial + 1]
+        return self.event_objects[start:end], self.event_coords[start:end], self.event_index[start:end]
+
+    def num_swaps(self, trial):
+        """Number of drops in a trial that swap out another object."""
+        return int(self.swap_offsets[trial + 1] - self.swap_offsets[trial])
+
+    def swaps(self, trial):
+        """
+        The objects swapped out by the drops of a trial (see `find_swaps`).
+
+        Returns:
+        - displaced (np.ndarray of int16): Object swapped out by each drop (-1 if none).
+        - coords (np.ndarray of int16): Where it was moved to (MISSING for the reservoir).
+        """
+        start, end = self.event_offsets[trial], self.event_offsets[trial + 1]
+        return self.displaced[start:end], self.displaced_coords[start:end]
+
+    def board_at(self, trial, k):
+        """
+        The board of a trial after its first `k` drops (k=0 is the board before any drops).
+
+        Parameters:
+        - trial (int): Position of the trial in `trials`.
+        - k (int): Number of drops applied.
+
+        Returns:
+        - np.ndarray of int16: Coordinates of each object, with shape (num_objects, d).
+        """
+        if not 0 <= k <= self.num_events(trial):
+            raise IndexError(f'Trial {trial} only has {self.num_events(trial)} events.')
+
+        num_objects = self.object_offsets[trial + 1] - self.object_offsets[trial]
+        snapshot = k // self.snapshot_every
+        start = self.snapshot_offsets[trial] + snapshot * num_objects
+        board = self.snapshots[start:start + num_objects].copy()
+
+        # Apply the moves since the snapshot, swaps included (only the last move of each object counts;
+        # an object is never both dropped and swapped out by the same drop).
+        objects, coords, _ = self.moves(trial)
+        displaced, displaced_coords = self.swaps(trial)
+        drops = np.arange(snapshot * self.snapshot_every, k)
+        if self.num_swaps(trial):
+            swaps = drops[displaced[drops] >= 0]
+            order = np.argsort(np.concatenate([drops, swaps]), kind='stable')
+            objects = np.concatenate([objects[drops], displaced[swaps]])[order]
+            coords = np.concatenate([coords[drops], displaced_coords[swaps]])[order]
+        else:
+            objects, coords = objects[drops], coords[drops]
+        _, last = np.unique(objects[::-1], return_index=True)
+        last = len(objects) - 1 - last
+        board[objects[last]] = coords[last]
+
+        return board
+
+    def states(self, trial):
+        """
+        Every board of a trial, as an (event x object x coordinate) tensor.
+
+        Returns:
+        - np.ndarray of int16: Boards, with shape (num_events + 1, num_objects, d); row k is
+                               the board after the first k drops.
+        """
+        num_objects = self.object_offsets[trial + 1] - self.object_offsets[trial]
+        objects, coords, _ = self.moves(trial)
+        return fill_states(num_objects, objects, coords, None, *self.swaps(trial))
+
+    def final_boards(self):
+        """
+        The last board of every trial.
+
+        Returns:
+        - np.ndarray of int16: Coordinates of each object (numbered across trials, see
+                               `object_offsets`), with shape (num_objects, d).
+        """
+        event_trials = np.repeat(np.arange(self.num_trials), np.diff(self.event_offsets))
+        swaps = np.flatnonzero(self.displaced >= 0)
+
+        # Every move (drops, then swaps) as (object across trials, drop, coordinates), in time order.
+        objects = np.concatenate([self.object_offsets[event_trials] + self.event_objects,
+                                  self.object_offsets[event_trials[swaps]] + self.displaced[swaps]])
+        drops = np.concatenate([np.arange(len(event_trials)), swaps])
+        coords = np.concatenate([self.event_coords, self.displaced_coords[swaps]])
+        order = np.argsort(drops, kind='stable')
+        objects, coords = objects[order], coords[order]
+
+        boards = np.full((self.object_offsets[-1], self.event_coords.shape[1]), MISSING, dtype=np.int16)
+        _, last = np.unique(objects[::-1], return_index=True)
+        last = len(objects) - 1 - last
+        boards[objects[last]] = coords[last]
+
+        return boards
+
+    def distances_at(self, trial, k, metric='gradient', **params):
+        """
+        Distances between every pair of objects after the first `k` drops of a trial.
+
+        Parameters:
+        - trial (int): Position of the trial in `trials`.
+        - k (int): Number of drops applied.
+        - metric (str): Name of the distance metric (see `distances.METRICS`).
+        - params: Extra options for the metric.
+
+        Returns:
+        - np.ndarray of float: Condensed distances (in the order of `np.triu_indices`);
+                               NaN for objects that are not on the board.
+        """
+        board = to_float(self.board_at(trial, k))
+
+        idx1, idx2 = np.triu_indices(len(board), 1)
+        return compute_distances(board[idx1], board[idx2], metric=metric, **params)
+
+    def distance_updates(self, trial, metric='gradient', **params):
+        """
+        Distances between the object moved by each drop of a trial and every
+        other object, right after the drop. Only these N-1 distances (out of
+        N(N-1)/2) change with each drop, along with those of the object it
+        swaps out, if any (see `find_swaps`).
+
+        Parameters:
+        - trial (int): Position of the trial in `trials`.
+        - metric (str): Name of the distance metric (see `distances.METRICS`).
+        - params: Extra options for the metric.
+
+        Returns:
+        - updates (np.ndarray of float): Distances, with shape (num_events, num_objects); row k
+                                         holds the distances from the object moved by drop k (0 to itself).
+        - swap_updates (np.ndarray of float): The same for the object swapped out by each drop
+                                              that swaps one out (in order), with shape (num_swaps, num_objects).
+        """
+        objects, coords, _ = self.moves(trial)
+        displaced, displaced_coords = self.swaps(trial)
+        num_objects = self.object_offsets[trial + 1] - self.object_offsets[trial]
+        has_swaps = self.num_swaps(trial) > 0
+
+        # Replay a block of drops at a time, from the stored snapshot it starts on (so
+        # that long trials are never built in full).
+        block_size = max(UPDATE_BLOCK_SIZE // self.snapshot_every, 1) * self.snapshot_every
+        updates, swap_updates = [np.zeros((0, num_objects))], [np.zeros((0, num_objects))]
+        for start in range(0, len(objects), block_size):
+            end = min(start + block_size, len(objects))
+            swap_moves = (displaced[start:end], displaced_coords[start:end]) if has_swaps else ()
+            boards = to_float(fill_states(num_objects, objects[start:end], coords[start:end],
+                                          self.board_at(trial, start), *swap_moves)[1:])
+            moved = boards[np.arange(end - start), objects[start:end]]
+            updates.append(compute_distances(moved[:, None, :], boards, metric=metric, **params))
+
+            if has_swaps:
+                swaps = np.flatnonzero(displaced[start:end] >= 0)
+                swapped = boards[swaps, displaced[start:end][swaps]]
+                swap_updates.append(compute_distances(swapped[:, None, :], boards[swaps], metric=metric, **params))
+
+        return np.concatenate(updates), np.concatenate(swap_updates)
+
+    def distance_series(self, trial, metric='gradient', **params):
+        """
+        Distances between every pair of objects after each drop of a trial. The
+        distances are kept up to date one drop at a time, by only replacing the
+        pairs of the moved object (and of the object it swaps out, if any; see
+        `distance_updates`).
+
+        Parameters:
+        - trial (int): Position of the trial in `trials`.
+        - metric (str): Name of the distance metric (see `distances.METRICS`).
+        - params: Extra options for the metric.
+
+        Returns:
+        - np.ndarray of float: Condensed distances (in the order of `np.triu_indices`), with
+                               shape (num_events + 1, num_pairs); row k is after the first k drops.
+        """
+        objects, _, _ = self.moves(trial)
+        displaced, _ = self.swaps(trial)
+        updates, swap_updates = self.distance_updates(trial, metric=metric, **params)
+        num_objects = updates.shape[1] if len(updates) else len(self.trial_objects(trial))
+        swap_rows = np.cumsum(displaced >= 0) - 1
+
+        # Position of each pair in the condensed distances, and the pairs of each object.
+        idx1, idx2 = np.triu_indices(num_objects, 1)
+        pair_index = np.full((num_objects, num_objects), -1, dtype=np.int64)
+        pair_index[idx1, idx2] = pair_index[idx2, idx1] = np.arange(len(idx1))
+        others = [np.delete(np.arange(num_objects), obj) for obj in range(num_objects)]
+
+        series = np.full((len(objects) + 1, len(idx1)), np.nan)
+        for k, obj in enumerate(objects):
+            series[k + 1] = series[k]
+            series[k + 1, pair_index[obj, others[obj]]] = updates[k, others[obj]]
+            if displaced[k] >= 0:
+                other = displaced[k]
+                series[k + 1, pair_index[other, others[other]]] = swap_updates[swap_rows[k], others[other]]
+
+        return series
+
+
+def build_board_history(incremental, participant_col='Participant', item_col='Item',
+                        snapshot_every=SNAPSHOT_EVERY):
+    """
+    Replay the Drag/Drop events of a study into a `BoardHistory`.
+
+    Each `Drag` names the object that is picked up, and the following `Drop`
+    gives the cell it lands on (or the reservoir, where it is off the board).
+    Drags without a drop leave the board unchanged, and drops on an occupied
+    cell swap the two objects (see `find_swaps`). The last board of each trial
+    is checked against its `Final` graph, with a warning for trials where they
+    differ (see `check_final_boards`).
+
+    Parameters:
+    - incremental (pd.DataFrame): Output of `utils.compute_action_times`.
+    - participant_col (str): Name for column that defines participant.
+    - item_col (str): Name for column that defines item.
+    - snapshot_every (int): Number of drops between stored board snapshots.
+
+    Returns:
+    - BoardHistory: Board states of every trial.
+    """
+    group_cols = [participant_col, item_col]
+
+    # Keep the drag-and-drop events, in order within each trial.
+    events = incremental[(incremental['PennElementType'] == 'DragDrop')
+                         & incremental['Parameter'].isin(['Drag', 'Drop'])]
+    events = events.sort_values(by=group_cols + ['EventIndex'], kind='stable')
+    events, starts, sizes = sort_groups(events, group_cols)
+    trial_ids = np.repeat(np.arange(len(starts)), sizes)
+
+    # The object being dropped is the one named by the latest drag in the same trial
+    # (with commas fixed, as in `utils.clean_string`).
+    is_drag = (events['Parameter'] == 'Drag').to_numpy()
+    labels = events['Value'].astype('string').str.replace('%2C', ',', regex=False)
+    held = labels.where(is_drag).groupby(trial_ids).ffill()
+    is_drop = (events['Parameter'] == 'Drop').to_numpy() & held.notna().to_numpy()
+
+    drops = events[is_drop]
+    drop_trials = trial_ids[is_drop]
+
+    # Number each trial's objects in order of their first drop.
+    codes, uniques = pd.factorize(pd.MultiIndex.from_arrays([drop_trials, held[is_drop].to_numpy()]))
+    unique_trials = uniques.get_level_values(0).to_numpy()
+    object_offsets = np.searchsorted(unique_trials, np.arange(len(starts) + 1))
+    event_objects = (codes - object_offsets[drop_trials]).astype(np.int16)
+    objects = uniques.get_level_values(1).to_numpy(dtype=object)
+
+    # Parse the drop locations (anything else, like the reservoir, is off the board).
+    parts = drops['Value'].astype('string').str.replace('%2C', ',', regex=False).str.extract(LOCATION_PATTERN)
+    dims = 4 if parts[2].notna().any() else 2
+    on_board = parts[0].notna().to_numpy()
+
+    # Drops on merged canvases only record the canvas, not the cell (see `utils.clean_string`).
+    merged = parts[3].notna() | parts[5].notna()
+    if merged.any():
+        raise ValueError(f'{merged.sum()} drop(s) were recorded on merged canvases (e.g., {drops["Value"][merged].iloc[0]}): '
+                         f'their cells are unknown, so the boards cannot be reconstructed.')
+
+    event_coords = np.full((len(drops), dims), MISSING, dtype=np.int16)
+    event_coords[on_board] = parts[[0, 1, 2, 4][:dims]][on_board].astype(np.int16).to_numpy()
+
+    event_offsets = np.searchsorted(drop_trials, np.arange(len(starts) + 1))
+    displaced, displaced_coords = find_swaps(event_offsets, event_objects, event_coords)
+
+    # Store a snapshot of the board every `snapshot_every` drops.
+    snapshots, snapshot_offsets = fill_snapshots(object_offsets, event_offsets, event_objects,
+                                                 event_coords, snapshot_every, displaced, displaced_coords)
+    trials = events[group_cols].iloc[starts].reset_index(drop=True)
+
+    history = BoardHistory(trials, objects, object_offsets, event_offsets, event_objects,
+                           event_coords, drops['EventIndex'].to_numpy(), snapshots,
+                           snapshot_offsets, snapshot_every, displaced, displaced_coords)
+
+    mismatches = check_final_boards(history, incremental, participant_col, item_col)
+    if len(mismatches):
+        num_trials = len(mismatches[group_cols].drop_duplicates())
+        warnings.warn(f'{num_trials} trial(s) end on a board that differs from their Final graph; '
+                      f'see `check_final_boards`.')
+
+    return history
+
+
+def check_final_boards(history, incremental, participant_col='Participant', item_col='Item'):
+    """
+    Compare the last board of every trial with its `Final` graph (the positions
+    PC Ibex recorded at the end of the trial).
+
+    Parameters:
+    - history (BoardHistory): Output of `build_board_history`.
+    - incremental (pd.DataFrame): Output of `utils.compute_action_times` (with the `Final` rows).
+    - participant_col (str): Name for column that defines participant.
+    - item_col (str): Name for column that defines item.
+
+    Returns:
+    - pd.DataFrame: One row per object whose replayed location differs from its `Final`
+                    one, with the trial keys, `object`, and both locations (`replayed` and
+                    `final`, as tuples; None when off the board).
+    """
+    group_cols = [participant_col, item_col]
+    columns = group_cols + ['object', 'replayed', 'final']
+
+    final = incremental[(incremental['PennElementType'] == 'DragDrop') & (incremental['Parameter'] == 'Final')]
+    final = final.dropna(subset=group_cols)
+    with warnings.catch_warnings():
+        # Graphs that cannot be parsed are not the replay's concern here.
+        warnings.simplefilter('ignore')
+        rows, objects, coords, _ = parse_graphs(final['Value'])
+
+    # Final positions, and replayed ones, keyed by trial and object.
+    recorded = final[group_cols].iloc[rows].reset_index(drop=True)
+    recorded['object'] = objects
+    recorded['final'] = list(map(tuple, coords.tolist()))
+
+    trial_ids = np.repeat(np.arange(history.num_trials), np.diff(history.object_offsets))
+    replayed = history.trials.iloc[trial_ids].reset_index(drop=True)
+    replayed.columns = group_cols
+    replayed['object'] = history.objects
+    replayed['replayed'] = [None if row[0] == MISSING else tuple(row) for row in history.final_boards().tolist()]
+
+    # Only trials with a `Final` graph are checked (objects missing from it are off the board).
+    replayed = replayed.merge(recorded[group_cols].drop_duplicates(), on=group_cols)
+    merged = replayed.merge(recorded, on=group_cols + ['object'], how='outer')
+    for col in ['replayed', 'final']:
+        merged[col] = merged[col].astype(object).where(merged[col].notna(), None)
+
+    differ = [a != b for a, b in zip(merged['replayed'].tolist(), merged['final'].tolist())]
+    return merged.loc[differ, columns].reset_index(drop=True)
+
+
+def compute_trajectory_distances(history, metric='gradient', metric_params=None, changes_only=True):
+    """
+    Pairwise distances along the drops of every trial (aka `compute_pairwise_distances`
+    after every event, rather than only on the `Final` positions).
+
+    Each drop only changes the distances of the moved object (and of the object
+    it swaps out, if any), so these are the only distances computed for each
+    event. With `changes_only`, the output only holds those changed pairs (N-1
+    per drop, or 2N-3 with a swap); otherwise, every pair is repeated at every drop.
+
+    Parameters:
+    - history (BoardHistory): Output of `build_board_history`.
+    - metric (str): Name of the distance metric (see `distances.METRICS`).
+    - metric_params (dict): Extra options for the metric.
+    - changes_only (bool): Whether to only keep the pairs that changed with each drop.
+
+    Returns:
+    - pd.DataFrame: One row per trial, drop (`Step`, counting from 1, and its `EventIndex`),
+                    and pair, with the `distance` right after the drop.
+    """
+    metric_params = metric_params or {}
+    trial_col, step_col, event_col, obj1_col, obj2_col, dist_col = [], [], [], [], [], []
+
+    for trial in range(history.num_trials):
+        objects, _, event_index = history.moves(trial)
+        if len(objects) == 0:
+            continue
+
+        num_objects = len(history.trial_objects(trial))
+        idx1, idx2 = np.triu_indices(num_objects, 1)
+
+        if changes_only:
+            # The moved object against every other object, ordered as in `np.triu_indices`.
+            updates, swap_updates = history.distance_updates(trial, metric=metric, **metric_params)
+            steps, others = np.nonzero(np.arange(num_objects) != objects[:, None].astype(np.int64))
+            moved = objects[steps]
+            distances = updates[steps, others]
+
+            # The object each swap moved out, against every object but the moved one.
+            if history.num_swaps(trial):
+                displaced, _ = history.swaps(trial)
+                swaps = np.flatnonzero(displaced >= 0)
+                swap_rows, swap_others = np.nonzero((np.arange(num_objects) != displaced[swaps, None])
+                                                    & (np.arange(num_objects) != objects[swaps, None]))
+                order = np.argsort(np.concatenate([steps, swaps[swap_rows]]), kind='stable')
+                steps = np.concatenate([steps, swaps[swap_rows]])[order]
+                moved = np.concatenate([moved, displaced[swaps][swap_rows]])[order]
+                others = np.concatenate([others, swap_others])[order]
+                distances = np.concatenate([distances, swap_updates[swap_rows, swap_others]])[order]
+
+            first, second = np.minimum(moved, others), np.maximum(moved, others)
+        else:
+            series = history.distance_series(trial, metric=metric, **metric_params)[1:]
+            steps = np.repeat(np.arange(len(objects)), len(idx1))
+            first, second = np.tile(idx1, len(objects)), np.tile(idx2, len(objects))
+            distances = series.ravel()
+
+        labels = history.trial_objects(trial)
+        trial_col.append(np.full(len(steps), trial))
+        step_col.append(steps + 1)
+        event_col.append(event_index[steps])
+        obj1_col.append(labels[first])
+        obj2_col.append(labels[second])
+        dist_col.append(distances)
+
+    if not trial_col:
+        return pd.DataFrame(columns=list(history.trials.columns) + ['Step', 'EventIndex', 'object', 'object_2', 'distance'])
+
+    trials = np.concatenate(trial_col)
+    output = history.trials.iloc[trials].reset_index(drop=True)
+    output['Step'] = np.concatenate(step_col)
+    output['EventIndex'] = np.concatenate(event_col)
+    output['object'] = np.concatenate(obj1_col)
+    output['object_2'] = np.concatenate(obj2_col)
+    output['distance'] = np.concatenate(dist_col)
+
+    return output
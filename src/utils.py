@@ -3,6 +3,17 @@ import pandas as pd
 import re 
 import math
 import ast 
+import warnings
+from distances import compute_distances
+from gris.blocks import has_cell_ranges
+from profiling import profiled, note
+
+
+# Names of the integer coordinate columns, for (x_cat, y_cat, x, y) coordinates.
+COORDINATE_COLS = ['x_cat', 'y_cat', 'x', 'y']
+
+# Number of trials measured at a time by `compute_distance_matrices`.
+MATRIX_BLOCK_SIZE = 1024
 
 
 #########################
@@ -19,64 +30,268 @@ def pairwise_distance(coordinate1, coordinate2, categorical=False):
 
     Returns:
     - float: the Euclidean distance between coordinate1 and coordinate2.
+
+    (See `distances.py` for other metrics, and for computing many distances at once.)
     """
 
-    # Counting only the first two numbers (aka differences in categories)
+    # Counting only the last two numbers (aka positional differences only)
     if categorical == False:
         return math.dist([coordinate1[-2], coordinate1[-1]], 
                         [coordinate2[-2], coordinate2[-1]]) 
     
-    # Counting only the last two numbers (aka positional differences only)
-    return math.dist([coordinate1[0], coordinate1[1],
-                     [coordinate2[0], coordinate2[1]]])
+    # Counting only the first two numbers (aka differences in categories)
+    return math.dist([coordinate1[0], coordinate1[1]],
+                     [coordinate2[0], coordinate2[1]])
 
 
-def compute_action_times(df, participant_col="MD5.hash.of.participant.s.IP.address",
-                         item_col="Order.number.of.item"):
+def group_bounds(df, group_cols):
     """
-    For each trial, compute:
-    - the order of events within a trial                (EventIndex)
-    - how long it took to complete the current event    (TimeSinceLastEvent)
-    - how long the full trial took for this participant (TotalItemTime)
+    Find where each group starts (and how long it is) in a dataframe
+    that has already been sorted by its group columns.
 
-    Note that this function has been optimized with pandas,
-    at the cost of some readability. I have added comments where appropriate.
+    Parameters:
+    - df (pd.DataFrame): Input dataframe, sorted by `group_cols`.
+    - group_cols (list of str): Columns that delineate groups.
+
+    Returns:
+    - starts (np.ndarray of int): Row position of the first row of each group.
+    - sizes (np.ndarray of int): Number of rows in each group.
+    """
+    num_rows = len(df)
+    if num_rows == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    # A new group begins wherever any of the group columns changes.
+    new_group = np.zeros(num_rows, dtype=bool)
+    new_group[0] = True
+    for col in group_cols:
+        values = df[col].to_numpy()
+        new_group[1:] |= values[1:] != values[:-1]
+
+    starts = np.flatnonzero(new_group)
+    sizes = np.diff(np.append(starts, num_rows))
+
+    return starts, sizes
+
+
+def sort_groups(df, group_cols):
+    """
+    Sort a dataframe (once) so that each group is a contiguous block of rows, and find
+    those blocks. Rows without a group are dropped, as they would be in a groupby.
 
     Parameters:
     - df (pd.DataFrame): Input dataframe.
-    - participant_col (str): Name for column that defines participant. 
-    - item_col (str): Name for column that defines item.
+    - group_cols (list of str): Columns that delineate groups.
 
     Returns:
-    - df (pd.DataFrame): Output dataframe with the three statistics mentioned above:
-                         (EventIndex, TimeSinceLastEvent, TotalItemTime)
+    - df (pd.DataFrame): Sorted dataframe (with a fresh index).
+    - starts (np.ndarray of int): Row position of the first row of each group.
+    - sizes (np.ndarray of int): Number of rows in each group.
     """
-        
-    # Required columns.
-    required_cols = [
-        "MD5.hash.of.participant.s.IP.address", 
-        "Order.number.of.item", 
-        "EventTime"
-    ]
+    df = df.dropna(subset=group_cols)
+    df = df.sort_values(by=group_cols, kind='stable').reset_index(drop=True)
+    starts, sizes = group_bounds(df, group_cols)
 
-    # Check for required columns.
-    for col in required_cols:
-        if col not in df.columns:
-            raise ValueError(f"Missing required column: {col}")
+    return df, starts, sizes
+
+
+def group_pair_indices(starts, sizes):
+    """
+    Build the (i < j) pairs of rows within every group, for all groups at once.
+
+    The upper-triangle indices are only computed once per distinct group size
+    (in GRIS, nearly every trial has the same number of objects), and are then
+    shifted by each group's starting row.
+
+    Parameters:
+    - starts (np.ndarray of int): Row position of the first row of each group.
+    - sizes (np.ndarray of int): Number of rows in each group.
+
+    Returns:
+    - idx1 (np.ndarray of int): Row position of the first member of each pair.
+    - idx2 (np.ndarray of int): Row position of the second member of each pair.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    sizes = np.asarray(sizes, dtype=np.int64)
+
+    # Number of pairs in each group, and where each group's pairs begin in the output.
+    num_pairs = sizes * (sizes - 1) // 2
+    pair_starts = np.cumsum(num_pairs) - num_pairs
+
+    idx1 = np.empty(num_pairs.sum(), dtype=np.int64)
+    idx2 = np.empty(num_pairs.sum(), dtype=np.int64)
+
+    for size in np.unique(sizes[sizes > 1]):
+        in_size = sizes == size
+        i, j = np.triu_indices(size, 1)
+
+        # Output positions (and row positions) for every group of this size.
+        positions = (pair_starts[in_size][:, None] + np.arange(len(i))).ravel()
+        offsets = starts[in_size][:, None]
+        idx1[positions] = (offsets + i).ravel()
+        idx2[positions] = (offsets + j).ravel()
+
+    return idx1, idx2
+
+
+def factorize_groups(df, group_cols):
+    """
+    Give every row a single integer code for its group, where the codes are in
+    the same order as sorting by `group_cols` (missing values sort last).
+
+    Parameters:
+    - df (pd.DataFrame): Input dataframe.
+    - group_cols (list of str): Columns that delineate groups.
+
+    Returns:
+    - keys (np.ndarray of int): Group code of each row.
+    - valid (np.ndarray of bool): Whether the row has a group (aka none of its group columns is missing).
+    """
+    keys = np.zeros(len(df), dtype=np.int64)
+    valid = np.ones(len(df), dtype=bool)
+
+    for col in group_cols:
+        codes, uniques = pd.factorize(df[col], sort=True)
+        missing = codes < 0
+        valid &= ~missing
+        keys = keys * (len(uniques) + 1) + np.where(missing, len(uniques), codes)
+
+    return keys, valid
+
+
+def last_where(mask, starts):
+    """
+    For every row, the position of the latest row at or before it (in the same
+    segment) where `mask` is True, or -1 if there is none.
 
-    # Sort data.
-    df = df.sort_values(by=[participant_col, item_col, "EventTime"]).reset_index(drop=True)
+    Parameters:
+    - mask (np.ndarray of bool): Rows to look for.
+    - starts (np.ndarray of int): Position of the first row of each row's segment.
+
+    Returns:
+    - np.ndarray of int: Position of the latest matching row.
+    """
+    latest = np.maximum.accumulate(np.where(mask, np.arange(len(mask)), -1)) if len(mask) else np.zeros(0, dtype=np.int64)
+    return np.where(latest >= starts, latest, -1)
 
-    # Compute time since last event.
-    df['TimeSinceLastEvent'] = df.groupby([participant_col, item_col])['EventTime'].diff().fillna(0)
 
-    # Compute total item time for each group.
-    first_event = df.groupby([participant_col, item_col])['EventTime'].transform('first')
-    last_event = df.groupby([participant_col, item_col])['EventTime'].transform('last')
-    df['TotalItemTime'] = last_event - first_event
+def action_time_stats(keys, valid, event_time, is_drag=None, is_drop=None):
+    """
+    The statistics of `compute_action_times`, computed on plain arrays (one
+    entry per row): the rows are sorted once by trial, then time, and every
+    statistic is computed on the sorted arrays, one trial (aka segment) after
+    another.
+
+    Parameters:
+    - keys (np.ndarray of int): Trial code of each row, in sorted order (see `factorize_groups`).
+    - valid (np.ndarray of bool): Whether each row has a trial.
+    - event_time (np.ndarray): Time of each row.
+    - is_drag (np.ndarray of bool): Whether each row is a `Drag` (only for the event statistics).
+    - is_drop (np.ndarray of bool): Whether each row is a `Drop` (only for the event statistics).
 
-    # Create EventIndex within each group.
-    df['EventIndex'] = df.groupby([participant_col, item_col]).cumcount()
+    Returns:
+    - order (np.ndarray of int): Position of each sorted row in the input.
+    - stats (dict): Each statistic (np.ndarray), in sorted order. DragDuration and
+                    IdleTime are only included if `is_drag` and `is_drop` are given.
+    """
+
+    # Sort once by trial, then time (the same order as sorting by the columns).
+    order = np.lexsort((event_time, keys))
+
+    keys, valid, event_time = keys[order], valid[order], event_time[order]
+    num_rows = len(order)
+    positions = np.arange(num_rows)
+
+    # Where each trial (aka segment) starts and ends.
+    new_trial = np.ones(num_rows, dtype=bool)
+    new_trial[1:] = keys[1:] != keys[:-1]
+    starts = np.flatnonzero(new_trial)
+    note(groups=len(starts))
+    ends = np.append(starts[1:], num_rows)
+    row_starts = np.repeat(starts, ends - starts)
+
+    # Compute time since last event (0 at the start of each trial).
+    time_since = np.zeros(num_rows, dtype=np.float64)
+    time_since[1:] = event_time[1:] - event_time[:-1]
+    time_since[new_trial | ~valid] = 0
+    time_since[np.isnan(time_since)] = 0
+
+    # Compute total item time for each trial (from its first to last recorded time).
+    has_time = ~pd.isna(event_time)
+    first_event = np.minimum.reduceat(np.where(has_time, positions, num_rows), starts) if num_rows else starts
+    last_event = np.maximum.reduceat(np.where(has_time, positions, -1), starts) if num_rows else starts
+    total_time = event_time[np.clip(last_event, 0, None)] - event_time[np.clip(first_event, None, max(num_rows - 1, 0))]
+    total_time = np.repeat(total_time, ends - starts)
+    timeless = np.repeat(last_event < 0, ends - starts)
+
+    # Create EventIndex within each trial.
+    event_index = positions - row_starts
+
+    # Rows without a trial (or trials without times) have no statistics, as in a groupby.
+    if (~valid | timeless).any():
+        total_time = total_time.astype(np.float64)
+        total_time[~valid | timeless] = np.nan
+    if not valid.all():
+        event_index = event_index.astype(np.float64)
+        event_index[~valid] = np.nan
+
+    stats = {
+        "EventIndex": event_index,
+        "TimeSinceLastEvent": time_since,
+        "TotalItemTime": total_time,
+    }
+
+    if is_drag is not None and is_drop is not None:
+        is_drag = is_drag[order] & valid
+        is_drop = is_drop[order] & valid
+
+        # Time since the latest drag, for each drop.
+        last_drag = last_where(is_drag, row_starts)
+        drag_duration = np.full(num_rows, np.nan)
+        dropped = is_drop & (last_drag >= 0)
+        drag_duration[dropped] = event_time[dropped] - event_time[last_drag[dropped]]
+
+        # Time since the latest drop (or the first event), for each drag.
+        last_drop = last_where(is_drop, row_starts)
+        last_drop = np.where(last_drop >= 0, last_drop, row_starts)
+        idle_time = np.full(num_rows, np.nan)
+        idle_time[is_drag] = event_time[is_drag] - event_time[last_drop[is_drag]]
+
+        stats["DragDuration"] = drag_duration
+        stats["IdleTime"] = idle_time
+
+    return order, stats
+
+
+def add_action_times(df, order, stats, participant_col="MD5.hash.of.participant.s.IP.address",
+                     item_col="Order.number.of.item", inplace=False):
+    """
+    Add the statistics of `action_time_stats` to the input of `compute_action_times`.
+
+    Parameters:
+    - df (pd.DataFrame): Input dataframe.
+    - order (np.ndarray of int): Position of each sorted row in `df`.
+    - stats (dict): Each statistic (np.ndarray), in sorted order.
+    - participant_col (str): Name for column that defines participant.
+    - item_col (str): Name for column that defines item.
+    - inplace (bool): Add the statistics to `df` itself (see `compute_action_times`).
+
+    Returns:
+    - df (pd.DataFrame): Output of `compute_action_times`.
+    """
+
+    # Put the statistics back in the original row order, without sorting the data.
+    if inplace:
+        for col, values in stats.items():
+            unsorted = np.empty_like(values)
+            unsorted[order] = values
+            df[col] = unsorted
+        return df
+
+    # Sort data (a single reindex), and add the statistics.
+    df = df.take(order).reset_index(drop=True)
+    for col, values in stats.items():
+        df[col] = values
 
     # Rename columns to match output format.
     df = df.rename(columns={
@@ -92,6 +307,65 @@ def compute_action_times(df, participant_col="MD5.hash.of.participant.s.IP.addre
 
     return df[reordered_cols]
 
+
+def check_action_time_cols(df, participant_col, item_col, event_stats=False):
+    """Raise a ValueError if `df` lacks a column that `compute_action_times` needs."""
+    required_cols = [participant_col, item_col, "EventTime"]
+    if event_stats:
+        required_cols.append("Parameter")
+
+    for col in required_cols:
+        if col not in df.columns:
+            raise ValueError(f"Missing required column: {col}")
+
+
+@profiled
+def compute_action_times(df, participant_col="MD5.hash.of.participant.s.IP.address",
+                         item_col="Order.number.of.item", inplace=False, event_stats=False):
+    """
+    For each trial, compute:
+    - the order of events within a trial                (EventIndex)
+    - how long it took to complete the current event    (TimeSinceLastEvent)
+    - how long the full trial took for this participant (TotalItemTime)
+
+    Note that this function has been optimized with numpy, at the cost of
+    some readability: the trials are factorized and sorted once, and all of
+    the statistics are then computed on the sorted arrays, one trial
+    (aka segment) after another (see `action_time_stats`).
+
+    With `event_stats`, the following are also computed (in the same pass):
+    - how long an object was held before it was dropped (DragDuration, on `Drop` rows)
+    - how long since the previous drop (or the start of the trial)
+      before an object was picked up                    (IdleTime, on `Drag` rows)
+
+    Parameters:
+    - df (pd.DataFrame): Input dataframe.
+    - participant_col (str): Name for column that defines participant. 
+    - item_col (str): Name for column that defines item.
+    - inplace (bool): Add the statistics to `df` itself, keeping its row order and
+                      column names (rather than returning a sorted and renamed copy).
+    - event_stats (bool): Also compute DragDuration and IdleTime (needs a `Parameter` column).
+
+    Returns:
+    - df (pd.DataFrame): Output dataframe with the three statistics mentioned above:
+                         (EventIndex, TimeSinceLastEvent, TotalItemTime)
+    """
+    check_action_time_cols(df, participant_col, item_col, event_stats)
+
+    keys, valid = factorize_groups(df, [participant_col, item_col])
+    event_time = df["EventTime"].to_numpy()
+
+    is_drag = is_drop = None
+    if event_stats:
+        parameter = df["Parameter"].to_numpy()
+        is_drag, is_drop = parameter == "Drag", parameter == "Drop"
+
+    order, stats = action_time_stats(keys, valid, event_time, is_drag, is_drop)
+
+    return add_action_times(df, order, stats, participant_col, item_col, inplace)
+
+
+@profiled
 def z_score(df, groupby_col = ['Participant'], measure_col='distance'):
     """
     Z-score your measurements by group(s).
@@ -102,10 +376,136 @@ def z_score(df, groupby_col = ['Participant'], measure_col='distance'):
     - measure_col (str): Name of column with measure that is to be z-scored.
 
     Returns:
-    - df (pd.DataFrame): Output dataframe with the three statistics mentioned above:
-                         (EventIndex, TimeSinceLastEvent, TotalItemTime)
+    - pd.Series: The z-scored measure (NaN for groups with a single measurement).
+
+    (See `z_scores` to z-score several measures by several groupings at once.)
     """
-    return df.groupby(groupby_col)[measure_col].transform(lambda x: (x - x.mean()) / x.std())
+    grouped = df.groupby(groupby_col)[measure_col]
+    return (df[measure_col] - grouped.transform('mean')) / grouped.transform('std')
+
+
+def z_score_name(measure_col, groupby_col):
+    """Name of the z-scored column, e.g. `distance_z_Participant_item`."""
+    return f"{measure_col}_z_{'_'.join(groupby_col)}"
+
+
+class ZScoreStats:
+    """
+    Running count, mean, and sum of squared deviations of some measures, for
+    several groupings at once (e.g., by participant and by participant x item).
+
+    Chunks are added with `update`, and each chunk's statistics are merged into
+    the running ones with Welford's (parallel) update, so a table that does not
+    fit in memory can be z-scored in two passes: `update` on every chunk, then
+    `transform` on every chunk.
+    """
+
+    def __init__(self, groupings=[['Participant']], measure_cols=['distance']):
+        self.groupings = [list(groupby_col) for groupby_col in groupings]
+        self.measure_cols = list(measure_cols)
+        self.stats = [None] * len(self.groupings)
+
+    def update(self, df):
+        """
+        Add a chunk of measurements to the running statistics.
+
+        Parameters:
+        - df (pd.DataFrame): Chunk with the grouping and measure columns.
+
+        Returns:
+        - ZScoreStats: self (so that calls can be chained).
+        """
+        for g, groupby_col in enumerate(self.groupings):
+            grouped = df.groupby(groupby_col, observed=True, sort=False)[self.measure_cols]
+            count = grouped.count()
+            mean = grouped.mean()
+            m2 = grouped.var(ddof=0) * count
+
+            # Keep every index a MultiIndex, so that rows can be looked up the same way.
+            if not isinstance(count.index, pd.MultiIndex):
+                index = pd.MultiIndex.from_arrays([count.index])
+                count.index = mean.index = m2.index = index
+
+            if self.stats[g] is None:
+                self.stats[g] = (count, mean, m2)
+                continue
+
+            # Merge with the running statistics (Chan et al.'s version of Welford's update).
+            old_count, old_mean, old_m2 = self.stats[g]
+            index = old_count.index.union(count.index)
+            n_a, n_b = old_count.reindex(index, fill_value=0), count.reindex(index, fill_value=0)
+            mean_a, mean_b = old_mean.reindex(index).fillna(0), mean.reindex(index).fillna(0)
+            m2_a, m2_b = old_m2.reindex(index).fillna(0), m2.reindex(index).fillna(0)
+
+            n = n_a + n_b
+            delta = mean_b - mean_a
+            weight = (n_b / n).fillna(0)
+            new_mean = mean_a + delta * weight
+            new_m2 = m2_a + m2_b + delta ** 2 * n_a * weight
+
+            self.stats[g] = (n, new_mean.where(n > 0), new_m2.where(n > 0))
+
+        return self
+
+    def mean_std(self, grouping=0):
+        """
+        Mean and (sample) standard deviation of every group of a grouping.
+
+        Parameters:
+        - grouping (int): Position of the grouping in `groupings`.
+
+        Returns:
+        - mean (pd.DataFrame): Mean of each measure, by group.
+        - std (pd.DataFrame): Standard deviation of each measure, by group.
+        """
+        count, mean, m2 = self.stats[grouping]
+        return mean, np.sqrt(m2 / (count - 1).where(count > 1))
+
+    def transform(self, df):
+        """
+        Z-score a chunk of measurements with the running statistics.
+
+        Parameters:
+        - df (pd.DataFrame): Chunk with the grouping and measure columns.
+
+        Returns:
+        - pd.DataFrame: One z-scored column per grouping and measure (see `z_score_name`).
+        """
+        output = {}
+
+        for g, groupby_col in enumerate(self.groupings):
+            mean, std = self.mean_std(g)
+
+            # Row of each measurement's group in the statistics (-1 if it has none).
+            rows = mean.index.get_indexer(pd.MultiIndex.from_frame(df[groupby_col]))
+            found = rows >= 0
+
+            for col in self.measure_cols:
+                group_mean = np.where(found, mean[col].to_numpy()[rows], np.nan)
+                group_std = np.where(found, std[col].to_numpy()[rows], np.nan)
+                output[z_score_name(col, groupby_col)] = (df[col].to_numpy(dtype=np.float64) - group_mean) / group_std
+
+        return pd.DataFrame(output, index=df.index)
+
+
+@profiled
+def z_scores(df, groupings=[['Participant']], measure_cols=['distance']):
+    """
+    Z-score several measures by several groupings at once, e.g. distances by
+    participant and by participant x item. Each grouping is only factorized
+    once for all of the measures.
+
+    (For tables that do not fit in memory, use `ZScoreStats` chunk by chunk.)
+
+    Parameters:
+    - df (pd.DataFrame): Input dataframe.
+    - groupings (list of list of str): Columns that delineate the groups of each grouping.
+    - measure_cols (list of str): Names of the columns with measures that are to be z-scored.
+
+    Returns:
+    - pd.DataFrame: One z-scored column per grouping and measure (see `z_score_name`).
+    """
+    return ZScoreStats(groupings, measure_cols).update(df).transform(df)
 
 
 
@@ -137,6 +537,11 @@ def clean_string(line):
     for obj_location in obj_and_location:
         obj, location = obj_location.split(':')
 
+        # Drops on merged canvases only record the canvas, not the cell
+        if has_cell_ranges(location):
+            raise ValueError(f'{obj} was dropped on a merged canvas {location}: its cell is unknown '
+                             f'(results recorded on merged canvases cannot be analyzed per cell).')
+
         # Get the location and evaluate it as a tuple (not a string)
         location = ast.literal_eval(location)
 
@@ -146,20 +551,114 @@ def clean_string(line):
     return obj_list
 
 
-def expand_graphs(df):
+# An object and its location, e.g. `dr. pepper:(1, 1, 31, 2)`, or the ranges of
+# cells of a merged canvas, e.g. `dr. pepper:(1, 1, 0-33, 0-13)`, so that those
+# can be reported (named groups let Arrow-backed strings extract them without a Python loop).
+OBJECT_PATTERN = re.compile(r'^(?P<object>[^;]*?):\((?P<c1>-?\d+), ?(?P<c2>-?\d+)'
+                            r'(?:, ?(?P<c3>-?\d+)(?:-(?P<e3>\d+))?, ?(?P<c4>-?\d+)(?:-(?P<e4>\d+))?)?\)$')
+
+
+def graph_strings(values):
+    """Graphs as Arrow-backed strings (whose string operations are vectorized), or as pandas strings without pyarrow."""
+    values = values.astype('string')
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return values
+    return values.astype(pd.ArrowDtype(pa.string()))
+
+
+def parse_graphs(values):
+    """
+    Bulk version of `clean_string`: parse a whole column of `Final` graphs at once.
+
+    Rather than building a list of tuples for every trial, the graphs are
+    flattened into arrays (one entry per object) with vectorized pandas string
+    operations: every graph is split into its objects, and each object is
+    matched against `OBJECT_PATTERN` (instead of `ast.literal_eval`). With
+    pyarrow installed, these run on Arrow strings, without a Python loop over
+    rows. Trials that cannot be parsed, or that were recorded on merged
+    canvases (whose cells are unknown, see `clean_string`), are reported (and
+    left out of the arrays) instead of raising an error.
+
+    Parameters:
+    - values (pd.Series of str): Values from the `Final` rows (e.g., the `Value` column).
+
+    Returns:
+    - rows (np.ndarray of int): Position (within `values`) of the trial each object belongs to.
+    - objects (np.ndarray of str): Object labels.
+    - coords (np.ndarray of int): Object locations, with shape (num_objects, 2) or (num_objects, 4).
+    - malformed (pd.Series): Values that could not be parsed, with their original index.
+    """
+    values = pd.Series(values)
+
+    # One object-location pair per row, indexed by the position of its trial.
+    lines = graph_strings(values.reset_index(drop=True)).str.replace('%2C', ',', regex=False)
+    pairs = lines.str.split(';').explode()
+    found = pairs.str.extract(OBJECT_PATTERN.pattern)
+
+    rows = pairs.index.to_numpy(dtype=np.int64)
+    unmatched = found['object'].isna().to_numpy(dtype=bool)
+    four_d = (found['c4'].fillna('') != '').to_numpy(dtype=bool)  # Arrow gives '' for unused groups
+
+    # Coordinates are (x, y) or (x_cat, y_cat, x, y); take the dimension from the first parsed pair.
+    first = np.flatnonzero(~unmatched)[:1]
+    dims = 4 if four_d[first].any() else 2
+
+    # Objects on merged canvases (e.g., `(1, 1, 0-33, 0-13)`) are not on a known cell.
+    ranged = ((found['e3'].fillna('') != '') | (found['e4'].fillna('') != '')).to_numpy(dtype=bool)
+    merged = np.bincount(rows[ranged], minlength=len(values)) > 0
+    if merged.any():
+        warnings.warn(f'{merged.sum()} graph(s) were recorded on merged canvases, where the cell of each object '
+                      f'is unknown; they are left out (see the `malformed` output).')
+
+    # A trial is malformed if any of its pairs could not be parsed (or do not match the dimension).
+    bad = np.bincount(rows[unmatched | (four_d != (dims == 4))], minlength=len(values)) > 0
+    if (bad & ~merged).any():
+        warnings.warn(f'{(bad & ~merged).sum()} graph(s) could not be parsed; see the `malformed` output.')
+    bad |= merged
+    malformed = values[bad]
+
+    # Integer coordinates (cast by Arrow itself when the strings are Arrow strings).
+    keep = ~bad[rows]
+    int_dtype = 'int32[pyarrow]' if isinstance(lines.dtype, pd.ArrowDtype) else 'Int32'
+    coords = found.loc[keep, ['c1', 'c2', 'c3', 'c4'][:dims]].astype(int_dtype).to_numpy(dtype=np.int32)
+    objects = found.loc[keep, 'object'].to_numpy(dtype=object)
+    rows = rows[keep]
+
+    return rows, objects, coords, malformed
+
+
+@profiled
+def expand_graphs(df, columnar=False, value_col='Value'):
     """
     Explode the dataframe (in a good way) by giving
     each object-location pair its own row (to facilitate
     downstream calculations).
 
+    By default, this expects the `final_graphs` column built with `clean_string`,
+    and stores each location as a tuple. With `columnar=True`, the graphs are
+    parsed straight from `value_col` (with `parse_graphs`) into integer coordinate
+    columns (`x_cat`, `y_cat`, `x`, `y`, or just `x`, `y` for two-part coordinates)
+    and a categorical `object` column, which drops the per-row tuples (the
+    `final_graphs` and `location` columns) and lets downstream functions skip
+    per-row tuple handling. The trial's other columns are still repeated once
+    per object, and usually take most of the memory, so the output is only
+    about 10-25% smaller (e.g., 439 kB instead of 495 kB on demo-1).
+
     Parameters:
     - df (pd.DataFrame): Input dataframe.
+    - columnar (bool): Store locations as integer columns (True) or as tuples (False).
+    - value_col (str): Name of the column with the `Final` graphs (only used if `columnar`).
 
     Returns:
     - output (pd.DataFrame): Output dataframe rows that have been
                              exploded by obj-location values.
     """
 
+    if columnar:
+        return expand_graphs_columnar(df, value_col=value_col)
+
     # Graphs are lists of objects and their locations. 
     # Explode this list (but keep the columns). 
     output = df.explode('final_graphs')
@@ -173,91 +672,256 @@ def expand_graphs(df):
     return output
 
 
+def expand_graphs_columnar(df, value_col='Value'):
+    """
+    Columnar version of `expand_graphs` (see `expand_graphs(..., columnar=True)`).
+
+    Parameters:
+    - df (pd.DataFrame): Input dataframe.
+    - value_col (str): Name of the column with the `Final` graphs.
+
+    Returns:
+    - output (pd.DataFrame): Output dataframe with one row per object, a categorical
+                             `object` column, and integer coordinate columns.
+    """
+
+    # Parse all graphs at once (malformed trials are dropped with a warning).
+    rows, objects, coords, _ = parse_graphs(df[value_col])
+
+    # Repeat each trial's columns once per object (without any tuples).
+    output = df.drop(columns=['final_graphs'], errors='ignore').iloc[rows]
+    output['object'] = pd.Categorical(objects)
+
+    # Two-part coordinates only have a position; four-part coordinates also have a category.
+    for col, values in zip(COORDINATE_COLS[-coords.shape[1]:], coords.T):
+        output[col] = values
+
+    return output
+
+
+def get_coordinate_cols(df, location_col='location'):
+    """
+    Find the integer coordinate columns of an expanded dataframe (empty
+    if the locations are stored as tuples in `location_col` instead).
+
+    Parameters:
+    - df (pd.DataFrame): Expanded dataframe (see `expand_graphs`).
+    - location_col (str): Name of the coordinate column (expects vectors).
+
+    Returns:
+    - list of str: Names of the coordinate columns, in order.
+    """
+    if location_col in df.columns:
+        return []
+    return [col for col in COORDINATE_COLS if col in df.columns]
+
+
+def get_locations(df, location_col='location'):
+    """
+    Stack the locations of an expanded dataframe into a single array,
+    whether they are stored as tuples or as integer coordinate columns.
+
+    Parameters:
+    - df (pd.DataFrame): Expanded dataframe (see `expand_graphs`).
+    - location_col (str): Name of the coordinate column (expects vectors).
+
+    Returns:
+    - np.ndarray: Locations, with shape (num_rows, 2) or (num_rows, 4).
+    """
+    coordinate_cols = get_coordinate_cols(df, location_col)
+
+    if coordinate_cols:
+        return df[coordinate_cols].to_numpy()
+    if len(df):
+        return np.stack(df[location_col].values)
+    return np.empty((0, 2))
+
+
+@profiled
 def compute_pairwise_distances(df, group_cols, location_col='location', object_col='object',
-                               categorical=False):
+                               categorical=False, split_metadata=False, metric=None, metric_params=None):
     """
     Compute pairwise distances between rows within each group using only the last two
     dimensions of the coordinate vectors (as per the custom distance function).
 
     Given that we are looking at all pairwise distances between all objects,
     this function has been optimized (using numpy) at the cost of some
-    readability. I have added comments where appropriate.
+    readability. Rather than looping over groups, the data are sorted once
+    and the pairs for all groups are built (and measured) together. I have
+    added comments where appropriate.
 
     Parameters:
     - df (pd.DataFrame): Input dataframe.
     - group_cols (list of str): Columns to group by.
-    - location_col (str): Name of the coordinate column (expects vectors).
+    - location_col (str): Name of the coordinate column (expects vectors). If this column
+                          is missing, the integer coordinate columns from
+                          `expand_graphs(..., columnar=True)` are used instead.
     - object_col (str): Name of the object identifier column.
     - categorical (bool): Determining categorical differences (True) or not (False).
+                          Shorthand for `metric='categorical'` (or `metric='gradient'`).
+    - split_metadata (bool): Whether to keep the trial columns out of the pairwise results.
+                             If True, each pair only carries its trial key (`group_cols`),
+                             and the trial columns are returned in a separate table (one
+                             row per trial) that can be joined back with
+                             `pairs.merge(trials, on=group_cols)`.
+    - metric (str): Name of the distance metric (see `distances.METRICS`), such as
+                    'manhattan' or 'grid'; overrides `categorical`.
+    - metric_params (dict): Extra options for the metric (e.g., `{'cell_width': 20}` for 'grid').
 
     Returns:
     - pd.DataFrame: Compact pairwise comparison results.
+                    (If `split_metadata`, a tuple of the pairwise results and the trial table.)
     """
-    
-    # Make copy of df.
-    df = df.copy()
 
-    # Prepare results container (a list of dfs).
-    all_results = []
+    # Sort once, so that each group is a contiguous block of rows.
+    df, starts, sizes = sort_groups(df, group_cols)
+    note(groups=len(starts))
+
+    # Create pairwise index arrays for all groups at once, without duplicate pairs.
+    # (aka: including sent1~sent2, sent2~sent3, sent1~sent3, AND
+    #       excluding sent2~sent1, sent3~sent2, etc.)
+    idx1, idx2 = group_pair_indices(starts, sizes)
+
+    # Extract relevant data
+    locations = get_locations(df, location_col)
 
-    # Begin groupby.
-    for _, group in df.groupby(group_cols):
-        group = group.reset_index(drop=True)
-        
-        # Find length of each trial for each participant.
-        num_rows = len(group)
+    # Gradient distances use only the last two coordinates; categorical distances
+    # use only the first two coordinates.
+    if metric is None:
+        metric = 'categorical' if categorical else 'gradient'
 
-        # Edge case (should not be a problem with normal experiments).
-        if num_rows < 2:
-            continue
+    # Compute the distance between each coordinate pair (in a single pass).
+    distances = compute_distances(locations[idx1], locations[idx2], metric=metric, **(metric_params or {}))
 
-        # Extract relevant data
-        locations = np.stack(group[location_col].values)
+    return build_pairwise_output(df, group_cols, starts, idx1, idx2, distances,
+                                 location_col, object_col, split_metadata)
+
+
+def build_pairwise_output(df, group_cols, starts, idx1, idx2, distances,
+                          location_col='location', object_col='object', split_metadata=False):
+    """
+    Build the output of `compute_pairwise_distances` from the pairs of rows and their distances.
 
-        if categorical == False:
-            two_coords = locations[:, -2:]  # Use only last two coordinates for gradient 
+    Parameters:
+    - df (pd.DataFrame): Expanded dataframe, sorted by `group_cols` (see `sort_groups`).
+    - group_cols (list of str): Columns that delineate groups.
+    - starts (np.ndarray of int): Row position of the first row of each group.
+    - idx1 (np.ndarray of int): Row position of the first member of each pair.
+    - idx2 (np.ndarray of int): Row position of the second member of each pair.
+    - distances (np.ndarray of float): Distance of each pair.
+    - location_col (str): Name of the coordinate column (expects vectors).
+    - object_col (str): Name of the object identifier column.
+    - split_metadata (bool): Whether to return the trial columns in a separate table.
+
+    Returns:
+    - pd.DataFrame: Compact pairwise comparison results.
+                    (If `split_metadata`, a tuple of the pairwise results and the trial table.)
+    """
+
+    # Locations are either tuples or (if the graphs were expanded with `columnar=True`)
+    # integer columns that can be used without any per-row tuple handling.
+    coordinate_cols = get_coordinate_cols(df, location_col)
+
+    object_ids = df[object_col].values
+    metadata = df.drop(columns=[col for col in [location_col, object_col] if col in df.columns])
+
+    # Only keep the trial key on each pair; the rest of the trial goes in its own table.
+    if split_metadata:
+        object_level_cols = [location_col, object_col, 'final_graphs'] + coordinate_cols
+        trials = df.iloc[starts].drop(columns=[col for col in object_level_cols if col in df.columns])
+
+        pairs = df[group_cols].iloc[idx1].reset_index(drop=True)
+        pairs[object_col] = object_ids[idx1]
+        pairs[f'{object_col}_2'] = object_ids[idx2]
+        pairs['distance'] = distances
+
+        return pairs, trials.reset_index(drop=True)
+
+    result_df = metadata.iloc[idx1].reset_index(drop=True)
+    result_df[object_col] = object_ids[idx1]
+    result_df[f'{object_col}_2'] = object_ids[idx2]
+    if coordinate_cols:
+        for col in coordinate_cols:
+            result_df[f'{col}_2'] = df[col].to_numpy()[idx2]
+    else:
+        result_df[f'{location_col}_2'] = df[location_col].values[idx2]
+    result_df['distance'] = distances
+
+    return result_df
+
+
+@profiled
+def compute_distance_matrices(df, group_cols, location_col='location', object_col='object',
+                              categorical=False, objects=None, condensed=False,
+                              metric=None, metric_params=None):
+    """
+    Compute the full object-by-object distance matrix of every trial (aka one
+    representational dissimilarity matrix per participant and item).
+
+    Every matrix uses the same object order (`objects`), so that group-level
+    averages or RSA correlations become single numpy operations across trials
+    (e.g., `np.nanmean(matrices, axis=0)`). Objects that do not appear in a
+    trial are NaN. The matrices are built straight from the coordinates,
+    without going through the (long) pairwise dataframe.
+
+    Parameters:
+    - df (pd.DataFrame): Expanded dataframe (see `expand_graphs`).
+    - group_cols (list of str): Columns that delineate trials.
+    - location_col (str): Name of the coordinate column (expects vectors). If this column
+                          is missing, the integer coordinate columns are used instead.
+    - object_col (str): Name of the object identifier column.
+    - categorical (bool): Determining categorical differences (True) or not (False).
+    - objects (list of str): Shared object order; if None, all objects (sorted) are used.
+    - condensed (bool): Return condensed distance vectors (the upper triangle of each matrix,
+                        in the order of `np.triu_indices`) instead of full matrices.
+    - metric (str): Name of the distance metric (see `distances.METRICS`); overrides `categorical`.
+    - metric_params (dict): Extra options for the metric.
+
+    Returns:
+    - matrices (np.ndarray of float32): Distances, with shape (num_trials, num_objects, num_objects),
+                                        or (num_trials, num_objects * (num_objects - 1) / 2) if `condensed`.
+    - trials (pd.DataFrame): Trial keys (`group_cols`), in the same order as `matrices`.
+    - objects (np.ndarray): Object order used along the object axes.
+    """
+
+    # Sort once, so that each trial is a contiguous block of rows.
+    df, starts, sizes = sort_groups(df, group_cols)
+    note(groups=len(starts))
+    trial_ids = np.repeat(np.arange(len(starts)), sizes)
+
+    # Map every object onto the shared object order (objects outside of it are left out).
+    if objects is None:
+        objects = np.sort(df[object_col].dropna().unique())
+    objects = np.asarray(objects, dtype=object)
+    object_ids = pd.Categorical(df[object_col], categories=objects).codes
+    keep = object_ids >= 0
+
+    locations = get_locations(df, location_col)
+    if metric is None:
+        metric = 'categorical' if categorical else 'gradient'
+
+    # Place each object's coordinates into a (trial, object, coordinate) array (NaN when missing).
+    positions = np.full((len(starts), len(objects), locations.shape[1]), np.nan, dtype=np.float32)
+    positions[trial_ids[keep], object_ids[keep]] = locations[keep]
+
+    # Measure a block of trials at a time, to bound the size of the intermediate arrays.
+    idx1, idx2 = np.triu_indices(len(objects), 1)
+    num_cols = len(idx1) if condensed else len(objects)
+    matrices = np.empty((len(starts), num_cols) if condensed else (len(starts), num_cols, num_cols),
+                        dtype=np.float32)
+
+    for block in range(0, len(starts), MATRIX_BLOCK_SIZE):
+        block_positions = positions[block:block + MATRIX_BLOCK_SIZE]
+        if condensed:
+            coords1, coords2 = block_positions[:, idx1], block_positions[:, idx2]
         else:
-            two_coords = locations[:, :2]   # Use only first two coordinates for categorical
-
-        object_ids = group[object_col].values
-        metadata = group.drop(columns=[location_col, object_col])
-
-        # Create pairwise index arrays, without duplicate pairs.
-        # (aka: including sent1~sent2, sent2~sent3, sent1~sent3, AND
-        #       excluding sent2~sent1, sent3~sent2, etc.)
-        idx1 = np.repeat(np.arange(num_rows), num_rows)
-        idx2 = np.tile(np.arange(num_rows), num_rows)
-        mask = idx1 < idx2
-
-        idx1 = idx1[mask]
-        idx2 = idx2[mask]
-
-        # Some GRIS experimenters may only use two-part coordinates, 
-        # so this ensures that the proper distances are being calculated.
-        coords1 = two_coords[idx1]
-        coords2 = two_coords[idx2]
-
-        # Compute Euclidean distance between each coordinate pair.
-        deltas = coords1 - coords2
-        distances = np.sqrt((deltas ** 2).sum(axis=1))
-
-        # Collect results.
-        metadata1 = metadata.iloc[idx1].reset_index(drop=True)
-        obj1 = object_ids[idx1]
-        obj2 = object_ids[idx2]
-        loc2 = group[location_col].iloc[idx2].values
-
-        # Build output dataframe.
-        result_df = metadata1.copy()
-        result_df[object_col] = obj1
-        result_df[f'{object_col}_2'] = obj2
-        result_df[f'{location_col}_2'] = loc2
-        result_df['distance'] = distances
-
-        # Add results to container.
-        all_results.append(result_df)
-
-    return pd.concat(all_results, ignore_index=True)
+            coords1, coords2 = block_positions[:, :, None, :], block_positions[:, None, :, :]
+        matrices[block:block + MATRIX_BLOCK_SIZE] = compute_distances(coords1, coords2, metric=metric,
+                                                                       **(metric_params or {}))
+
+    trials = df[group_cols].iloc[starts].reset_index(drop=True)
+
+    return matrices, trials, objects
 
 
 